@@ -1,10 +1,62 @@
 import pyvisa
 import re
+from concurrent.futures import ThreadPoolExecutor
 import instruments as li
 import commands as sc
 import HelperFunctions as hf
+import BusExecutor as bx
+import SequenceFiles as sf
+import copy
 import logging
 
+_idnTable = None
+_idnMatches = {}
+
+
+def idnTable():
+    """
+    The table used to recognize instruments: every driver's ``idnString``,\
+    compiled once, along with the driver class.
+
+    Returns
+    -------
+    list of tuple
+        ``(pattern, model)`` in the order the drivers are tried
+    """
+    global _idnTable
+    if _idnTable is None:
+        _idnTable = [(re.compile(model.idnString), model) for model in li.InstClass.Instrument.__subclasses__()]
+    return _idnTable
+
+
+def matchModel(idn):
+    """
+    Find the driver class whose ``idnString`` matches an identification\
+    string.  Answers are remembered, so each distinct string is only\
+    matched against the table once.
+
+    Parameters
+    ----------
+    idn : str
+        the instrument's reply to ``*IDN?`` (or ``ID``)
+
+    Returns
+    -------
+    type or None
+        the driver class, or ``None`` if nothing matches
+    """
+    if idn not in _idnMatches:
+        _idnMatches[idn] = next((model for pattern, model in idnTable() if pattern.match(idn)), None)
+    return _idnMatches[idn]
+
+
+def modelNamed(name):
+    """
+    Find a driver class by its name, e.g. ``'SRS830'``.
+    """
+    return next((model for pattern, model in idnTable() if model.__name__ == name), None)
+
+
 class Apparatus:
     """ An Apparatus object describes the entire target experiment, which \
     includes:
@@ -21,6 +73,18 @@ class Apparatus:
         those which have not been
     rm : pyvisa.ResourceManager
         The object which handles communication between instruments
+    drivers : dict
+        Every driver object this apparatus has made, by ``(address,\
+        model)``, so that rebuilding a sequence reuses instruments which\
+        are already open and initialized
+    idnCache : dict
+        The identification string found at each address by earlier calls\
+        to ``findInstruments``, so that refreshing only has to ask new\
+        addresses who they are
+    discoveryTimeout : int
+        VISA timeout in ms for identifying instruments: much shorter than\
+        the usual one, so that addresses which don't answer are given up\
+        on quickly
     sequence : list of SeqCommand
         The sequence to be run during the measurement
     exp : ExpGUI
@@ -38,6 +102,9 @@ class Apparatus:
         self.addrsList = []
         self.instList = []
         self.rm = pyvisa.ResourceManager()
+        self.drivers = {}
+        self.idnCache = {}
+        self.discoveryTimeout = 500
         self.sequence = []
         self.exp = exp
         self.logger = logging.getLogger('app')
@@ -70,119 +137,62 @@ class Apparatus:
         Returns
         -------
         serial : str
-            A single, human-readable string describing the Apparatus state.
-            It's split into sections for instruments and commands.
+            A JSON document (see ``SequenceFiles.document``) describing the\
+            instruments and the sequence commands.
         """
-        serial = 'INSTRUMENTS:\n'
-        # Get instruments:
-        for inst in self.instList:
-            if inst.name is not None:
-                serial += '{:s}\t{:s}\t{:s}\n'.format(inst.address, inst.model, str(inst.name))
-            else:
-                serial += '{:s}\t{:s}\n'.format(inst.address, inst.model)
-
-        # Get sequence commands
-        serial += 'COMMANDS:\n'
-        for cmd in self.sequence:
-            serial += cmd.description()
-        return serial
+        return sf.dumps(sf.document(self))
     
     
-    def deserialize(self, serialapp, gui=None):
+    def deserialize(self, serialapp, gui=None, append=False):
         """ 
-        Take a serialized string object description of the apparatus as \ 
+        Take a serialized description of the apparatus as \
         defined on the GUI, and rebuild it.  This is intended to run once\
         at the beginning of each experiment.
         
         Parameters
         ----------
-        serialapp : str
-            String serialization of an apparatus, produced by serialize()
+        serialapp : str or dict
+            Serialization of an apparatus, produced by serialize(), or a\
+            document already read with ``SequenceFiles.loads``.  Sequence\
+            files in the old text format are converted as they're read.
         gui : ExpGUI, optional
             Link to a gui object to be used in rebuilding the apparatus. \
             If the serialization is being used for logging, gui is not \
             required.  Defaults to None.
+        append : bool, optional
+            Add the commands to the end of the present sequence, rather\
+            than replacing it.
 
         """
+        doc = sf.loads(serialapp) if isinstance(serialapp, str) else serialapp
         self.instList = []
-        lines = serialapp.split('\n')
-        stop = lines.index('COMMANDS:')
-        for line in lines[1:stop]:
-            try:
-                iaddr, imodel, iname = line.strip().split('\t')
-            except ValueError:
-                iaddr, imodel = line.strip().split('\t')
-                iname = None
-            
-            modelType = None  # start ignorant
-            for model in li.InstClass.Instrument.__subclasses__():  # compare to all known models
-                if imodel == model.__name__:  # if the IDN response matches the model's string,
-                    modelType = model  # we have what we came for
-                    break  # get in the car
-                if modelType is not None:
-                    break
+        for inst in doc['instruments']:
+            modelType = modelNamed(inst['model'])
             if modelType is not None:  # we got a match, now make it so
-                self.instList.append(modelType(self, iaddr, name=iname))
-        cmdpos = []
-        for ii, line in enumerate(lines):
-            if re.match('Sequence Command', line):
-                cmdpos.append(ii)
-
-        # parse the sequence into a list of dicts, one for each step
-        line = ''
-        index = stop+1
-        allSteps = []
-
-        while index<len(lines):
-            line = lines[index]
-            index += 1
-            if line != '':
-                if re.match('Sequence Command', line) is not None:
-                   allSteps.append({})
-                elif line[0] == '\t':
-                   try:
-                       name = re.search('(.+) =', line.strip()).group(1)
-                       try:
-                           val = re.search('= (.+)', line.strip()).group(1)
-                       except AttributeError:
-                           val = ''
-                       if val != '':
-                           if val[0] == '[':
-                               val = val.split(',')
-                               val = [x.strip('[]"\' ') for x in val]
-                           if name == 'rows':
-                               allSteps[-1][name] = int(val)
-                           elif name == 'enabled':
-                               allSteps[-1][name] = (val.strip()=='True')
-                           else:
-                               try:
-                                   allSteps[-1][name] = float(val)
-                               except (ValueError, TypeError):
-                                   allSteps[-1][name] = val
-                   except AttributeError:
-                       pass
+                self.instList.append(self.driver(modelType, inst['address'], inst['name']))
 
+        if not append:
+            self.sequence = []
+        typedict = {'SetCommand':sc.SetCmd, 'WaitCommand':sc.WaitCmd, 'SingleMeasurementCommand':sc.SMeasCmd,
+                    'ContinuousMeasurementCommand':sc.CMeasCmd, 'LoopCommand':sc.LoopCmd,
+                    'LoopEndCommand':sc.LoopEnd}
         looplist = []
-        for step in allSteps:
-            typedict = {'SetCommand':sc.SetCmd, 'WaitCommand':sc.WaitCmd, 'SingleMeasurementCommand':sc.SMeasCmd,
-                        'ContinuousMeasurementCommand':sc.CMeasCmd, 'LoopCommand':sc.LoopCmd,
-                        'LoopEndCommand':sc.LoopEnd}
+        for step in doc['commands']:
             newstep = typedict[step['type']](self.exp, self, len(self.sequence), dup=True, gui=gui)
+            for key, val in step.items():
+                newstep.__dict__[key] = copy.deepcopy(val)  # the document may be used again
             if isinstance(newstep, sc.LoopCommand.LoopCmd):
                 looplist.append(newstep)
             if isinstance(newstep, sc.LoopEnd):
                 newstep.loop = looplist[-1]
                 del looplist[-1]
                 newstep.loopPos = self.sequence.index(newstep.loop)
-
-            for key in step.keys():
-                newstep.__dict__[key] = step[key]
             
             newstep.updateInstList()
             self.sequence.append(newstep)
 
 
-    def findInstruments(self):
+    def findInstruments(self, recheck=False):
         """
         Makes current the lists of instruments by doing the following:
         
@@ -193,46 +203,120 @@ class Apparatus:
         the active lists and add it to available.
         
         Otherwise, instruments are left as they are.
-        
-        No parameters, no returns.
-        """
 
+        Addresses are asked who they are all at once, with a short timeout,\
+        and the answers are kept in ``idnCache``, so a refresh only has to\
+        ask addresses which are new or didn't answer last time.  Serial\
+        ports are listed but never asked, since they can't be trusted to\
+        answer.
+
+        Parameters
+        ----------
+        recheck : bool, optional
+            Forget the cached answers and ask every address again, e.g.\
+            after swapping an instrument at the same address.
+        """
+        if recheck:
+            self.idnCache = {}
         self.addrsList = list(self.rm.list_resources())  # Determine what addresses are available
         currentInsts = {x.address:x for x in self.instList}
         self.instrNames = {x.address:x.name for x in self.instList}
+
+        self.idnCache = {addr: idn for addr, idn in self.idnCache.items() if addr in self.addrsList}  # forget unplugged ones
+        probe = [addr for addr in self.addrsList if re.match('ASRL', addr) is None]
+        unknown = [addr for addr in probe if self.idnCache.get(addr) is None]
+        if len(unknown) > 0:
+            with ThreadPoolExecutor(max_workers=min(len(unknown), 16)) as pool:
+                for addr, idn in zip(unknown, pool.map(self.identify, unknown)):
+                    self.idnCache[addr] = idn
+
         self.instList = []
+        for addr in probe:
+            idn = self.idnCache.get(addr)
+            if idn is None:  # if an address throws a fit
+                self.addrsList.remove(addr)  # cut that address so nobody else tries
+                continue
+            modelType = matchModel(idn)
+            if modelType is None:
+                continue
+            old = currentInsts.get(addr)
+            name = old.name if old is not None and type(old) is modelType else None
+            self.instList.append(self.driver(modelType, addr, name))  # reuse it if it's already set up
+
+    def driver(self, modelType, addr, name=None):
+        """
+        Get the driver object for an instrument, reusing the one made\
+        earlier if there is one.
 
-        # Rebuild the list of available instruments from scratch
-        for addr in self.addrsList:  # for each one....
-            if re.match('ASRL', addr) is None:
-                try:
-                    resource = self.rm.open_resource(addr)  # open a VISA session
-                    addrnum = int(re.search('::(.+)::', addr).group(1))
-                    if addrnum <= 20:
-                        idn = resource.query('*IDN?')  # ask it what's good
-                    else:
-                        idn = resource.query('ID')
-                        
-                except pyvisa.errors.VisaIOError:  # if an address throws a fit
-                    self.addrsList.remove(addr)  # cut that address so nobody else tries
-
-                modelType = None  # start ignorant
-                for model in li.InstClass.Instrument.__subclasses__():  # compare to all known models
-                    if re.match(model.idnString, idn):  # if the IDN response matches the model's string,
-                        modelType = model  # we have what we came for
-                        break  # get in the car
-                    if modelType is not None:
-                        break
-
-                if modelType is not None:  # we got a match, now make it so
-                    self.instList.append(modelType(self, addr))  # create the instrument and add it to the list
-                    
-        # Compare new list to the active and available lists of the exp, refresh
-        for instr in self.instList:
-            if instr.address in currentInsts.keys():
-                if instr.model == currentInsts[instr.address].model:
-                    if currentInsts[instr.address].name is not None:
-                        instr.name = currentInsts[instr.address].name
+        Parameters
+        ----------
+        modelType : type
+            the driver class
+        addr : str
+            VISA resource name
+        name : str, optional
+            the user's name for the instrument
+
+        Returns
+        -------
+        Instrument
+        """
+        inst = self.drivers.get((addr, modelType.__name__))
+        if inst is None:
+            inst = modelType(self, addr, name=name)
+            self.drivers[(addr, modelType.__name__)] = inst
+        else:
+            inst.name = name
+        return inst
+
+    def releaseDrivers(self):
+        """
+        Close the VISA sessions of every driver object and forget them, so\
+        that the next sequence opens and initializes its instruments afresh.\
+        Anything still queued on the buses is finished first, and their\
+        worker threads are stopped.  ``instList`` is emptied too, since\
+        every instrument in it has just been closed.
+        """
+        bx.shutdownBuses()
+        for inst in self.drivers.values():
+            try:
+                inst.visa.close()
+            except Exception:
+                pass
+        self.drivers = {}
+        self.instList = []
+
+    def identify(self, addr):
+        """
+        Ask the instrument at an address to identify itself.
+
+        Parameters
+        ----------
+        addr : str
+            VISA resource name
+
+        Returns
+        -------
+        str or None
+            the reply, or ``None`` if nothing answered in time
+        """
+        try:
+            resource = self.rm.open_resource(addr, timeout=self.discoveryTimeout)
+        except pyvisa.errors.VisaIOError:
+            return None
+        try:
+            try:
+                addrnum = int(re.search('::(.+)::', addr).group(1))
+            except (AttributeError, ValueError):
+                addrnum = 0
+            if addrnum <= 20:
+                return resource.query('*IDN?')  # ask it what's good
+            else:
+                return resource.query('ID')
+        except pyvisa.errors.VisaIOError:
+            return None
+        finally:
+            resource.close()
 
 
     def get_availInsts(self):
@@ -284,6 +368,23 @@ class Apparatus:
         return varslist
 
 
+    def getVarTypes(self):
+        """ Get how each of the variables from ``getVarsList`` is stored in\
+        the data file, which is decided by the parameters they come from.
+
+        Returns
+        -------
+        vartypes : dict
+            ``{variable name: numpy dtype string}``
+        """
+        vartypes = {'Timestamp': '<i8'}
+        for step in self.sequence:
+            if step.enabled:
+                for var, dtype in step.getMeasTypes().items():
+                    vartypes.setdefault(var, dtype)
+        return vartypes
+
+
     def disconnectInstr(self, instr):
         """
         Purge all lists of references to the given instrument.
@@ -341,11 +442,49 @@ class Apparatus:
             step.title = hf.indentLoops(step, loopdepth)
 
 
+    def compileSequence(self):
+        """ Turn the sequence into a flat program for ``runSequence``.\
+        Disabled steps are left out (with the end of a disabled loop), each\
+        step looks up its instruments, parameters and headers once with\
+        ``SeqCmd.compile``, and every loop end is given the place in the\
+        program to jump back to.  Each loop start is given the place just\
+        past its end, for when the instrument runs the whole sweep itself.
+
+        Returns
+        -------
+        program : list of tuple
+            ``(position, cmd, jump)`` for each step to run, where\
+            ``position`` is the step's place in the sequence and ``jump`` is\
+            where to go next if ``execute`` returns anything but None: the\
+            program index of the loop start for a ``LoopEnd``, just past\
+            the ``LoopEnd`` for a ``LoopCmd``, and None for anything else.
+        """
+        program = []
+        starts = {}
+        ends = {}
+        for position, cmd in enumerate(self.sequence):
+            if not cmd.enabled or (isinstance(cmd, sc.LoopEnd) and not cmd.loop.enabled):
+                self.logger.debug('sequence step {:d}: {:s} disabled, skipping...'.format(position, cmd.title))
+                continue
+            cmd.compile()
+            if isinstance(cmd, sc.LoopCmd):
+                starts[id(cmd)] = len(program)
+            program.append((position, cmd, None))
+        for ii, (position, cmd, jump) in enumerate(program):
+            if isinstance(cmd, sc.LoopEnd):
+                program[ii] = (position, cmd, starts[id(cmd.loop)])
+                ends[id(cmd.loop)] = ii + 1
+        for ii, (position, cmd, jump) in enumerate(program):
+            if isinstance(cmd, sc.LoopCmd) and id(cmd) in ends:
+                program[ii] = (position, cmd, ends[id(cmd)])
+        return program
+
+
     def runSequence(self, fileReqQ):
-        """  Execute the given sequence.  This function reads the sequence\
-        and executes each command, conditioned on abort or disable flags.\
-        As each step is reached, it keeps track of the present position
-        within the sequence.
+        """  Execute the given sequence.  The sequence is first compiled\
+        (see ``compileSequence``), and then the program is run step by\
+        step, conditioned on abort flags.  As each step is reached, it\
+        keeps track of the present position within the sequence.
         
         All of the details of the execution, including the steps themselves\
         but also the GUI display, is stored within other objects.
@@ -359,32 +498,35 @@ class Apparatus:
         """
         
         self.logger.info('STARTING A SEQUENCE')
-        position = 0
-        seqLength = len(self.sequence)
+        program = self.compileSequence()
+        step = 0
         while not self.exp.isAborted():
-            while position < seqLength:
-                cmd = self.sequence[position]
-                if cmd.enabled:
-                    if isinstance(cmd, sc.LoopEnd):
-                        self.exp.instAns = cmd.status
-                        newPosition = cmd.execute(fileReqQ)
-                        if (newPosition is not None):
-                            position = newPosition
-                            self.logger.debug('returning to beginning of loop {:d}: {:s}'.format(position, self.sequence[position].title))
-                        else:
-                            position = position + 1
-                            self.logger.debug('finished loop')
+            while step < len(program):
+                position, cmd, jump = program[step]
+                self.exp.instAns = cmd.status
+                if isinstance(cmd, sc.LoopEnd):
+                    if cmd.execute(fileReqQ) is not None:
+                        step = jump
+                        self.logger.debug('returning to beginning of loop {:d}: {:s}'.format(program[step][0], program[step][1].title))
                     else:
-                        self.exp.instAns = cmd.status
-                        self.logger.debug('executing sequence step {:d}: {:s}'.format(position, cmd.title))
-                        cmd.execute(fileReqQ)
-                        position += 1
+                        step += 1
+                        self.logger.debug('finished loop')
                 else:
-                    self.logger.debug('sequence step {:d}: {:s} disabled, skipping...'.format(position, cmd.title))
-                    position += 1
+                    self.logger.debug('executing sequence step {:d}: {:s}'.format(position, cmd.title))
+                    if cmd.execute(fileReqQ) is not None and jump is not None:
+                        step = jump
+                        self.logger.debug('sweep run by the instrument, skipping to step {:d}'.format(
+                            program[step][0] if step < len(program) else len(self.sequence)))
+                    else:
+                        step += 1
             self.logger.info('reached end of sequence')
             self.exp.abort()
 
+        for inst in self.instList:
+            stats = getattr(inst, 'retryStats', None)
+            if stats is not None and (stats['retries'] > 0 or stats['failures'] > 0):
+                self.logger.info('{:s}: {:d} reads, {:d} retries, {:d} failed, {:d} skipped while degraded'.format(
+                    str(inst), stats['reads'], stats['retries'], stats['failures'], stats['skipped']))
         self.exp.finish()
         
         self.logger.critical('Sequence Finished!')
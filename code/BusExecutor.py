@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+import re
+import threading
+
+
+def busKey(address):
+    """
+    Figure out which physical bus a VISA resource sits on.  Everything on\
+    one GPIB board shares the bus, so it gets a single key.  Serial ports,\
+    USB and network instruments each have their own link, so each resource\
+    is its own key.
+
+    Parameters
+    ----------
+    address : str
+        VISA resource name, e.g. ``'GPIB0::12::INSTR'``
+
+    Returns
+    -------
+    str
+        identifier of the bus
+    """
+    match = re.match(r'(GPIB\d*)::', str(address), re.IGNORECASE)
+    if match is not None:
+        return match.group(1).upper()
+    return str(address)
+
+
+_busQueues = {}
+_busLock = threading.Lock()
+
+
+def busQueue(address):
+    """
+    Get the worker thread for the bus of a VISA resource.  Every job for\
+    one bus goes through the same single thread, so jobs queued from\
+    anywhere in the process run one at a time, in the order they were\
+    submitted, and never collide on the bus.
+
+    Parameters
+    ----------
+    address : str
+        VISA resource name
+
+    Returns
+    -------
+    concurrent.futures.ThreadPoolExecutor
+        an executor with a single worker
+    """
+    key = busKey(address)
+    with _busLock:
+        pool = _busQueues.get(key)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bus-' + key)
+            _busQueues[key] = pool
+    return pool
+
+
+def shutdownBuses():
+    """
+    Finish everything queued on the buses and stop their threads.
+    """
+    with _busLock:
+        pools = list(_busQueues.values())
+        _busQueues.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+class BusExecutor:
+    """
+    Reads parameters from many instruments at once.  The reads are grouped\
+    by bus, and each group is queued on the worker thread of its bus (see\
+    ``busQueue``), so separate buses are read concurrently while the reads\
+    within a group still happen one at a time and in order.
+    """
+
+    def readGroup(self, reads):
+        """
+        Read a list of parameters which share a bus, one instrument at a\
+        time.  Several parameters on the same instrument are read together\
+        with ``readParams``.
+        """
+        byInst = {}
+        for ii, (inst, param) in enumerate(reads):
+            byInst.setdefault(id(inst), (inst, []))[1].append(ii)
+        results = [None] * len(reads)
+        for inst, indices in byInst.values():
+            if len(indices) == 1:
+                vals = [inst.readParam(str(reads[indices[0]][1]))]
+            else:
+                vals = inst.readParams([str(reads[ii][1]) for ii in indices])
+            for ii, val in zip(indices, vals):
+                results[ii] = val
+        return results
+
+    def readAll(self, reads):
+        """
+        Read a list of parameters.
+
+        Parameters
+        ----------
+        reads : list of tuple
+            ``(instrument, parameter)`` pairs
+
+        Returns
+        -------
+        list
+            the output of ``readParam`` for each pair, in the same order
+        """
+        groups = {}
+        for ii, (inst, param) in enumerate(reads):
+            groups.setdefault(busKey(inst.address), []).append(ii)
+
+        # even a single group goes through its bus thread, to stay in line
+        # with anything else which was queued there
+        futures = [(indices, busQueue(reads[indices[0]][0].address).submit(self.readGroup, [reads[ii] for ii in indices]))
+                   for indices in groups.values()]
+        results = [None] * len(reads)
+        for indices, future in futures:
+            for ii, val in zip(indices, future.result()):
+                results[ii] = val
+        return results
+
+
+_executor = None
+
+
+def readAll(reads):
+    """
+    Read a list of parameters with a ``BusExecutor`` shared by the whole\
+    process.
+
+    Parameters
+    ----------
+    reads : list of tuple
+        ``(instrument, parameter)`` pairs
+
+    Returns
+    -------
+    list
+        the output of ``readParam`` for each pair, in the same order
+    """
+    global _executor
+    if _executor is None:
+        _executor = BusExecutor()
+    return _executor.readAll(reads)
@@ -0,0 +1,340 @@
+from multiprocessing import shared_memory
+import numpy as np
+import DataStores as ds
+
+
+class DataRing:
+    """
+    Ring buffer of measurement records in shared memory.  The instrument\
+    process writes records into it, and the file process and the plots\
+    each read them back with their own ``RingCursor``, so measured data\
+    never has to pass through the manager process.
+
+    Every record has the same fixed layout: an epoch-ns timestamp, one\
+    ``float64`` per column with a validity flag, and for discrete columns\
+    a short label, so that ``'2,high'`` comes back out exactly as it went\
+    in.  Once the ring is full the oldest records are overwritten; a\
+    cursor which falls that far behind skips ahead and counts what it lost.
+
+    Parameters
+    ----------
+    headers : list of str
+        The column headers of the records, as in the data file
+    capacity : int, optional
+        Number of records the ring holds.  Defaults to 65536.
+    name : str, optional
+        Name of an existing ring to attach to.  Leave as ``None`` to create\
+        a new one.
+    dtypes : dict, optional
+        ``{header: numpy dtype string}``, as from ``Apparatus.getVarTypes``:\
+        integer columns which aren't arrays are the discrete ones.  Columns\
+        left out are guessed with ``DataStores.columnTypes``.
+
+    Attributes
+    ----------
+    columns : list of str
+        The headers of the value columns, i.e. everything but the timestamp
+    discrete : list of str
+        The headers of the columns which also carry a label
+    arrays : list of str
+        The headers of array columns.  Their records only hold the length\
+        of each array; the arrays themselves go to the file process\
+        separately (see ``RingQueue``).
+    shm : multiprocessing.shared_memory.SharedMemory
+        The shared block holding the ring
+    """
+    labelSize = 32
+
+    def __init__(self, headers, capacity=65536, name=None, dtypes=None):
+        self.headers = list(headers)
+        self.capacity = int(capacity)
+        self.dtypes = dict(zip(self.headers, ds.columnTypes(self.headers, dtypes)))
+        self.columns = [head for head in self.headers if head != 'Timestamp']
+        self.index = {head: ii for ii, head in enumerate(self.columns)}
+        self.arrays = [head for head in self.columns if ds.isArrayColumn(head)]
+        self.discrete = [head for head in self.columns
+                         if self.dtypes[head] == '<i8' and not ds.isArrayColumn(head)]
+        self.labelIndex = {head: ii for ii, head in enumerate(self.discrete)}
+
+        ncols = len(self.columns)
+        nlabels = max(len(self.discrete), 1)
+        layout = [('control', '<i8', (4,)),
+                  ('stamps', '<i8', (self.capacity,)),
+                  ('values', '<f8', (self.capacity, ncols)),
+                  ('valid', '?', (self.capacity, ncols)),
+                  ('labels', 'S{:d}'.format(self.labelSize), (self.capacity, nlabels))]
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for field, dtype, shape in layout)
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        offset = 0
+        for field, dtype, shape in layout:
+            arr = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            setattr(self, field, arr)
+            offset += arr.nbytes
+        if name is None:
+            self.control[:] = 0
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Open a ring which was created by another process.
+
+        Parameters
+        ----------
+        spec : tuple
+            the output of ``spec()`` from the process which created it
+
+        Returns
+        -------
+        DataRing
+        """
+        name, headers, capacity, dtypes = spec
+        return cls(headers, capacity, name=name, dtypes=dtypes)
+
+    def spec(self):
+        """
+        Everything another process needs to attach to this ring.  This is\
+        small and picklable, so it can go through a queue or into the\
+        arguments of a new process.
+
+        Returns
+        -------
+        tuple
+            ``(name, headers, capacity, dtypes)``
+        """
+        return (self.shm.name, self.headers, self.capacity, self.dtypes)
+
+    @property
+    def written(self):
+        """
+        Total number of records ever written to the ring.
+        """
+        return int(self.control[0])
+
+    def write(self, record):
+        """
+        Add one record to the ring.  There must only ever be one writer.
+
+        Parameters
+        ----------
+        record : dict
+            headers and values, as sent with a 'Write Line' fileRequest.\
+            Keys which aren't columns of the ring are ignored.
+        """
+        position = int(self.control[0])
+        slot = position % self.capacity
+        values = self.values[slot]
+        valid = self.valid[slot]
+        valid[:] = False
+        for key, val in record.items():
+            if key == 'Timestamp':
+                continue
+            ii = self.index.get(key)
+            if ii is None or val is None:
+                continue
+            jj = self.labelIndex.get(key)
+            num = ds.parseCell(val, '<f8' if jj is None else '<i8')
+            if num is None:
+                continue
+            values[ii] = num
+            valid[ii] = True
+            if jj is not None:
+                label = str(val).split(',', 1)[1] if ',' in str(val) else ''
+                self.labels[slot, jj] = label.encode('utf-8')[:self.labelSize]
+        self.stamps[slot] = ds.toEpochNs(record['Timestamp'])
+        self.control[0] = position + 1  # publish the record only once it's complete
+
+    def cursor(self, position=0):
+        """
+        Make a new reader for this ring.
+
+        Parameters
+        ----------
+        position : int, optional
+            Number of the first record to read.  Defaults to the oldest\
+            record ever written; use ``ring.written`` to skip to new ones.
+
+        Returns
+        -------
+        RingCursor
+        """
+        return RingCursor(self, position)
+
+    def close(self):
+        """
+        Detach from the shared memory.  Views into the ring are dropped first.
+        """
+        for field in ('control', 'stamps', 'values', 'valid', 'labels'):
+            setattr(self, field, None)
+        self.shm.close()
+
+    def unlink(self):
+        """
+        Free the shared memory for good.  Only the process which created\
+        the ring should call this, once everyone is done with it.
+        """
+        self.shm.unlink()
+
+
+class RingCursor:
+    """
+    One reader's place in a ``DataRing``.  Each reader keeps its own\
+    cursor, so the file process and the plots don't interfere.
+
+    Parameters
+    ----------
+    ring : DataRing
+        the ring to read
+    position : int, optional
+        number of the first record to read
+
+    Attributes
+    ----------
+    lost : int
+        how many records were overwritten before this cursor got to them
+    """
+
+    def __init__(self, ring, position=0):
+        self.ring = ring
+        self.position = position
+        self.lost = 0
+
+    def skip(self):
+        """
+        Jump ahead to the newest record, ignoring anything not yet read.
+        """
+        self.position = self.ring.written
+
+    def read(self):
+        """
+        Copy all new records out of the ring.
+
+        Returns
+        -------
+        stamps : numpy.ndarray of int64
+            epoch-ns timestamps, one per record
+        values : numpy.ndarray of float64
+            one row per record, one column per entry of ``ring.columns``
+        valid : numpy.ndarray of bool
+            which values were actually measured
+        labels : numpy.ndarray of bytes
+            one column per entry of ``ring.discrete``
+        """
+        ring = self.ring
+        end = ring.written
+        start = max(self.position, end - ring.capacity)
+        slots = np.arange(start, end) % ring.capacity
+        stamps = ring.stamps[slots]
+        values = ring.values[slots]
+        valid = ring.valid[slots]
+        labels = ring.labels[slots]
+
+        # the writer doesn't wait for us: drop anything it overwrote while we
+        # copied, and the record in the slot it may be filling right now
+        overwritten = min(max(0, ring.written - ring.capacity + 1 - start), len(slots))
+        self.lost += start - self.position + overwritten
+        self.position = end
+        return stamps[overwritten:], values[overwritten:], valid[overwritten:], labels[overwritten:]
+
+    def slots(self, headers):
+        """
+        Read all new records, laid out as rows for ``DataBase.writeline``.
+
+        Parameters
+        ----------
+        headers : list of str
+            column order of the rows
+
+        Returns
+        -------
+        rows : list of list
+            one value per header for every new record, ``None`` where the\
+            record has no value.  Discrete values come back as\
+            ``'code,label'`` strings.
+        """
+        ring = self.ring
+        stamps, values, valid, labels = self.read()
+        where = [(ii, ring.index.get(head), ring.labelIndex.get(head), ds.isArrayColumn(head))
+                 for ii, head in enumerate(headers)]
+        rows = []
+        for rr in range(len(stamps)):
+            row = [None] * len(headers)
+            for ii, cc, jj, isArray in where:
+                if cc is None:
+                    if headers[ii] == 'Timestamp':
+                        row[ii] = int(stamps[rr])
+                elif valid[rr, cc]:
+                    if isArray:
+                        row[ii] = int(values[rr, cc])
+                    elif jj is None:
+                        row[ii] = float(values[rr, cc])
+                    else:
+                        row[ii] = '{:d},{:s}'.format(int(values[rr, cc]), labels[rr, jj].decode('utf-8', 'replace'))
+            rows.append(row)
+        return rows
+
+    def records(self):
+        """
+        Read all new records as dicts, in the form the plots expect from a\
+        'Read Unread' fileRequest.
+
+        Returns
+        -------
+        list of dict
+            the new records, with timestamps as ``numpy.datetime64``
+        """
+        headers = self.ring.headers
+        records = []
+        for row in self.slots(headers):
+            record = {headers[ii]: val for ii, val in enumerate(row) if val is not None}
+            record['Timestamp'] = np.datetime64(record['Timestamp'], 'ns')
+            records.append(record)
+        return records
+
+
+class RingQueue:
+    """
+    Stands in for ``fileReqQ`` in the instrument process.  'Write Line'\
+    requests go straight into the shared ring, and every other request\
+    goes through to the real queue, so the sequence commands don't need to\
+    know which path their data takes.
+
+    Arrays don't fit in the ring's fixed-width records, so the ring only\
+    gets their lengths, and the arrays themselves follow through the queue\
+    in a 'Write Arrays' request tagged with the record's position in the\
+    ring.
+
+    Parameters
+    ----------
+    fileReqQ : multiprocessing.JoinableQueue
+        the file request queue
+    ring : DataRing
+        where to put the measured records
+    """
+
+    def __init__(self, fileReqQ, ring):
+        self.fileReqQ = fileReqQ
+        self.ring = ring
+
+    def put(self, req, *args, **kwargs):
+        if req.type != 'Write Line':
+            self.fileReqQ.put(req, *args, **kwargs)
+            return
+        record = req.args
+        arrays = {key: val for key, val in record.items() if isinstance(val, np.ndarray)}
+        if len(arrays) == 0:
+            self.ring.write(record)
+            return
+        position = self.ring.written
+        record = dict(record)
+        for key, val in arrays.items():
+            record[key] = val.size
+        self.ring.write(record)
+        self.fileReqQ.put(type(req)('Write Arrays', (position, arrays)), *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.fileReqQ, name)
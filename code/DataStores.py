@@ -0,0 +1,1173 @@
+import datetime
+import json
+import mmap
+import os
+import shutil
+import struct
+import numpy as np
+
+
+TIMEFMT = '%Y-%m-%d %H:%M:%S.%f'
+ARRAYTAG = '[]'  # ending of the headers of array-valued columns
+
+
+def toEpochNs(stamp):
+    """
+    Convert a timestamp into integer nanoseconds since the epoch.
+
+    Parameters
+    ----------
+    stamp : int or str
+        Either a value which is already in epoch nanoseconds, or a local\
+        time string in the format used by the ``.dat`` files (``TIMEFMT``).
+
+    Returns
+    -------
+    int
+        nanoseconds since 1970-01-01 00:00:00 UTC
+    """
+    if isinstance(stamp, (int, np.integer)):
+        return int(stamp)
+    dt = datetime.datetime.strptime(str(stamp).strip(), TIMEFMT)
+    return int(dt.replace(microsecond=0).timestamp()) * 10**9 + dt.microsecond * 1000
+
+
+def fromEpochNs(ns):
+    """
+    Convert epoch nanoseconds back into the local time string used in the\
+    ``.dat`` files.
+
+    Parameters
+    ----------
+    ns : int
+        nanoseconds since the epoch
+
+    Returns
+    -------
+    str
+        local time formatted with ``TIMEFMT``
+    """
+    ns = int(ns)
+    dt = datetime.datetime.fromtimestamp(ns // 10**9)
+    return dt.replace(microsecond=(ns % 10**9) // 1000).strftime(TIMEFMT)
+
+
+def parseTimes(stamps):
+    """
+    Convert many local time strings (``TIMEFMT``) into epoch nanoseconds\
+    at once.  The strings are parsed in bulk by numpy, then shifted from\
+    local time to UTC, with the offset looked up once per distinct hour\
+    so that runs which cross a daylight-saving change come out right.
+
+    Parameters
+    ----------
+    stamps : list of str
+        the time strings; a dash ``'-'`` marks a missing value
+
+    Returns
+    -------
+    values : numpy.ndarray of int64
+        nanoseconds since the epoch, zero where invalid
+    valid : numpy.ndarray of bool
+        which entries held a readable time
+    """
+    stamps = np.asarray(stamps, dtype=str)
+    valid = stamps != '-'
+    local = np.full(len(stamps), np.datetime64('NaT'), dtype='datetime64[ns]')
+    try:
+        local[valid] = np.char.replace(stamps[valid], ' ', 'T').astype('datetime64[ns]')
+    except ValueError:  # a malformed entry somewhere, so fall back to one at a time
+        for ii in np.flatnonzero(valid):
+            try:
+                local[ii] = np.datetime64(stamps[ii].strip().replace(' ', 'T'), 'ns')
+            except ValueError:
+                valid[ii] = False
+    ns = local.astype('<i8')
+    hours, inverse = np.unique(ns[valid] // (3600 * 10**9), return_inverse=True)
+    epoch = datetime.datetime(1970, 1, 1)
+    offsets = np.array([(epoch + datetime.timedelta(hours=int(hour))).astimezone().utcoffset().total_seconds()
+                        for hour in hours], dtype='<i8') * 10**9
+    values = np.zeros(len(stamps), dtype='<i8')
+    values[valid] = ns[valid] - offsets[inverse.ravel()]
+    return values, valid
+
+
+def formatCell(val):
+    """
+    Write a value as text for a ``.dat`` file.  Arrays, such as lock-in\
+    buffers, are written as their elements joined with underscores.
+
+    Parameters
+    ----------
+    val : object
+        the value; ``None`` means missing
+
+    Returns
+    -------
+    str
+    """
+    if val is None:
+        return '-'
+    if isinstance(val, np.ndarray):
+        return '_'.join(['{:.8g}'.format(x) for x in val.tolist()])
+    return str(val)
+
+
+def unmap(mapped):
+    """
+    Close a memory map if nothing else is still looking at it.  Arrays\
+    which were handed out as views keep the map alive until they are\
+    garbage collected.
+
+    Parameters
+    ----------
+    mapped : mmap.mmap or None
+        the map to close
+
+    Returns
+    -------
+    None
+    """
+    if mapped is not None:
+        try:
+            mapped.close()
+        except BufferError:
+            pass
+    return None
+
+
+def isArrayColumn(header):
+    """
+    Check whether a column holds an array in each record, e.g. a lock-in\
+    buffer.  The arrays themselves live in an ``ArrayStore`` beside the\
+    data file, and the column itself only holds the length of each one.
+
+    Parameters
+    ----------
+    header : str
+        column header, as generated by ``commands.SeqCommand.formatHeader``
+
+    Returns
+    -------
+    bool
+    """
+    return header.endswith(ARRAYTAG)
+
+
+def columnType(header):
+    """
+    Guess how a column should be stored, for when nobody has said (see\
+    ``Apparatus.getVarTypes``), e.g. in a text file from an older run.
+
+    The timestamp is always an integer number of nanoseconds, and array\
+    columns store the integer length of each array.  Anything else is\
+    taken to be a float, which holds the codes of discrete parameters\
+    just as well, so no reading is lost whatever the parameter was.
+
+    Parameters
+    ----------
+    header : str
+        column header, as generated by ``commands.SeqCommand.formatHeader``
+
+    Returns
+    -------
+    str
+        numpy dtype string, either ``'<i8'`` or ``'<f8'``
+    """
+    if header == 'Timestamp' or isArrayColumn(header):
+        return '<i8'
+    return '<f8'
+
+
+def columnTypes(headers, dtypes=None):
+    """
+    The type of each column, taken from ``dtypes`` where it's given and\
+    guessed with ``columnType`` where it isn't.
+
+    Parameters
+    ----------
+    headers : list of str
+    dtypes : dict, optional
+        ``{header: numpy dtype string}``, e.g. from ``Apparatus.getVarTypes``
+
+    Returns
+    -------
+    list of str
+        one dtype string per header
+    """
+    dtypes = dtypes or {}
+    return ['<i8' if head == 'Timestamp' else dtypes.get(head) or columnType(head) for head in headers]
+
+
+def parseCell(value, dtype):
+    """
+    Turn one cell of a record into a number of the given type.
+
+    Parameters
+    ----------
+    value : str, float, or int
+        The value as it was measured.  Discrete parameters arrive in the\
+        form ``'code,label'``, in which case only the code is kept.
+    dtype : str
+        numpy dtype string from ``columnTypes``
+
+    Returns
+    -------
+    number or None
+        ``None`` if the cell can't be represented in this column.
+    """
+    try:
+        if isinstance(value, str):
+            value = value.split(',')[0]
+        num = float(value)
+        if dtype == '<f8':
+            return num
+        if num != int(num):
+            return None
+        return int(num)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+class TextStore:
+    """
+    The original tab-separated ``.dat`` file format.  Every record is one\
+    line, and columns which are missing from a record are written as a\
+    dash ``'-'``.
+
+    Parameters
+    ----------
+    filepath : str
+        Location of the data file
+
+    Attributes
+    ----------
+    headers : list of str
+        The column headers of the file
+    dtypes : list of str
+        numpy dtype string of each column.  Text files don't record these,\
+        so for a file which was opened rather than created they're guessed.
+    file : file
+        handle of the open data file, or ``None`` if it was opened read-only
+    pending : list of str
+        formatted lines which have not yet been written to the file
+    map : mmap.mmap
+        read-only memory map of the file, used for all reads
+    rowOffsets : numpy.ndarray of int64
+        byte offset of the start of every data line, plus one past the end\
+        of the last complete line
+    """
+    extension = '.dat'
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.headers = None
+        self.dtypes = None
+        self.stampIndex = None
+        self.file = None
+        self.pending = []
+        self.map = None
+        self.rowOffsets = None
+
+    def create(self, headers, dtypes=None):
+        """
+        Start a brand new file.
+
+        Parameters
+        ----------
+        headers : list of str
+            The column headers
+        dtypes : dict, optional
+            ``{header: numpy dtype string}``; see ``columnTypes``
+        """
+        self.headers = list(headers)
+        self.dtypes = columnTypes(self.headers, dtypes)
+        self.stampIndex = self.headers.index('Timestamp') if 'Timestamp' in self.headers else None
+        self.file = open(self.filepath, 'a+')
+        self.file.write('\t'.join(self.headers) + '\n')
+
+    def open(self, readonly=False):
+        """
+        Access an existing file.
+
+        Parameters
+        ----------
+        readonly : bool, optional
+            Only read the file, for browsing old data.  Nothing can be\
+            appended, and the file is never opened for writing.
+
+        Returns
+        -------
+        headers : list of str
+            The names of the columns in this file.
+        """
+        with open(self.filepath, 'r') as f:
+            self.headers = f.readline().strip().split('\t')
+        self.dtypes = columnTypes(self.headers)
+        self.stampIndex = self.headers.index('Timestamp') if 'Timestamp' in self.headers else None
+        if not readonly:
+            self.file = open(self.filepath, 'a+')
+        return self.headers
+
+    def append(self, slots):
+        """
+        Add a single record to the end of the file.  The line is held in\
+        memory until the next ``flush()``.
+
+        Parameters
+        ----------
+        slots : list
+            One value per column, in the same order as ``headers``.\
+            Missing values are ``None``, and are written as a dash.\
+            Timestamps in epoch nanoseconds are written as local time.
+        """
+        line = [formatCell(val) for val in slots]
+        if self.stampIndex is not None and isinstance(slots[self.stampIndex], (int, np.integer)):
+            line[self.stampIndex] = fromEpochNs(slots[self.stampIndex])
+        self.pending.append('\t'.join(line) + '\n')
+
+    def flush(self):
+        """
+        Write all pending lines to the file in one go.
+        """
+        if self.file is not None:
+            if len(self.pending) > 0:
+                self.file.write(''.join(self.pending))
+                self.pending = []
+            self.file.flush()
+
+    def sync(self):
+        """
+        Ask the operating system to commit the file to the disk itself.
+        """
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Write any pending lines and close the file.
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.map = unmap(self.map)
+        self.rowOffsets = None
+
+    def mapFile(self):
+        """
+        Memory-map the file and extend the line-offset index over any lines\
+        written since the last call.  Only the new part of the file is\
+        scanned, and the scan itself runs in numpy.
+
+        Returns
+        -------
+        int
+            number of complete data lines in the file
+        """
+        size = os.path.getsize(self.filepath)
+        if self.map is None or len(self.map) != size:
+            self.map = unmap(self.map)
+            with open(self.filepath, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.rowOffsets is None:
+            self.rowOffsets = np.zeros(1, dtype='<i8')
+            self.rowOffsets[0] = self.map.find(b'\n') + 1  # skip the headers
+        start = int(self.rowOffsets[-1])
+        newlines = np.flatnonzero(np.frombuffer(self.map, dtype=np.uint8, offset=start) == 10)
+        self.rowOffsets = np.concatenate((self.rowOffsets, newlines + start + 1))
+        return len(self.rowOffsets) - 1
+
+    def rowCount(self):
+        """
+        Number of records in the file.
+        """
+        self.flush()
+        return self.mapFile()
+
+    def readColumns(self, names, start=0, stop=None):
+        """
+        Read columns out of the file.  The file is memory-mapped, and only\
+        the requested rows and columns are parsed.
+
+        Parameters
+        ----------
+        names : list of str
+            The headers of the columns to read
+        start : int, optional
+            first row to read
+        stop : int, optional
+            one past the last row to read; defaults to the end of the file
+
+        Returns
+        -------
+        columns : dict
+            For each name, a tuple ``(values, valid)`` of numpy arrays.\
+            Timestamps are returned in epoch nanoseconds.
+        """
+        indices = [self.headers.index(name) for name in names]
+        dtypes = [self.dtypes[index] for index in indices]
+        values = [[] for name in names]
+        valid = [[] for name in names]
+        self.flush()
+        nrows = self.mapFile()
+        start, stop, step = slice(start, stop).indices(nrows)
+        lines = self.map[self.rowOffsets[start]:self.rowOffsets[max(start, stop)]].decode('utf-8').splitlines()
+        if len(indices) > 0:
+            lastcol = max(indices)
+            for line in lines:
+                line = line.split('\t', lastcol + 1)  # don't bother splitting the columns we don't need
+                for ii, index in enumerate(indices):
+                    try:
+                        cell = line[index]
+                    except IndexError:
+                        cell = '-'
+                    if names[ii] == 'Timestamp':
+                        values[ii].append(cell.strip() or '-')  # parsed in bulk below
+                        continue
+                    val = None if cell == '-' else parseCell(cell, dtypes[ii])
+                    valid[ii].append(val is not None)
+                    values[ii].append(val if val is not None else 0)
+
+        columns = {}
+        for ii, name in enumerate(names):
+            if name == 'Timestamp':
+                columns[name] = parseTimes(values[ii])
+            else:
+                columns[name] = (np.array(values[ii], dtype='<f8'), np.array(valid[ii], dtype=bool))
+        return columns
+
+    def exportText(self, filepath):
+        """
+        Write the contents of this file in the ``.dat`` text format, which\
+        for this store is just a copy.
+
+        Parameters
+        ----------
+        filepath : str
+            Location of the text file to create
+        """
+        self.flush()
+        if os.path.abspath(filepath) != os.path.abspath(self.filepath):
+            shutil.copyfile(self.filepath, filepath)
+
+
+class ColumnStore:
+    """
+    Chunked, typed, columnar binary data file (``.pxcb``).
+
+    The file starts with a short JSON header describing the columns, and is
+    followed by a series of chunks.  Each chunk holds a block of rows stored
+    column by column, in header order: the timestamp column is a plain
+    array of epoch nanoseconds, and every other column is a validity bitmap
+    followed by the values as a contiguous little-endian ``float64`` or
+    ``int64`` array.  Missing values are marked in the bitmap instead of
+    being written as text.
+
+    Parameters
+    ----------
+    filepath : str
+        Location of the data file
+    chunkRows : int, optional
+        The most rows to collect before writing a chunk.  Calling\
+        ``flush()`` writes a shorter chunk.  Defaults to 1024.
+
+    Attributes
+    ----------
+    headers : list of str
+        The column headers of the file
+    dtypes : list of str
+        numpy dtype string of each column
+    pending : list of list
+        rows which have been appended but not yet written as a chunk
+    map : mmap.mmap
+        read-only memory map of the file, used for all reads
+    chunkIndex : list of tuple
+        ``(offset, nrows)`` of every chunk found so far
+    """
+    extension = '.pxcb'
+    magic = b'PXCB'
+    chunkMagic = b'CHNK'
+    version = 1
+
+    def __init__(self, filepath, chunkRows=1024):
+        self.filepath = filepath
+        self.chunkRows = chunkRows
+        self.headers = None
+        self.dtypes = None
+        self.stampIndex = None
+        self.file = None
+        self.pending = []
+        self.map = None
+        self.chunkIndex = []
+        self.scanned = None
+
+    def create(self, headers, dtypes=None):
+        """
+        Start a brand new file.
+
+        Parameters
+        ----------
+        headers : list of str
+            The column headers
+        dtypes : dict, optional
+            ``{header: numpy dtype string}``; see ``columnTypes``
+        """
+        self.headers = list(headers)
+        if 'Timestamp' not in self.headers:
+            self.headers.insert(0, 'Timestamp')
+        self.dtypes = columnTypes(self.headers, dtypes)
+        self.stampIndex = self.headers.index('Timestamp')
+        meta = json.dumps({'version': self.version, 'headers': self.headers,
+                           'dtypes': self.dtypes}).encode('utf-8')
+        self.file = open(self.filepath, 'wb')
+        self.file.write(self.magic + struct.pack('<HI', self.version, len(meta)) + meta)
+        self.file.flush()
+        self.pending = []
+
+    def open(self, readonly=False):
+        """
+        Access an existing file.
+
+        Parameters
+        ----------
+        readonly : bool, optional
+            Only read the file, for browsing old data.  Nothing can be\
+            appended, and the file is never opened for writing.
+
+        Returns
+        -------
+        headers : list of str
+            The names of the columns in this file.
+        """
+        with open(self.filepath, 'rb') as f:
+            self.readMeta(f)
+        if not readonly:
+            self.file = open(self.filepath, 'r+b')
+            self.file.seek(0, 2)
+        self.pending = []
+        return self.headers
+
+    def readMeta(self, f):
+        """
+        Parse the file header.
+
+        Parameters
+        ----------
+        f : file
+            binary file handle positioned at the start of the file
+
+        Returns
+        -------
+        int
+            byte offset of the first chunk
+        """
+        if f.read(4) != self.magic:
+            raise ValueError('{:s} is not a PXC binary data file'.format(self.filepath))
+        version, metalen = struct.unpack('<HI', f.read(6))
+        if version > self.version:
+            raise ValueError('{:s} was written by a newer version of PXC'.format(self.filepath))
+        meta = json.loads(f.read(metalen).decode('utf-8'))
+        self.headers = meta['headers']
+        self.dtypes = meta['dtypes']
+        self.stampIndex = self.headers.index('Timestamp')
+        return 10 + metalen
+
+    def append(self, slots):
+        """
+        Add a single record.  It's held in memory until a full chunk has\
+        been collected.
+
+        Parameters
+        ----------
+        slots : list
+            One value per column, in the same order as ``headers``.\
+            Missing values are ``None``.
+        """
+        row = [None if val is None else parseCell(val, self.dtypes[ii]) for ii, val in enumerate(slots)]
+        if self.stampIndex is not None and slots[self.stampIndex] is not None:
+            row[self.stampIndex] = toEpochNs(slots[self.stampIndex])
+        self.pending.append(row)
+        if len(self.pending) >= self.chunkRows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all pending rows to the file as a single chunk.
+        """
+        if self.file is None or len(self.pending) == 0:
+            return
+        nrows = len(self.pending)
+        parts = [self.chunkMagic, struct.pack('<I', nrows)]
+        for ii, dtype in enumerate(self.dtypes):
+            cells = [row[ii] for row in self.pending]
+            valid = np.array([c is not None for c in cells], dtype=bool)
+            values = np.array([c if c is not None else 0 for c in cells], dtype=dtype)
+            if self.headers[ii] != 'Timestamp':
+                parts.append(np.packbits(valid).tobytes())
+            parts.append(values.tobytes())
+        self.file.write(b''.join(parts))
+        self.file.flush()
+        self.pending = []
+
+    def sync(self):
+        """
+        Ask the operating system to commit the file to the disk itself.
+        """
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Write any pending rows and close the file.
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.map = unmap(self.map)
+        self.chunkIndex = []
+        self.scanned = None
+
+    def chunks(self):
+        """
+        Memory-map the file and walk through any chunks which were written\
+        since the last call.
+
+        Returns
+        -------
+        list of tuple
+            ``(offset, nrows)`` for every chunk, where ``offset`` points to\
+            the first byte after the chunk header.
+        """
+        size = os.path.getsize(self.filepath)
+        if self.map is None or len(self.map) != size:
+            self.map = unmap(self.map)
+            with open(self.filepath, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.scanned is None:
+            self.scanned = 10 + struct.unpack('<I', self.map[6:10])[0]
+        pos = self.scanned
+        while pos + 8 <= size:
+            head = self.map[pos:pos+8]
+            if head[:4] != self.chunkMagic:
+                break  # a partially written chunk at the end of the file
+            nrows = struct.unpack('<I', head[4:])[0]
+            end = pos + 8 + self.chunkSize(nrows)
+            if end > size:
+                break
+            self.chunkIndex.append((pos + 8, nrows))
+            pos = end
+        self.scanned = pos
+        return self.chunkIndex
+
+    def chunkSize(self, nrows):
+        """
+        Number of bytes in the body of a chunk of ``nrows`` rows.
+        """
+        maskBytes = (nrows + 7) // 8
+        size = 0
+        for ii, dtype in enumerate(self.dtypes):
+            if self.headers[ii] != 'Timestamp':
+                size += maskBytes
+            size += 8 * nrows
+        return size
+
+    def columnOffset(self, index, nrows):
+        """
+        Byte offset of a column's bitmap within the body of a chunk.
+        """
+        maskBytes = (nrows + 7) // 8
+        offset = 0
+        for ii in range(index):
+            if self.headers[ii] != 'Timestamp':
+                offset += maskBytes
+            offset += 8 * nrows
+        return offset
+
+    def rowCount(self):
+        """
+        Number of records in the file, including pending ones.
+        """
+        return sum(nrows for offset, nrows in self.chunks()) + len(self.pending)
+
+    def readColumns(self, names, start=0, stop=None):
+        """
+        Read columns out of the file, including rows which have not yet\
+        been written as a chunk.  The file is memory-mapped and only the\
+        chunks which overlap the requested rows are touched.  When the\
+        rows all come from one chunk, float columns are returned as\
+        read-only views into the map rather than copies.
+
+        Parameters
+        ----------
+        names : list of str
+            The headers of the columns to read
+        start : int, optional
+            first row to read
+        stop : int, optional
+            one past the last row to read; defaults to the end of the file
+
+        Returns
+        -------
+        columns : dict
+            For each name, a tuple ``(values, valid)`` of numpy arrays.\
+            Timestamps are returned in epoch nanoseconds.
+        """
+        indices = [self.headers.index(name) for name in names]
+        values = [[] for name in names]
+        valid = [[] for name in names]
+        chunks = self.chunks()
+        start, stop, step = slice(start, stop).indices(sum(nrows for offset, nrows in chunks) + len(self.pending))
+        first = 0  # row number of the start of the current chunk
+        for offset, nrows in chunks:
+            lo, hi = max(start - first, 0), min(stop - first, nrows)
+            first += nrows
+            if lo >= hi:
+                continue
+            maskBytes = (nrows + 7) // 8
+            for ii, index in enumerate(indices):
+                pos = offset + self.columnOffset(index, nrows)
+                if self.headers[index] != 'Timestamp':
+                    mask = np.unpackbits(np.frombuffer(self.map, dtype=np.uint8, count=maskBytes, offset=pos))
+                    valid[ii].append(mask[lo:hi].astype(bool))
+                    pos += maskBytes
+                else:
+                    valid[ii].append(np.ones(hi - lo, dtype=bool))
+                values[ii].append(np.frombuffer(self.map, dtype=self.dtypes[index], count=hi - lo, offset=pos + 8 * lo))
+
+        lo, hi = max(start - first, 0), max(stop - first, 0)
+        if lo < hi:
+            for ii, index in enumerate(indices):
+                cells = [row[index] for row in self.pending[lo:hi]]
+                valid[ii].append(np.array([c is not None for c in cells], dtype=bool))
+                values[ii].append(np.array([c if c is not None else 0 for c in cells], dtype=self.dtypes[index]))
+
+        columns = {}
+        for ii, name in enumerate(names):
+            if len(values[ii]) == 0:
+                vals = np.zeros(0, dtype=self.dtypes[indices[ii]])
+                ok = np.zeros(0, dtype=bool)
+            elif len(values[ii]) == 1:
+                vals, ok = values[ii][0], valid[ii][0]
+            else:
+                vals, ok = np.concatenate(values[ii]), np.concatenate(valid[ii])
+            if name != 'Timestamp':
+                vals = vals.astype('<f8', copy=False)
+            columns[name] = (vals, ok)
+        return columns
+
+    def exportText(self, filepath):
+        """
+        Write the contents of this file in the ``.dat`` text format.
+
+        Discrete parameters are written as their numerical codes.
+
+        Parameters
+        ----------
+        filepath : str
+            Location of the text file to create
+        """
+        self.flush()
+        columns = self.readColumns(self.headers)
+        nrows = len(columns['Timestamp'][0])
+        with open(filepath, 'w') as f:
+            f.write('\t'.join(self.headers) + '\n')
+            for row in range(nrows):
+                line = []
+                for ii, head in enumerate(self.headers):
+                    vals, valid = columns[head]
+                    if not valid[row]:
+                        line.append('-')
+                    elif head == 'Timestamp':
+                        line.append(fromEpochNs(vals[row]))
+                    elif self.dtypes[ii] == '<i8':
+                        line.append(str(int(vals[row])))
+                    else:
+                        line.append(str(float(vals[row])))
+                f.write('\t'.join(line) + '\n')
+
+
+class ColumnCache:
+    """
+    In-memory copy of the columns of the current data file, which grows as\
+    records are appended so that plots can be rebuilt without rereading\
+    the file.
+
+    Rows which were already in the file when it was opened are pulled in\
+    from the store the first time a column is requested, and are kept from\
+    then on.  Rows appended during this session are stored in preallocated\
+    arrays which double in size whenever they fill up.
+
+    Parameters
+    ----------
+    headers : list of str
+        The column headers of the file
+    store : TextStore or ColumnStore, optional
+        Where to find rows which were written before this cache existed.\
+        Leave as ``None`` for a brand new file.
+    dtypes : dict, optional
+        ``{header: numpy dtype string}``; see ``columnTypes``.  Defaults to\
+        the types of ``store``, if there is one.
+
+    Attributes
+    ----------
+    size : int
+        number of rows appended through this cache
+    stamps : numpy.ndarray of int64
+        epoch-ns timestamps of the appended rows
+    values : numpy.ndarray of float64
+        appended values, one row of the array per column
+    valid : numpy.ndarray of bool
+        whether each entry of ``values`` was actually measured
+    base : dict
+        For each column loaded from the store, a tuple ``(values, valid)``
+    """
+
+    def __init__(self, headers, store=None, capacity=1024, dtypes=None):
+        self.headers = list(headers)
+        self.index = {head: ii for ii, head in enumerate(self.headers)}
+        self.stampIndex = self.index.get('Timestamp')
+        if dtypes is None and store is not None:
+            dtypes = dict(zip(store.headers, store.dtypes))
+        self.dtypes = columnTypes(self.headers, dtypes)
+        self.store = store
+        self.size = 0
+        self.stamps = np.zeros(capacity, dtype='<i8')
+        self.stampsValid = np.zeros(capacity, dtype=bool)
+        self.values = np.zeros((len(self.headers), capacity), dtype='<f8')
+        self.valid = np.zeros((len(self.headers), capacity), dtype=bool)
+        self.base = {}
+
+    def grow(self):
+        """
+        Double the space available for appended rows.
+        """
+        capacity = 2 * self.stamps.shape[0]
+        stamps = np.zeros(capacity, dtype='<i8')
+        stampsValid = np.zeros(capacity, dtype=bool)
+        values = np.zeros((len(self.headers), capacity), dtype='<f8')
+        valid = np.zeros((len(self.headers), capacity), dtype=bool)
+        stamps[:self.size] = self.stamps[:self.size]
+        stampsValid[:self.size] = self.stampsValid[:self.size]
+        values[:, :self.size] = self.values[:, :self.size]
+        valid[:, :self.size] = self.valid[:, :self.size]
+        self.stamps, self.stampsValid, self.values, self.valid = stamps, stampsValid, values, valid
+
+    def append(self, slots):
+        """
+        Add one record to the cache.
+
+        Parameters
+        ----------
+        slots : list
+            One value per column, in the same order as ``headers``.\
+            Missing values are ``None``.
+        """
+        if self.size == self.stamps.shape[0]:
+            self.grow()
+        row = self.size
+        for ii, val in enumerate(slots):
+            if val is None:
+                continue
+            if ii == self.stampIndex:
+                self.stamps[row] = toEpochNs(val)
+                self.stampsValid[row] = True
+            else:
+                num = parseCell(val, self.dtypes[ii])
+                if num is not None:
+                    self.values[ii, row] = num
+                    self.valid[ii, row] = True
+        self.size += 1
+
+    def loadBase(self, names):
+        """
+        Pull the rows which predate this cache out of the store, for any of\
+        the given columns which haven't been loaded yet.
+
+        Parameters
+        ----------
+        names : list of str
+            The headers of the columns which are needed
+        """
+        missing = [name for name in names if name not in self.base]
+        if self.store is None:
+            for name in missing:
+                dtype = '<i8' if name == 'Timestamp' else '<f8'
+                self.base[name] = (np.zeros(0, dtype=dtype), np.zeros(0, dtype=bool))
+        elif len(missing) > 0:
+            columns = self.store.readColumns(missing)
+            for name in missing:
+                vals, valid = columns[name]
+                stop = len(vals) - self.size  # everything appended since is already in memory
+                self.base[name] = (vals[:stop].copy(), valid[:stop].copy())
+
+    def columns(self, names):
+        """
+        Get entire columns, from the start of the file up to the most\
+        recently appended row.
+
+        Parameters
+        ----------
+        names : list of str
+            The headers of the columns to read
+
+        Returns
+        -------
+        columns : dict
+            For each name, a tuple ``(values, valid)`` of numpy arrays.\
+            Timestamps are returned in epoch nanoseconds.
+        """
+        self.loadBase(names)
+        columns = {}
+        for name in names:
+            if name == 'Timestamp':
+                tail = (self.stamps[:self.size], self.stampsValid[:self.size])
+            else:
+                ii = self.index[name]
+                tail = (self.values[ii, :self.size], self.valid[ii, :self.size])
+            base = self.base[name]
+            if len(base[0]) == 0:
+                columns[name] = tail
+            else:
+                columns[name] = (np.concatenate((base[0], tail[0])), np.concatenate((base[1], tail[1])))
+        return columns
+
+
+class ArrayStore:
+    """
+    Side-car file (``.pxca``) holding the array-valued columns of a data\
+    file, so that buffers of thousands of points are kept as raw binary\
+    rather than as text in a single cell.
+
+    The file starts with a short JSON header listing the array columns,\
+    followed by one entry per array: a fixed-size header giving the row\
+    of the data file it belongs to, the column, the dtype and the length,\
+    then the values themselves.  Entries can be written in any order, and\
+    reads look them up by row.
+
+    Parameters
+    ----------
+    filepath : str
+        Location of the array file
+
+    Attributes
+    ----------
+    headers : list of str
+        The headers of the array columns
+    pending : list of bytes
+        entries which have not yet been written to the file
+    map : mmap.mmap
+        read-only memory map of the file, used for all reads
+    entries : dict
+        For each column, a dict of ``row: (offset, dtype, length)``
+    """
+    extension = '.pxca'
+    magic = b'PXCA'
+    version = 1
+    entryHead = struct.Struct('<qI4sI')  # row, column, dtype, length
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.headers = None
+        self.file = None
+        self.pending = []
+        self.map = None
+        self.entries = {}
+        self.scanned = None
+
+    def create(self, headers):
+        """
+        Start a brand new file.
+
+        Parameters
+        ----------
+        headers : list of str
+            The headers of the array columns
+        """
+        self.headers = list(headers)
+        self.entries = {head: {} for head in self.headers}
+        meta = json.dumps({'version': self.version, 'headers': self.headers}).encode('utf-8')
+        self.file = open(self.filepath, 'wb')
+        self.file.write(self.magic + struct.pack('<HI', self.version, len(meta)) + meta)
+        self.file.flush()
+
+    def open(self, readonly=False):
+        """
+        Access an existing file.
+
+        Parameters
+        ----------
+        readonly : bool, optional
+            Only read the file, for browsing old data.
+
+        Returns
+        -------
+        headers : list of str
+            The headers of the array columns
+        """
+        with open(self.filepath, 'rb') as f:
+            if f.read(4) != self.magic:
+                raise ValueError('{:s} is not a PXC array file'.format(self.filepath))
+            version, metalen = struct.unpack('<HI', f.read(6))
+            if version > self.version:
+                raise ValueError('{:s} was written by a newer version of PXC'.format(self.filepath))
+            self.headers = json.loads(f.read(metalen).decode('utf-8'))['headers']
+        self.entries = {head: {} for head in self.headers}
+        if not readonly:
+            self.file = open(self.filepath, 'ab')
+        return self.headers
+
+    def append(self, row, header, values):
+        """
+        Add one array.  It's held in memory until the next ``flush()``.
+
+        Parameters
+        ----------
+        row : int
+            row of the data file which the array belongs to
+        header : str
+            the array column
+        values : numpy.ndarray
+            the array; it's flattened, and kept in its own dtype
+        """
+        values = np.ascontiguousarray(values).ravel()
+        dtype = values.dtype.str.encode('ascii')
+        if len(dtype) > 4:
+            values = values.astype('<f8')
+            dtype = b'<f8'
+        self.pending.append(self.entryHead.pack(row, self.headers.index(header), dtype, len(values)))
+        self.pending.append(values.tobytes())
+
+    def flush(self):
+        """
+        Write all pending arrays to the file in one go.
+        """
+        if self.file is not None:
+            if len(self.pending) > 0:
+                self.file.write(b''.join(self.pending))
+                self.pending = []
+            self.file.flush()
+
+    def sync(self):
+        """
+        Ask the operating system to commit the file to the disk itself.
+        """
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """
+        Write any pending arrays and close the file.
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.map = unmap(self.map)
+        self.scanned = None
+        self.entries = {}
+
+    def scan(self):
+        """
+        Memory-map the file and index any arrays written since the last\
+        call.
+
+        Returns
+        -------
+        dict
+            ``entries``
+        """
+        self.flush()
+        size = os.path.getsize(self.filepath)
+        if self.map is None or len(self.map) != size:
+            self.map = unmap(self.map)
+            with open(self.filepath, 'rb') as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.scanned is None:
+            self.scanned = 10 + struct.unpack('<I', self.map[6:10])[0]
+        pos = self.scanned
+        step = self.entryHead.size
+        while pos + step <= size:
+            row, column, dtype, length = self.entryHead.unpack_from(self.map, pos)
+            dtype = dtype.rstrip(b'\x00').decode('ascii')
+            end = pos + step + length * np.dtype(dtype).itemsize
+            if end > size:
+                break  # a partially written entry at the end of the file
+            self.entries[self.headers[column]][row] = (pos + step, dtype, length)
+            pos = end
+        self.scanned = pos
+        return self.entries
+
+    def rows(self, header):
+        """
+        Rows of the data file which have an array in a column.
+
+        Parameters
+        ----------
+        header : str
+            the array column
+
+        Returns
+        -------
+        numpy.ndarray of int64
+            the row numbers, in order
+        """
+        return np.array(sorted(self.scan()[header]), dtype='<i8')
+
+    def read(self, header, rows):
+        """
+        Read arrays out of the file.
+
+        Parameters
+        ----------
+        header : str
+            the array column
+        rows : list of int
+            which rows to read
+
+        Returns
+        -------
+        list of numpy.ndarray
+            one array per row, or ``None`` for rows which have no array in\
+            this column
+        """
+        entries = self.scan()[header]
+        arrays = []
+        for row in rows:
+            entry = entries.get(int(row))
+            if entry is None:
+                arrays.append(None)
+            else:
+                offset, dtype, length = entry
+                arrays.append(np.frombuffer(self.map, dtype=dtype, count=length, offset=offset).copy())
+        return arrays
+
+
+def arrayPath(filepath):
+    """
+    Location of the ``ArrayStore`` belonging to a data file.
+    """
+    return filepath + ArrayStore.extension
+
+
+STORES = {TextStore.extension: TextStore, ColumnStore.extension: ColumnStore}
+
+
+def storeFor(filepath):
+    """
+    Pick the storage backend matching a file's extension.
+
+    Parameters
+    ----------
+    filepath : str
+        path of the data file
+
+    Returns
+    -------
+    TextStore or ColumnStore
+        A (not yet opened) store for that file.  Unknown extensions are\
+        treated as text.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    return STORES.get(ext, TextStore)(filepath)
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+def minmaxIndices(y, npoints):
+    """
+    Choose which points to keep so that every peak and dip survives.
+
+    The data is split into ``npoints/2`` buckets of (nearly) equal numbers
+    of points, and from each bucket the smallest and largest values are
+    kept, in their original order.  The first and last points are always
+    kept.  This needs only the y data, so it works for any x axis.
+
+    Parameters
+    ----------
+    y : array-like
+        the values to decimate
+    npoints : int
+        roughly how many points to keep
+
+    Returns
+    -------
+    indices : numpy.ndarray of int
+        sorted indices of the points to keep
+    """
+    y = np.asarray(y, dtype=float)
+    N = len(y)
+    nbuckets = max(1, int(npoints) // 2)
+    if N <= max(2, int(npoints)):
+        return np.arange(N)
+
+    size = int(np.ceil(N / nbuckets))
+    padded = np.empty(nbuckets * size)
+    padded[:N] = y
+    padded[N:] = y[-1]  # repeat the last point to fill the final bucket
+    buckets = padded.reshape(nbuckets, size)
+    offsets = np.arange(nbuckets) * size
+    with np.errstate(invalid='ignore'):
+        lo = np.nanargmin(np.where(np.isnan(buckets).all(axis=1)[:, None], 0, buckets), axis=1) + offsets
+        hi = np.nanargmax(np.where(np.isnan(buckets).all(axis=1)[:, None], 0, buckets), axis=1) + offsets
+
+    indices = np.concatenate(([0], lo, hi, [N-1]))
+    indices = np.minimum(indices, N-1)
+    return np.unique(indices)
+
+
+def lttbIndices(x, y, npoints):
+    """
+    Choose which points to keep using Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept, and the rest of the data is split
+    into about ``npoints-2`` buckets.  From each bucket, LTTB keeps the
+    point which forms the largest triangle with its neighbouring buckets,
+    which preserves the visual shape of the curve.  Here each bucket is
+    measured against the averages of the buckets on either side, rather
+    than against the point kept from the one before, so that, as in
+    ``minmaxIndices``, every bucket is done at once.
+
+    Parameters
+    ----------
+    x : array-like
+        the x values, which must be numeric and sorted
+    y : array-like
+        the y values
+    npoints : int
+        roughly how many points to keep
+
+    Returns
+    -------
+    indices : numpy.ndarray of int
+        sorted indices of the points to keep
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    N = len(y)
+    npoints = max(3, int(npoints))
+    if N <= npoints:
+        return np.arange(N)
+
+    inner = N - 2  # everything but the end points
+    size = int(np.ceil(inner / (npoints - 2)))
+    nbuckets = int(np.ceil(inner / size))
+    px = np.empty(nbuckets * size)
+    py = np.empty(nbuckets * size)
+    px[:inner] = x[1:N-1] - x[0]  # e.g. epoch nanoseconds lose too much in the sums otherwise
+    py[:inner] = y[1:N-1]
+    px[inner:] = px[inner-1]  # fill the final bucket with blanks, which are never picked
+    py[inner:] = np.nan
+    px = px.reshape(nbuckets, size)
+    py = py.reshape(nbuckets, size)
+
+    # the average of every bucket, and so the neighbours on either side of each
+    valid = ~np.isnan(py)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avgx = np.where(valid, px, 0).sum(axis=1) / valid.sum(axis=1)
+        avgy = np.where(valid, py, 0).sum(axis=1) / valid.sum(axis=1)
+    lx = np.concatenate(([0.0], avgx[:-1]))
+    ly = np.concatenate(([y[0]], avgy[:-1]))
+    rx = np.concatenate((avgx[1:], [x[-1] - x[0]]))
+    ry = np.concatenate((avgy[1:], [y[-1]]))
+
+    # twice the area of each triangle, written as a*y + b*x + c for each bucket
+    a = (lx - rx)[:, None]
+    b = (ry - ly)[:, None]
+    c = (-(lx - rx) * ly - lx * (ry - ly))[:, None]
+    area = np.abs(a * py + b * px + c)
+    area[np.isnan(area)] = -1
+    picks = np.argmax(area, axis=1) + np.arange(nbuckets) * size + 1
+    return np.unique(np.concatenate(([0], picks, [N-1])))
+
+
+def decimate(x, y, npoints, method='minmax'):
+    """
+    Reduce a curve to about ``npoints`` points for display.
+
+    Parameters
+    ----------
+    x : array-like
+        x values of the curve
+    y : array-like
+        y values of the curve
+    npoints : int
+        how many points to show
+    method : str, optional
+        ``'minmax'`` (default) keeps the extremes of every bucket, which\
+        never loses a spike.  ``'lttb'`` uses Largest-Triangle-Three-Buckets,\
+        which follows the shape of the curve more smoothly.  LTTB needs a\
+        numeric or time x axis, and falls back to ``'minmax'`` otherwise.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        the decimated curve
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if npoints is None or len(y) <= npoints:
+        return x, y
+    if method == 'lttb' and x.dtype.kind == 'M':  # timestamps
+        indices = lttbIndices(x.astype('datetime64[ns]').astype('<i8'), y, npoints)
+    elif method == 'lttb' and np.issubdtype(x.dtype, np.number):
+        indices = lttbIndices(x, y, npoints)
+    else:
+        indices = minmaxIndices(y, npoints)
+    return x[indices], y[indices]
@@ -205,6 +205,125 @@ class ExpController:
         self.status3 = status
         
         
+class ControlPlane:
+    """
+    Wraps the ``ExpController`` proxy, and keeps the flags and status lines\
+    which the processes check constantly in shared memory instead.  Asking\
+    the proxy anything is a round trip to the manager process, whereas\
+    these are just reads of shared memory.  Everything not handled here\
+    (file answers, instrument lists, version...) is passed straight on to\
+    the proxy, so this can be used anywhere an ``ExpController`` can.
+
+    It has to reach the other processes as an argument when they are\
+    started, not through a queue.
+
+    Parameters
+    ----------
+    proxy : ExpController
+        the manager's shared ``ExpController``
+    statusLength : int, optional
+        most bytes kept of each status line
+
+    Attributes
+    ----------
+    killFlag, abortFlag, running, fileOpen : multiprocessing.Event
+        the same flags as in ``ExpController``
+    lines : multiprocessing.Array
+        the four status lines followed by ``instAns``, each in a\
+        fixed-width slot of ``statusLength`` bytes
+    """
+    idle = ['Status:\tIdle', '', '', '']
+    nlines = 5  # four status lines and instAns
+
+    def __init__(self, proxy, statusLength=256):
+        self.proxy = proxy
+        self.statusLength = statusLength
+        self.killFlag = mp.Event()
+        self.abortFlag = mp.Event()
+        self.running = mp.Event()
+        self.fileOpen = mp.Event()
+        self.lines = mp.Array('c', self.nlines * statusLength)
+        self.setStatus(self.idle)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == 'proxy':  # keep pickling away from the proxy
+            raise AttributeError(name)
+        return getattr(self.proxy, name)
+
+    def getLine(self, ii):
+        start = ii * self.statusLength
+        return self.lines[start:start + self.statusLength].rstrip(b'\x00').decode('utf-8', 'replace')
+
+    def setLine(self, ii, text):
+        raw = str(text).encode('utf-8')[:self.statusLength]
+        start = ii * self.statusLength
+        self.lines[start:start + self.statusLength] = raw.ljust(self.statusLength, b'\x00')
+
+    def isRunning(self):
+        return self.running.is_set()
+
+    def isFileOpen(self):
+        return self.fileOpen.is_set()
+
+    def openFile(self):
+        self.fileOpen.set()
+
+    def closeFile(self):
+        self.fileOpen.clear()
+
+    @property
+    def instAns(self):
+        return self.getLine(4)
+
+    @instAns.setter
+    def instAns(self, il):
+        self.setLine(4, '' if il is None else il)
+
+    def get_instAns(self):
+        return self.instAns
+
+    def set_instAns(self, il):
+        self.instAns = il
+
+    def abort(self):
+        self.abortFlag.set()
+        self.running.clear()
+
+    def kill(self):
+        self.abortFlag.set()
+        self.killFlag.set()
+
+    def runSeq(self):
+        self.abortFlag.clear()
+        self.running.set()
+
+    def finish(self):
+        self.abortFlag.clear()
+        self.running.clear()
+
+    def endSeq(self):
+        self.running.clear()
+        self.setStatus(self.idle[:])
+
+    def get_killFlag(self):
+        return self.killFlag.is_set()
+
+    def isAborted(self):
+        return self.abortFlag.is_set()
+
+    def getStatus(self):
+        with self.lines.get_lock():
+            return [self.getLine(ii) for ii in range(4)]
+
+    def setStatus(self, status):
+        with self.lines.get_lock():
+            for ii in range(3):
+                self.setLine(ii, status[ii])
+
+    def setStatusLoop(self, status):
+        self.setLine(3, status)
+
+
 class ExpManager(BaseManager):
     """ Custom data manager for holding on to data and basic functions
         accesible by all of the various processes.
@@ -3,6 +3,8 @@ from tkinter import ttk
 import tkinter.messagebox as tkm
 import InstHandlers as ih
 import FileHandlers as fh
+import DataStores as ds
+import DataRing as dr
 import time
 import re
 import matplotlib
@@ -12,6 +14,7 @@ import HelperFunctions as hf
 import commands as sc
 import multiprocessing as mp
 import Apparatus as ap
+import SequenceFiles as sf
 import logging
 
 matplotlib.use("TkAgg")
@@ -53,6 +56,7 @@ class ExpGUI:
         self.root.report_callback_exception = self.logError
         self.instproc = None
         self.fileproc = None
+        self.ring = None  # DataRing for the current run
 
         # # Plot settings
 
@@ -67,9 +71,11 @@ class ExpGUI:
         self.monInstTraces = []
         self.monParamTraces = []
         self.monHeaders = []
+        self.monTypes = {}  # how each of monHeaders is stored
 
         self.drawGUI(self.root)
         self.appcopy = None
+        self.appdoc = None
         
 
     def logError(self, exception, value, traceback):
@@ -121,6 +127,8 @@ class ExpGUI:
         tk.Label(self.frameUser, text="Project").grid(row=0, column=1, sticky='NSEW')
         tk.Label(self.frameUser, text="Sample").grid(row=0, column=2, sticky='NSEW')
         tk.Label(self.frameUser, text="Comment").grid(row=0, column=3, columnspan=2, sticky='NSEW')
+        tk.Label(self.frameUser, text="Format").grid(row=0, column=5, sticky='NSEW')
+        tk.Label(self.frameUser, text="Sync").grid(row=0, column=6, sticky='NSEW')
         tk.Label(self.frameUser, text="Path:").grid(row=2, column=0, sticky='E')
 
         ## Text entry widgets
@@ -136,6 +144,16 @@ class ExpGUI:
         self.sampleBox.grid(row=1, column=2, sticky='NSEW', padx=2, pady=2)
         self.comment = tk.Text(self.frameUser, height=2, width=15)
         self.comment.grid(row=1, column=3, rowspan=2, columnspan=2, sticky='NSEW', padx=2, pady=2)
+        self.dataFormat = tk.StringVar()
+        self.formatBox = ttk.Combobox(self.frameUser, textvariable=self.dataFormat, width=6, state='readonly')
+        self.formatBox['values'] = list(ds.STORES.keys())
+        self.formatBox.current(0)
+        self.formatBox.grid(row=1, column=5, sticky='NEW', padx=2, pady=2)
+        self.syncPolicy = tk.StringVar()  # how hard the file process tries to get data onto the disk
+        self.syncBox = ttk.Combobox(self.frameUser, textvariable=self.syncPolicy, width=8, state='readonly')
+        self.syncBox['values'] = fh.DataBase.fsyncPolicies
+        self.syncBox.current(fh.DataBase.fsyncPolicies.index('interval'))
+        self.syncBox.grid(row=1, column=6, sticky='NEW', padx=2, pady=2)
         self.path = tk.Entry(self.frameUser)
         self.path.grid(row=2, column=1, columnspan=2, sticky='NSEW', padx=2, pady=2)
 
@@ -269,7 +287,7 @@ class ExpGUI:
         top.addInst.grid(row=2, column=2, sticky='NSEW', pady=5)
 
         # control buttons
-        top.refreshInstr = tk.Button(top, text='Refresh', command=lambda: self.refreshBuildExp(top))
+        top.refreshInstr = tk.Button(top, text='Refresh', command=lambda: self.refreshBuildExp(top, recheck=True))
         top.refreshInstr.grid(row=4, column=0, sticky='NSEW')
         top.applyInstr = tk.Button(top, text='Apply Changes', command=lambda: self.applyBuildExp(top))
         top.applyInstr.grid(row=4, column=1, columnspan=2, sticky='NSEW')
@@ -291,16 +309,24 @@ class ExpGUI:
         self.refreshBuildExp(top)
         
 
-    def refreshBuildExp(self, top):
+    def refreshBuildExp(self, top, recheck=False):
         """
         Perform a VISA refresh on the apparatus, then push changes to the BuildExp GUI dialog
         Parameters
         ----------
         top : tk.toplevel
             The instrument select dialog box
+        recheck : bool, optional
+            Ask every address who it is again, rather than trusting the\
+            answers from last time.  The Refresh button does this, so that\
+            swapping an instrument at the same address is noticed.
         """
         self.logger.info('Refreshing the BuildExperiment dialog')
-        self.app.findInstruments()
+        self.app.findInstruments(recheck=recheck)
+        if recheck and self.instproc is not None and self.instproc.is_alive():
+            # the instrument server reopens everything at its next run, in
+            # case something was power-cycled or swapped
+            self.instReqQ.put(ih.instRequest('Release Instruments'))
         
         top.activeListBox.delete(0, tk.END)
         top.availListBox.delete(0, tk.END)
@@ -588,22 +614,27 @@ class ExpGUI:
 
             if not os.path.exists(dataDir):
                 os.makedirs(dataDir)
-            filename = r'{:s}_{:s}_{:s}.dat'.format(self.project.get(), self.sample.get(),
-                                                        time.strftime("%Y-%m-%d_%H-%M-%S"))
+            filename = r'{:s}_{:s}_{:s}{:s}'.format(self.project.get(), self.sample.get(),
+                                                    time.strftime("%Y-%m-%d_%H-%M-%S"), self.dataFormat.get())
+            # Describe the run once: the same copy goes to the instrument
+            # server, the metadata file, and back into the GUI afterwards
+            self.appdoc = sf.document(self.app, self.exp.get_version())
+            self.appcopy = sf.dumps(self.appdoc)
             self.writeMeta(dataDir, filename)
             filename = dataDir+filename
             self.path.delete(0, tk.END)
             self.path.insert(0, filename)
                                                         
-            # Set up the instrument communication process
-            self.appcopy = self.app.serialize()
-            self.app.closeRM()
-            self.instproc = mp.Process(target=ih.instHandler, args=[self.exp, self.instReqQ, self.fileReqQ, self.logQ, self.appcopy])
-            self.instproc.name = 'inst'
-            self.instproc.start()
+            # Shared ring which carries the measured records to the file and the plots
+            self.monHeaders = self.app.getVarsList()
+            self.monTypes = self.app.getVarTypes()
+            if self.ring is not None:
+                self.plotMan.detachRing()
+                self.ring.close()
+                self.ring.unlink()
+            self.ring = dr.DataRing(self.monHeaders, dtypes=self.monTypes)
 
             # Set up the file reading and writing process
-            self.monHeaders = self.app.getVarsList()
             if self.exp.isFileOpen():
                 self.exp.closeFile()
             self.plotMan.sequenceStart(filename, self.monHeaders)
@@ -617,10 +648,22 @@ class ExpGUI:
             self.logger.critical('sequence headers: {:s}'.format('\t'.join(self.monHeaders)))
             if len(self.monHeaders)>1:
                 self.logger.critical('requested creation of new file {:s}'.format(filename))
-                self.fileReqQ.put(fh.fileRequest('New File', args=(filename, self.monHeaders)))
+                self.fileReqQ.put(fh.fileRequest('New File', args=(filename, self.monHeaders, self.monTypes)))
+                self.fileReqQ.put(fh.fileRequest('Commit Policy', args=(None, None, self.syncPolicy.get())))
                 self.logger.critical('###PUSH FILEQ: {:s}'.format('new file'))
+                self.fileReqQ.put(fh.fileRequest('Attach Ring', args=self.ring.spec()))
+                self.plotMan.attachRing(self.ring)
                 self.plotMan.availQuants = self.monHeaders
-#            self.instReqQ.put(ih.instRequest('Run Sequence', args=()))  # starts running the commands to GPIB
+
+            # Hand the run to the instrument server, which stays up between
+            # runs so its instruments don't need reopening and reinitializing.
+            # This comes last: the file has to be ready for the first records.
+            self.app.closeRM()
+            if self.instproc is None or not self.instproc.is_alive():
+                self.instproc = mp.Process(target=ih.instServer, args=[(self.exp, self.instReqQ, self.fileReqQ, self.logQ)])
+                self.instproc.name = 'inst'
+                self.instproc.start()
+            self.instReqQ.put(ih.instRequest('Run Sequence', args=(self.appcopy, self.ring.spec())))
 
             self.sequenceWatcher()  # instigate the watchdog
 
@@ -641,7 +684,7 @@ class ExpGUI:
         metaDir = dataDir + 'meta/'
         if not os.path.exists(metaDir):
             os.makedirs(metaDir)
-        filemeta = filename[:-4] + '.meta'
+        filemeta = os.path.splitext(filename)[0] + '.meta'
 
         with open(metaDir+filemeta, 'w+') as f:
             f.write('Pxc v{:s} metadata file\n'.format(self.exp.get_version()))
@@ -651,7 +694,7 @@ class ExpGUI:
             f.write('Sample: {:s}\n'.format(self.sample.get()))
             f.write('Comment: {:s}\n'.format(self.comment.get("1.0",tk.END)))
             f.write('\n')
-            f.write(self.app.serialize().replace('COMMANDS:', '\nCOMMANDS:'))
+            f.write(self.appcopy)
 
 
 
@@ -678,7 +721,7 @@ class ExpGUI:
 
             self.exp.endSeq()
             self.updateStatus()
-            self.app.deserialize(self.appcopy)
+            self.app.deserialize(self.appdoc)
             
             for x in range(5):              
                 self.logger.critical('{:02d}\tFileProc is alive: {}\t\t InstProc is alive: {}'.format(x, self.fileproc.is_alive(), self.instproc.is_alive()))
@@ -884,6 +927,13 @@ class ExpGUI:
             self.master.destroy()
             self.exp.closeFile()
             self.exp.kill()
+            if self.instproc is not None and self.instproc.is_alive():
+                self.instReqQ.put(ih.instRequest('Terminate Inst Process'))
+            if self.ring is not None:
+                self.plotMan.detachRing()
+                self.ring.close()
+                self.ring.unlink()
+                self.ring = None
 
 
     def saveSeqFile(self):
@@ -893,8 +943,7 @@ class ExpGUI:
         seqFile = tk.filedialog.asksaveasfile(mode='w', defaultextension=".seq")
         if seqFile is None:  # asksaveasfile return `None` if dialog closed with "cancel".
             return
-        seqFile.write('Sequence file generated by version {:s}\n'.format(self.exp.get_version()))
-        seqFile.write(self.app.serialize())
+        seqFile.write(sf.dumps(sf.document(self.app, self.exp.get_version()), indent=1))
         seqFile.close()
 
     def loadSeqFile(self):
@@ -909,29 +958,19 @@ class ExpGUI:
         if seqFile is None:
             return
 
-        # Get the list of required instruments from the file
-        line = ''
-        while line != 'INSTRUMENTS:\n':
-            line = seqFile.readline()
-        self.loadInsts = []
-        instsDone = False
-        while not instsDone:
-            line = seqFile.readline()
-            if re.match('COMMANDS', line) is not None:
-                instsDone = True
-                break
-            self.loadInsts.append(line.strip())
-        seqFile.seek(0)
-        self.loadAppSer = seqFile.readlines()
-        seqFile.close()
+        # Get the list of required instruments from the file (old text files are converted)
+        try:
+            self.loadDoc = sf.loads(seqFile.read())
+        except ValueError as e:
+            tkm.showerror('Nope', message=str(e))
+            return
+        finally:
+            seqFile.close()
 
         requiredInsts = {}
-        for inst in self.loadInsts:
-            try:
-                addr, model, name = inst.strip().split('\t')
-                requiredInsts[addr] = (model, name)
-            except ValueError:
-                pass
+        for inst in self.loadDoc['instruments']:
+            if inst['name'] is not None:
+                requiredInsts[inst['address']] = (inst['model'], inst['name'])
 
         # Compare the lists: are there enough pieces of equipment hooked up to do this?
         reqModelCounts = {}
@@ -986,8 +1025,7 @@ class ExpGUI:
             model = requiredInsts[addr][0]
             name = requiredInsts[addr][1]
             addrnum = re.search('::([0-9]+)::', addr).group(1)
-            sortByModel[model].append(('{:s}:{:s}:{:s}'.format(name, addrnum, model),
-                                       '{:s}\t{:s}\t{:s}'.format(addr, model, name)))  # get both short and long formats
+            sortByModel[model].append(('{:s}:{:s}:{:s}'.format(name, addrnum, model), addr))  # short name and address
 
         activeByModel = {m:[] for m in reqModelCounts.keys()}
         for inst in self.app.instList:
@@ -1033,25 +1071,11 @@ class ExpGUI:
             if tkm.askyesno("Quit?", "Are you sure you like these settings?", parent=self.window):
                 self.window.destroy()
               
-                replacements = {}
-                for ii, (short, long) in enumerate(self.originals):
-                    replacements[short] = '{:s}:{:s}:{:s}'.format(newnames[ii], newaddrnums[ii], newmodels[ii])
-                    replacements[long] = '{:s}\t{:s}\t{:s}'.format(newaddrs[ii], newmodels[ii], newnames[ii])
-                
-                placeholders = {}
-                for ii, orig in  enumerate(list(replacements.keys())):
-                    ph = 'PLACEHOLDER{:06d}'.format(ii)
-                    placeholders[ph] = replacements[orig]
-                    replacements[orig] = ph
-                
-                self.loadAppSer = ''.join(self.loadAppSer)
-                for key in replacements.keys():
-                    self.loadAppSer = self.loadAppSer.replace(key, replacements[key])
-                for key in placeholders.keys():
-                    self.loadAppSer = self.loadAppSer.replace(key, placeholders[key])
-
-                self.loadAppSer = '\n'.join(self.loadAppSer.split('\n')[1:])
-                self.app.deserialize(self.loadAppSer, gui=self)
+                changes = {}
+                for ii, (short, addr) in enumerate(self.originals):
+                    changes[addr] = (newaddrs[ii], newmodels[ii], newnames[ii])
+                sf.remap(self.loadDoc, changes)  # all at once, so instruments can swap places
+                self.app.deserialize(self.loadDoc, gui=self, append=True)
                 self.updateSequence()
                 self.refreshInstruments()
 
@@ -1,7 +1,11 @@
-import datetime
-import numpy as np
 import logging
-import tzlocal
+import os
+import queue
+import time
+import numpy as np
+import DataStores as ds
+import DataRing as dr
+import Decimation as dc
 
 
 def fileHandler(args):
@@ -18,27 +22,28 @@ def fileHandler(args):
     dbase = DataBase(logQ)
     fp_terminate = False
     
-    while not exp.get_killFlag() and not fp_terminate:
-        if not fileReqQ.empty():
-            try:
-                req = fileReqQ.get()
-                logger.critical('###POP FILEQ: {:s}'.format(req.type))
-            except EOFError as e:
-                logger.info('FileReqQ has crashed',)
-                logger.info(e)
-            try:
-                if req.type == 'Read Latest':
-                    exp.set_fileLatest(req.execute(dbase))
-                elif req.type == 'Terminate File Process':
-                    fp_terminate = True
-                    dbase.closefile()
-                else:
-                    exp.set_fileAns(req.execute(dbase))
-            except Exception as e:
-                logger.info('Unhandled exception happened in file process')
-                logger.info('while processing {:s}-type fileRequest'.format(req.type))
-                logger.info(e)
-            fileReqQ.task_done()
+    # Block on the queue rather than spinning on it: every empty() or
+    # get_killFlag() is a round trip through the manager.  The timeout only
+    # sets how often we commit buffered records and look at the kill flag.
+    while not fp_terminate and not exp.get_killFlag():
+        try:
+            req = fileReqQ.get(timeout=pollTime)
+            handled = 0
+            while True:
+                fp_terminate = handleRequest(req, exp, dbase, logger)
+                fileReqQ.task_done()
+                handled += 1
+                if fp_terminate or handled >= maxBatch:
+                    break  # anything after a terminate belongs to the next file process
+                req = fileReqQ.get_nowait()  # drain whatever else has piled up
+        except queue.Empty:
+            pass
+        except EOFError as e:
+            logger.info('FileReqQ has crashed',)
+            logger.info(e)
+            break
+        dbase.pullRing()
+        dbase.poll()
 
     logger.info('file writing is finished')
     if dbase is not None:
@@ -46,6 +51,47 @@ def fileHandler(args):
         logger.info('closed the data file')
 
 
+pollTime = 0.25  # seconds the file process waits for a request before checking in
+maxBatch = 64  # most requests handled per wakeup
+
+
+def handleRequest(req, exp, dbase, logger):
+    """
+    Carry out one request from the file request queue.
+
+    Parameters
+    ----------
+    req : fileRequest
+        the request to carry out
+    exp : ExpController
+        shared experimental status, where the answers go
+    dbase : DataBase
+        the file controller
+    logger : logging.Logger
+        where to report problems
+
+    Returns
+    -------
+    bool
+        True if the request asked the file process to stop
+    """
+    logger.debug('###POP FILEQ: %s', req.type)
+    try:
+        if req.type == 'Read Latest':
+            exp.set_fileLatest(req.execute(dbase))
+        elif req.type == 'Write Arrays':
+            req.execute(dbase)  # nobody waits on these, so don't disturb the answer someone might
+        elif req.type == 'Terminate File Process':
+            dbase.closefile()
+            return True
+        else:
+            exp.set_fileAns(req.execute(dbase))
+    except Exception as e:
+        logger.info('Unhandled exception happened in file process')
+        logger.info('while processing {:s}-type fileRequest'.format(req.type))
+        logger.info(e)
+    return False
+
 
 class fileRequest:
     """
@@ -82,8 +128,8 @@ class fileRequest:
         
         """
         if self.type == 'New File':
-            (filepath, headers) = self.args
-            dbase.startfile(filepath, headers)
+            (filepath, headers, dtypes) = self.args
+            dbase.startfile(filepath, headers, dtypes)
             return None
 
         elif self.type == 'Open File':
@@ -91,16 +137,48 @@ class fileRequest:
             headers = dbase.openfile(filepath)
             return headers
 
+        elif self.type == 'Browse File':
+            filepath = self.args
+            headers = dbase.browsefile(filepath)
+            return headers
+
         elif self.type == 'Write Line':
-            if dbase.file is not None:
+            if dbase.store is not None and not dbase.readonly:
                 record = self.args
                 dbase.writeline(record)
             return None
 
+        elif self.type == 'Write Arrays':
+            if dbase.arrays is not None and not dbase.readonly:
+                (position, arrays) = self.args
+                dbase.writeArrays(position, arrays)
+            return None
+
+        elif self.type == 'Read Arrays':
+            (names, last) = self.args
+            return dbase.readArrays(names, last)
+
+        elif self.type == 'Attach Ring':
+            spec = self.args
+            dbase.attachRing(spec)
+            return None
+
         elif self.type == 'Close File':
             dbase.closefile()
             return None
 
+        elif self.type == 'Commit Policy':
+            (rows, interval, fsync) = self.args
+            dbase.setCommitPolicy(rows, interval, fsync)
+            return None
+
+        elif self.type == 'Export Text':
+            filepath = self.args
+            if dbase.store is None:
+                return None
+            dbase.exportText(filepath)
+            return filepath
+
         elif self.type == 'Get Current File':
             return dbase.filepath, dbase.headers
 
@@ -111,54 +189,22 @@ class fileRequest:
             return dbase.latest
 
         elif self.type == 'Read All':
-            hardlimit = 2000
-            localtz = tzlocal.get_localzone()
-
-            (xparam, yparams) = self.args
-            if dbase.file is not None:
+            (xparam, yparams) = self.args[:2]
+            maxpoints = self.args[2] if len(self.args) > 2 else None
+            (start, stop) = self.args[3] if len(self.args) > 3 and self.args[3] is not None else (0, None)
+            method = self.args[4] if len(self.args) > 4 else 'minmax'
+            if dbase.store is not None:
                 dbase.clearUnread()
-                xindex = dbase.headers.index(xparam)
-                yindices = [dbase.headers.index(yparam) for yparam in yparams]
-                xdata = [[] for yi in yindices]
-                ydata = [[] for yi in yindices]
-                try:
-                    dbase.file.seek(0, 0)
-                    dbase.file.readline()
-                except ValueError:
-                    dbase.openfile(dbase.filepath)
-                    dbase.file.seek(0, 0)
-                    dbase.file.readline()
-                for line in dbase.file:
-                    line = line.strip().split('\t')
-                    for ii, yindex in enumerate(yindices):
-                        if (line[xindex] != '-') and (line[yindex] != '-'):
-                            if xparam == 'Timestamp':
-                                timestamp = datetime.datetime.strptime(line[xindex], '%Y-%m-%d %H:%M:%S.%f')
-                                timestamp = timestamp.replace(tzinfo=localtz)
-                                xdata[ii].append(timestamp)
-                            else:
-                                xdata[ii].append(float(line[xindex]))
-                            if yparams[ii] == 'Timestamp':
-                                timestamp = datetime.datetime.strptime(line[xindex], '%Y-%m-%d %H:%M:%S.%f')
-                                timestamp = timestamp.replace(tzinfo=localtz)
-                                ydata[ii].append(timestamp)
-                            else:
-                                ydata[ii].append(float(line[yindex]))
-
-                while len(xdata) > hardlimit:
-                    xdata = [np.array(xd) for xd in xdata]
-                    ydata = [np.array(yd) for yd in ydata]
-                    if len(xdata) % 2 != 0:
-                        xdata = [np.append(xd, xd[-1]) for xd in xdata]
-                        ydata = [np.append(yd, yd[-1]) for yd in ydata]
-                    xdata = [xd.reshape(int(len(xd)/2), 2) for xd in xdata]
-                    xdata = [xd.transpose() for xd in xdata]
-                    ydata = [yd.reshape(int(len(yd)/2), 2) for yd in ydata]
-                    ydata = [yd.transpose() for yd in ydata]
-                    xdata = [list(xd[0]) for xd in xdata]
-                    ydata = [list(yd[0]) for yd in ydata]
-
-                alldata = [(xdata[ii], ydata[ii]) for ii in range(len(xdata))]
+                columns = dbase.readColumns([xparam] + list(yparams), start, stop)
+                xvals, xvalid = columns[xparam]
+                alldata = []
+                for yparam in yparams:
+                    yvals, yvalid = columns[yparam]
+                    mask = xvalid & yvalid
+                    xd, yd = dc.decimate(xvals[mask], yvals[mask], maxpoints, method)
+                    if xparam == 'Timestamp':
+                        xd = xd.astype('datetime64[ns]')
+                    alldata.append((list(xd), list(yd)))
                 return alldata
             else:
                 return [([],[])]
@@ -169,7 +215,10 @@ class fileRequest:
 class DataBase:
     """
     Class for controlling and tracking data flow into and out of datafiles.
-    No more than one file can be opened at a time.
+    No more than one file can be opened at a time.  The actual file format
+    is handled by a storage backend from ``DataStores``, chosen by the
+    file extension: ``.dat`` for tab-separated text, ``.pxcb`` for the
+    chunked binary format.
     
     Parameters
     ----------
@@ -182,10 +231,45 @@ class DataBase:
         path of the current file
     headers : list of str
         All of the column headers in the file
-    file : file
-        file handle for the data file itself
-    unread : list of dict
-        records appended to the file since the last time the GUI requested\
+    index : dict
+        Column number of each header, built once when the file is created\
+        or opened so that records don't need to search the header list
+    store : DataStores.TextStore or DataStores.ColumnStore
+        storage backend for the data file itself
+    cache : DataStores.ColumnCache
+        in-memory copy of the file's columns, which serves 'Read All'\
+        requests without rereading the file.  ``None`` when browsing.
+    arrays : DataStores.ArrayStore
+        side-car file holding the contents of the array columns, keyed by\
+        row.  ``None`` if the file has no array columns.
+    rows : int
+        number of records in the file
+    ringArrays : dict
+        arrays which came through the queue before their record came out\
+        of the ring, by position in the ring
+    ringRows : dict
+        the file row of each record from the ring whose arrays haven't\
+        come through the queue yet, by position in the ring
+    readonly : bool
+        whether the current file was opened with ``browsefile``
+    ring : DataRing.DataRing
+        shared-memory ring which the instrument process writes records\
+        into, if one is attached
+    cursor : DataRing.RingCursor
+        how far through the ring the file has got
+    commitRows : int
+        write the buffered records to the file once this many have piled up
+    commitInterval : float
+        or once the oldest buffered record is this many seconds old
+    fsync : str
+        When to force the operating system to put the file on the disk:\
+        ``'none'`` leaves it up to the OS, ``'interval'`` does it at most\
+        every ``syncInterval`` seconds, and ``'commit'`` does it on every\
+        commit.  Safer options cost throughput.
+    syncInterval : float
+        seconds between syncs for the ``'interval'`` policy
+    unread : list of list
+        records (as slot lists, in header order) appended to the file since the last time the GUI requested\
         more data: this local storage prevents needing to search the file\
         every time
     logger : logging.Logger
@@ -193,12 +277,31 @@ class DataBase:
     """
     
     
-    def __init__(self, logQ):
+    fsyncPolicies = ('none', 'interval', 'commit')
+
+    def __init__(self, logQ, commitRows=100, commitInterval=1.0, fsync='interval', syncInterval=30.0):
         self.filepath = None
         self.headers = None
-        self.file = None
+        self.index = {}
+        self.store = None
+        self.cache = None
+        self.arrays = None
+        self.rows = 0
+        self.readonly = False
+        self.ring = None
+        self.cursor = None
+        self.ringArrays = {}
+        self.ringRows = {}
         self.unread = []
         self.latest = {}
+
+        self.commitRows = commitRows
+        self.commitInterval = commitInterval
+        self.fsync = fsync
+        self.syncInterval = syncInterval
+        self.uncommitted = 0
+        self.firstUncommitted = None
+        self.lastSync = time.monotonic()
                 
         qh = logging.handlers.QueueHandler(logQ)
         self.logger = logging.getLogger('database')
@@ -221,18 +324,46 @@ class DataBase:
         self.headers : list of str
             The names of the columns in this file.
         """
-        self.unread = []
-        if self.file is not None:
-            self.file.close()
+        self.closefile()
         self.filepath = filepath
-        self.file = open(self.filepath, 'a+')
-        self.file.seek(0, 0)
-        self.headers = self.file.readline().strip().split('\t')
+        self.store = ds.storeFor(self.filepath)
+        self.headers = self.store.open()
+        self.index = {head: ii for ii, head in enumerate(self.headers)}
+        self.cache = ds.ColumnCache(self.headers, store=self.store)
+        self.rows = self.store.rowCount()
+        self.openArrays()
         self.logger.critical('opened an existing file: {:s}'.format(self.filepath))
         return self.headers
 
 
-    def startfile(self, filepath, headers):
+    def browsefile(self, filepath):
+        """
+        Open an existing data file read-only, for plotting old data.  The\
+        file is memory-mapped and nothing is cached, so each read parses\
+        only the rows and columns it asks for, and even very large files\
+        don't need to fit in memory.
+
+        Parameters
+        ----------
+        filepath : str
+            file to be opened
+
+        Returns
+        -------
+        self.headers : list of str
+            The names of the columns in this file.
+        """
+        self.closefile()
+        self.filepath = filepath
+        self.store = ds.storeFor(self.filepath)
+        self.headers = self.store.open(readonly=True)
+        self.index = {head: ii for ii, head in enumerate(self.headers)}
+        self.readonly = True
+        self.openArrays()
+        self.logger.critical('browsing an existing file: {:s}'.format(self.filepath))
+        return self.headers
+
+    def startfile(self, filepath, headers, dtypes=None):
         """
         Create a new datafile and open it for access.
         
@@ -242,53 +373,325 @@ class DataBase:
             The file to be opened
         headers : list of str
             The column headers 
+        dtypes : dict, optional
+            numpy dtype string of each column, from ``Apparatus.getVarTypes``
         """
-        self.unread = []
         self.closefile()
         self.filepath = filepath
-        if self.file is not None:
-            self.closefile()
-        self.file = open(self.filepath, 'a+')
-        self.headers = headers
-
-        self.file.write('\t'.join(self.headers) + '\n')
+        self.store = ds.storeFor(self.filepath)
+        self.store.create(headers, dtypes)
+        self.headers = self.store.headers
+        self.index = {head: ii for ii, head in enumerate(self.headers)}
+        self.cache = ds.ColumnCache(self.headers, dtypes=dict(zip(self.headers, self.store.dtypes)))
+        self.rows = 0
+        arrayHeaders = [head for head in self.headers if ds.isArrayColumn(head)]
+        if len(arrayHeaders) > 0:
+            self.arrays = ds.ArrayStore(ds.arrayPath(self.filepath))
+            self.arrays.create(arrayHeaders)
         self.logger.critical('created a new file: {:s}'.format(self.filepath))
 
-    def writeline(self, record):
+    def openArrays(self):
+        """
+        Open the array file belonging to the current data file, if it has one.
+        """
+        path = ds.arrayPath(self.filepath)
+        if os.path.exists(path):
+            self.arrays = ds.ArrayStore(path)
+            self.arrays.open(readonly=self.readonly)
+
+    def toSlots(self, record):
+        """
+        Place the values of a record into a list in header order.
+
+        Parameters
+        ----------
+        record : dict
+            headers and values; keys which aren't columns of the file\
+            are ignored
+
+        Returns
+        -------
+        slots : list
+            One value per column, ``None`` where the record has no value
+        """
+        slots = [None] * len(self.headers)
+        index = self.index
+        for key, val in record.items():
+            ii = index.get(key)
+            if ii is not None:
+                slots[ii] = val
+        return slots
+
+    def attachRing(self, spec):
+        """
+        Start taking records for the current file out of a shared-memory\
+        ring instead of from 'Write Line' requests.
+
+        Parameters
+        ----------
+        spec : tuple
+            from ``DataRing.spec()`` in the process which made the ring
+        """
+        self.detachRing()
+        self.ring = dr.DataRing.attach(spec)
+        self.cursor = self.ring.cursor()
+        self.ringArrays = {}
+        self.ringRows = {}
+        self.logger.info('attached to data ring {:s}'.format(spec[0]))
+
+    def pullRing(self):
+        """
+        Write any new records from the ring to the file.  They aren't\
+        added to the unread list, since the plots read the ring themselves.
+
+        Arrays are matched to their records by position in the ring, not\
+        by counting rows, so they still land on the right row when records\
+        were lost from the ring.
+        """
+        if self.cursor is None or self.store is None or self.readonly:
+            return
+        rows = self.cursor.slots(self.headers)
+        first = self.cursor.position - len(rows)
+        arrayCols = [ii for ii, head in enumerate(self.headers) if ds.isArrayColumn(head)]
+        for position, slots in enumerate(rows, first):
+            arrays = self.ringArrays.pop(position, None)
+            if arrays is not None:
+                for ii in arrayCols:
+                    if self.headers[ii] in arrays:
+                        slots[ii] = arrays[self.headers[ii]]  # writeline puts them in the array file
+            elif any(slots[ii] is not None for ii in arrayCols):
+                self.ringRows[position] = self.rows  # its arrays are still on the way
+            self.writeline(slots, unread=False)
+        for position in [pos for pos in self.ringArrays if pos < first]:
+            del self.ringArrays[position]  # their records were overwritten before we got to them
+        if self.cursor.lost > 0:
+            self.logger.warning('{:d} records were overwritten in the data ring before they reached the file'.format(self.cursor.lost))
+            self.cursor.lost = 0
+
+    def detachRing(self):
+        """
+        Stop reading from the ring, if there is one.
+        """
+        if self.ring is not None:
+            self.cursor = None
+            self.ring.close()
+        self.ring = None
+
+    def writeline(self, record, unread=True):
         """
         Add a single data line to the file.
         
         Parameters
         ----------
-        record : dict
-            The headers and values to append to the file.\
-            If record.keys() doesn't cover all of the headers for the \
-            current file, then a dash ``'-'`` is written to the omitted\
-            columns.
+        record : dict or list
+            Either a dict of headers and values, or a list with one value\
+            per column, in the same order as ``headers`` (see\
+            ``index``), as the ring delivers them.  Columns without a value (omitted keys,\
+            or ``None`` entries) are marked as missing (a dash ``'-'`` in\
+            text files).
+        unread : bool, optional
+            keep the record for the next 'Read Unread' request
             
         """
-        self.logger.critical('Actually writing to file')
-        self.unread.append(record)
-        for key in record.keys():
-            self.latest[key] = record[key]
-        dataline = ['-' for head in self.headers]
-        for ii, head in enumerate(self.headers):
-            if head in record.keys():
-                dataline[ii] = str(record[head])
-        dataline = '\t'.join(dataline)
+        if isinstance(record, dict):
+            slots = self.toSlots(record)
+        else:
+            slots = list(record)
+            if len(slots) != len(self.headers):
+                raise ValueError('Expected {:d} values, got {:d}'.format(len(self.headers), len(slots)))
+        for ii, val in enumerate(slots):
+            if val is not None:
+                self.latest[self.headers[ii]] = val
+        if self.arrays is not None:
+            for ii, val in enumerate(slots):
+                if isinstance(val, np.ndarray) and ds.isArrayColumn(self.headers[ii]):
+                    self.arrays.append(self.rows, self.headers[ii], val)
+                    slots[ii] = val.size  # the file itself only gets the length
+        if unread:
+            self.unread.append(slots)
+        self.store.append(slots)
+        self.cache.append(slots)
+        self.rows += 1
+
+        if self.uncommitted == 0:
+            self.firstUncommitted = time.monotonic()
+        self.uncommitted += 1
+        if self.uncommitted >= self.commitRows:
+            self.commit()
+        else:
+            self.poll()
+
+    def writeArrays(self, position, arrays):
+        """
+        Store the arrays of a record which came through the ring.
+
+        Parameters
+        ----------
+        position : int
+            position of the record in the ring
+        arrays : dict
+            headers and arrays
+        """
+        for header, val in arrays.items():
+            self.latest[header] = val
+        row = self.ringRows.pop(position, None)
+        if row is not None:
+            for header, val in arrays.items():
+                if header in self.arrays.headers:
+                    self.arrays.append(row, header, val)
+        elif self.cursor is not None and position >= self.cursor.position:
+            self.ringArrays[position] = arrays  # written when the record comes out of the ring
+        # otherwise the record itself was lost from the ring, and the arrays go with it
+
+    def readArrays(self, names, last=None):
+        """
+        Read the contents of array columns.
+
+        Parameters
+        ----------
+        names : list of str
+            headers of the array columns
+        last : int, optional
+            only read this many of the most recent arrays
+
+        Returns
+        -------
+        arrays : dict
+            For each name, a tuple ``(stamps, values)``: the timestamps of\
+            the records as ``numpy.datetime64``, and a list with the array\
+            from each record
+        """
+        out = {}
+        if self.arrays is None:
+            return {name: (np.zeros(0, dtype='datetime64[ns]'), []) for name in names}
+        stamps, valid = self.readColumns(['Timestamp'])['Timestamp']
+        for name in names:
+            rows = self.arrays.rows(name)
+            rows = rows[rows < len(stamps)]  # the arrays can arrive before the rest of their record
+            if last is not None:
+                rows = rows[-last:]
+            out[name] = (stamps[rows].astype('datetime64[ns]'), self.arrays.read(name, rows))
+        return out
+
+    def setCommitPolicy(self, rows=None, interval=None, fsync=None):
+        """
+        Change how records are grouped into writes.  Any argument left as\
+        ``None`` keeps its present value.
+
+        Parameters
+        ----------
+        rows : int, optional
+            commit once this many records are waiting
+        interval : float, optional
+            commit once the oldest waiting record is this many seconds old
+        fsync : str, optional
+            one of ``'none'``, ``'interval'``, or ``'commit'``
+        """
+        if rows is not None:
+            self.commitRows = max(1, int(rows))
+        if interval is not None:
+            self.commitInterval = float(interval)
+        if fsync is not None:
+            if fsync not in self.fsyncPolicies:
+                raise ValueError('Unknown fsync policy {:s}'.format(str(fsync)))
+            self.fsync = fsync
+        self.logger.info('commit every {:d} rows or {:.2f} s, fsync: {:s}'.format(
+            self.commitRows, self.commitInterval, self.fsync))
+
+    def commit(self):
+        """
+        Write all buffered records to the file as a single group, and sync\
+        it to disk if the fsync policy calls for it.
+        """
+        if self.store is None:
+            return
+        self.store.flush()
+        if self.arrays is not None:
+            self.arrays.flush()
+        self.uncommitted = 0
+        self.firstUncommitted = None
+        now = time.monotonic()
+        if self.fsync == 'commit' or (self.fsync == 'interval' and now - self.lastSync >= self.syncInterval):
+            self.store.sync()
+            if self.arrays is not None:
+                self.arrays.sync()
+            self.lastSync = now
+
+    def poll(self):
+        """
+        Commit the buffered records if the oldest one has waited longer\
+        than ``commitInterval``.  The file process calls this whenever it\
+        has nothing else to do.
+        """
+        if self.uncommitted > 0 and time.monotonic() - self.firstUncommitted >= self.commitInterval:
+            self.commit()
 
-        self.file.write(dataline + '\n')   # write the line to the file
-        self.file.flush()  # push the changes to disk
+    def readColumns(self, names, start=0, stop=None):
+        """
+        Read columns from the current file.  These come out of the cache,\
+        so only the first request for a column touches the file, unless\
+        the file is being browsed, in which case only the requested rows\
+        are read from the file.
+
+        Parameters
+        ----------
+        names : list of str
+            The headers of the columns to read
+        start : int, optional
+            first row to read
+        stop : int, optional
+            one past the last row to read; defaults to the last row
+
+        Returns
+        -------
+        columns : dict
+            For each name, a tuple ``(values, valid)`` of numpy arrays.\
+            Timestamps are returned in epoch nanoseconds.
+        """
+        if self.cache is None:
+            return self.store.readColumns(names, start, stop)
+        self.pullRing()
+        columns = self.cache.columns(names)
+        if start != 0 or stop is not None:
+            columns = {name: (vals[start:stop], valid[start:stop]) for name, (vals, valid) in columns.items()}
+        return columns
+
+    def exportText(self, filepath=None):
+        """
+        Write the current file out in the ``.dat`` text format.
+
+        Parameters
+        ----------
+        filepath : str, optional
+            Where to write the text file.  Defaults to the current file\
+            path with the extension replaced by ``.dat``.
+        """
+        if filepath is None:
+            filepath = self.filepath.rsplit('.', 1)[0] + ds.TextStore.extension
+        self.commit()
+        self.store.exportText(filepath)
+        self.logger.info('exported {:s} to {:s}'.format(self.filepath, filepath))
 
     def closefile(self):
         """
         Terminate the connection to the file which is presently open.
         """
         self.unread = []
-        if self.file is not None:
-            self.file.close()
+        self.pullRing()
+        self.detachRing()
+        if self.store is not None:
+            self.commit()
+            if self.fsync != 'none':
+                self.store.sync()
+            self.store.close()
             self.logger.critical('closed a file'.format(self.filepath))
-        self.file = None
+        if self.arrays is not None:
+            self.arrays.close()
+        self.store = None
+        self.cache = None
+        self.arrays = None
+        self.rows = 0
+        self.readonly = False
 
     def readUnread(self):
         """
@@ -298,13 +701,16 @@ class DataBase:
         Returns
         -------
         unread : list of dict
-            All unread records
+            All unread records, with the timestamps as ``numpy.datetime64``\
+            (UTC)
         """
-        localtz = tzlocal.get_localzone()
-        unread = self.unread[:]
-        N = len(unread)
-        for ii in range(N):
-            unread[ii]['Timestamp'] = datetime.datetime.strptime(unread[ii]['Timestamp'], '%Y-%m-%d %H:%M:%S.%f').replace(tzinfo=localtz)
+        headers = self.headers
+        unread = []
+        for slots in self.unread:
+            record = {headers[ii]: val for ii, val in enumerate(slots) if val is not None}
+            if 'Timestamp' in record:
+                record['Timestamp'] = np.datetime64(ds.toEpochNs(record['Timestamp']), 'ns')
+            unread.append(record)
         self.unread = []
         return unread
 
@@ -312,5 +718,4 @@ class DataBase:
         """
         Clears the unread record buffer.
         """
-        self.unread = []
-    
\ No newline at end of file
+        self.unread = []
\ No newline at end of file
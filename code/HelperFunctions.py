@@ -1,6 +1,11 @@
 #import tkinter as tk
 import tkinter.messagebox as tkm
 import re
+import time
+
+
+# offset between the monotonic clock and the epoch, fixed when the process starts
+_epochOffsetNs = time.time_ns() - time.monotonic_ns()
 
 
 def centerWindow(toplevel):
@@ -149,4 +154,19 @@ def shortenLoop(title):
         truncated title
     """
     title = re.search('(Loop [0-9]+):', title).group(1)
-    return title
\ No newline at end of file
+    return title
+
+
+def timestampNs():
+    """
+    Get the current time as an integer number of nanoseconds since the\
+    epoch.  This is the timestamp format carried by all records.  It\
+    follows the monotonic clock, so timestamps within a process never go\
+    backwards, even if the system clock is adjusted during a run.
+
+    Returns
+    -------
+    int
+        nanoseconds since 1970-01-01 00:00:00 UTC
+    """
+    return _epochOffsetNs + time.monotonic_ns()
@@ -1,32 +1,155 @@
 import Apparatus as ap
+import DataRing as dr
 import logging
+import queue
 
 def instHandler(*args):
     """
     Autonomous code which handles the execution of the sequence steps.
     This code will run in its own process and ship data around through
     the fileReqQ.  It is never intended to receive instructions, and runs
-    without woryying about the GUI or the file.
+    without woryying about the GUI or the file.  If the GUI passes the spec
+    of a ``DataRing`` as a sixth argument, measured records are written into
+    that instead of being queued one at a time.
+
+    This runs a single sequence and then exits; ``instServer`` does the same
+    job but stays up between runs.
     """
-    exp, instReqQ, fileReqQ, logQ, appcopy = args
-    
+    exp, instReqQ, fileReqQ, logQ, appcopy = args[:5]
+    spec = args[5] if len(args) > 5 else None
+
     qh = logging.handlers.QueueHandler(logQ)
     logger = logging.getLogger('inst')
     logger.setLevel(logging.DEBUG)
     logger.addHandler(qh)
-    
+
     logger.info('Starting Instrument Process')
-    
+
     print('inst_init')
+    app = ap.Apparatus(exp, logQ)
+    runOnce(app, appcopy, spec, fileReqQ, logger)
+
+    print('kill_insts')
+    app.releaseDrivers()
+    app.rm.close()
+    return None
+
+
+def instServer(args):
+    """
+    Long-lived instrument process.  It owns one ``Apparatus``, and with it\
+    the VISA sessions and the initialized driver objects, for as long as\
+    the GUI is open.  Each run is started by a 'Run Sequence' instRequest,\
+    and instruments used in an earlier run are picked up as they were\
+    left instead of being reopened and reinitialized.
+
+    Parameters
+    ----------
+    args : tuple
+        ``(exp, instReqQ, fileReqQ, logQ)``
+    """
+    exp, instReqQ, fileReqQ, logQ = args
+
+    qh = logging.handlers.QueueHandler(logQ)
+    logger = logging.getLogger('inst')
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(qh)
+
+    logger.info('Starting Instrument Server')
+    app = ap.Apparatus(exp, logQ)
+    terminate = False
+    while not terminate and not exp.get_killFlag():
+        try:
+            req = instReqQ.get(timeout=pollTime)
+        except queue.Empty:
+            continue
+        except EOFError as e:
+            logger.info('InstReqQ has crashed')
+            logger.info(e)
+            break
+        logger.debug('***POP INSTQ: %s', req.type)
+        try:
+            terminate = req.execute(app, fileReqQ, logger)
+        except Exception as e:
+            logger.info('Unhandled exception happened in instrument server')
+            logger.exception(e)
+        instReqQ.task_done()
+
+    logger.info('Stopping Instrument Server')
+    app.releaseDrivers()
+    app.rm.close()
+
+
+pollTime = 0.5  # seconds the server waits for a request before looking at the kill flag
+
+
+def runOnce(app, appcopy, spec, fileReqQ, logger):
+    """
+    Rebuild a sequence in an apparatus and run it to the end.
+
+    Parameters
+    ----------
+    app : Apparatus
+        where to build the sequence; drivers it already has are reused
+    appcopy : str
+        the output of ``Apparatus.serialize`` from the GUI
+    spec : tuple or None
+        ``DataRing.spec()`` of the ring for this run, if there is one
+    fileReqQ : multiprocessing.Queue
+        the file request queue
+    logger : logging.Logger
+    """
+    ring = dr.DataRing.attach(spec) if spec is not None else None
     try:
-        app = ap.Apparatus(exp, logQ)
         app.deserialize(appcopy)
-        app.runSequence(fileReqQ)
-        exp.endSeq()
+        app.runSequence(fileReqQ if ring is None else dr.RingQueue(fileReqQ, ring))
     except Exception as e:
-        logger.info('Unhandled exception occured in instHandlers:')        
+        logger.info('Unhandled exception occured in instHandlers:')
         logger.exception(e)
+    finally:
+        app.exp.endSeq()
+        if ring is not None:
+            ring.close()
 
-    print('kill_insts')
-    app.rm.close()
-    return None
+
+class instRequest:
+    """
+    A request from the GUI to the instrument server, in the same spirit\
+    as ``FileHandlers.fileRequest``.
+
+    Parameters
+    ----------
+    reqtype : str
+        'Run Sequence', 'Release Instruments' or 'Terminate Inst Process'
+    args : tuple
+        For 'Run Sequence', ``(appcopy, ringSpec)``
+    """
+
+    def __init__(self, reqtype, args=None):
+        self.type = reqtype
+        self.args = args
+
+    def execute(self, app, fileReqQ, logger):
+        """
+        Do whatever is required of this type of request.
+
+        Returns
+        -------
+        bool
+            True if the server should stop
+        """
+        if self.type == 'Run Sequence':
+            (appcopy, spec) = self.args
+            runOnce(app, appcopy, spec, fileReqQ, logger)
+            return False
+
+        elif self.type == 'Release Instruments':
+            app.releaseDrivers()
+            return False
+
+        elif self.type == 'Terminate Inst Process':
+            return True
+
+        else:
+            logger.info('Unknown instrument request: {:s}'.format(str(self.type)))
+            return False
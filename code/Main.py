@@ -25,6 +25,7 @@ if __name__ == "__main__":
         logQ = manager.Queue(-1)
                
         exp = manager.ExpController()       # Build a custom data storage object within the manager
+        exp = ec.ControlPlane(exp)          # ...but keep the busiest flags in shared memory
         
         
         ####### SET UP LOGGING #######
@@ -1,13 +1,18 @@
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import ttk
+import tkinter.messagebox as tkm
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
 import FileHandlers as fh
+import DataStores as ds
+import Decimation as dc
 import HelperFunctions as hf
 import multiprocessing as mp
 import matplotlib.dates as mdates
+import numpy as np
 import logging
+import os
 import tzlocal
 import datetime
 
@@ -22,7 +27,19 @@ class PXCplot:
     This is basically just a glorified configuration dictionary which
     wraps a bunch f matplotlib functionality into the GUI package.
     Initializes with a single curve, which is the minimum allowed.
+
+    Array-valued columns (e.g. lock-in buffers) can't be drawn against the\
+    x axis like everything else, so ``mode`` picks how to show them:\
+    ``'latest'`` plots the most recent array of each column against its\
+    index, and ``'waterfall'`` shows the last ``depth`` arrays of the first\
+    column as an image, one row per record.
+
+    Long curves are thinned to about ``maxpoints`` points for drawing, and\
+    ``decimation`` picks how: ``'minmax'`` keeps every spike, ``'lttb'``\
+    follows the shape of the curve (see ``Decimation.decimate``).
     """
+    modes = ('line', 'latest', 'waterfall')
+    decimations = ('minmax', 'lttb')
 
     def __init__(self, logQ):
 
@@ -49,6 +66,9 @@ class PXCplot:
         self.ticksize = 12
 
         self.maxpoints = 2000
+        self.decimation = 'minmax'
+        self.mode = 'line'
+        self.depth = 100
         self.filtervars = []
         self.filterlims = []
 
@@ -114,6 +134,12 @@ class PXCplot:
                             self.xdata[ii].append(float(rec[self.xparam]))
                         self.ydata[ii].append(float(rec[self.yparams[ii]]))
 
+            for ii in range(len(self.yparams)):
+                if len(self.ydata[ii]) > 2*self.maxpoints:  # thin out the curve again once it doubles
+                    xd, yd = dc.decimate(self.xdata[ii], self.ydata[ii], self.maxpoints, self.decimation)
+                    self.xdata[ii] = list(xd)
+                    self.ydata[ii] = list(yd)
+
             self.subplot.cla()
             self.logger.warning(self.yparams)
             for ii in range(len(self.yparams)):
@@ -123,6 +149,36 @@ class PXCplot:
                 self.figure.canvas.flush_events()
 
 
+    def showArrays(self, arrays):
+        """
+        Draw array columns, as picked by ``mode``.
+
+        Parameters
+        ----------
+        arrays : dict
+            output of a 'Read Arrays' fileRequest
+        """
+        self.subplot.cla()
+        if self.mode == 'latest':
+            for yparam in self.yparams:
+                stamps, values = arrays.get(yparam, ([], []))
+                if len(values) > 0 and values[-1] is not None:
+                    self.subplot.plot(np.arange(len(values[-1])), values[-1])
+            self.subplot.set_xlabel('Point')
+        else:
+            stamps, values = arrays.get(self.yparams[0], ([], []))
+            values = [v for v in values if v is not None]
+            if len(values) > 0:
+                image = np.full((len(values), max(len(v) for v in values)), np.nan)
+                for ii, v in enumerate(values):
+                    image[ii, :len(v)] = v  # pad short arrays so every row lines up
+                self.subplot.imshow(image, aspect='auto', origin='lower', interpolation='nearest')
+            self.subplot.set_xlabel('Point')
+            self.subplot.set_ylabel('Record')
+        self.figure.canvas.draw()
+        self.figure.canvas.flush_events()
+
+
     def status(self):
         self.logger.warning('------------------')
         self.logger.warning(self.xparam)
@@ -145,6 +201,7 @@ class PlotManager:
         self.fileReqQ = fileReqQ
         self.logQ = logQ
         self.master = master
+        self.cursor = None  # place in the DataRing of the current run, if any
 
         # initialize logging object
         self.logger = logging.getLogger('plotman')
@@ -249,12 +306,22 @@ class PlotManager:
         """
         Start over: reread all of the data, relabel everything,
         """
-        self.fileReqQ.put(fh.fileRequest('Read All', args=(self.plots[0].xparam, self.plots[0].yparams)))
+        if self.plots[0].mode != 'line':
+            self.readArrays()
+            if self.cursor is not None:
+                self.cursor.skip()
+            return
+
+        self.fileReqQ.put(fh.fileRequest('Read All', args=(self.plots[0].xparam, self.plots[0].yparams,
+                                                           self.plots[0].maxpoints, None,
+                                                           self.plots[0].decimation)))
         self.logger.critical('###LOAD FILEQ: {:s}'.format('read all'))
         self.fileReqQ.join()
         alldata=self.exp.get_fileAns()
 
         self.plots[0].rebuild(alldata)
+        if self.cursor is not None:
+            self.cursor.skip()  # everything so far came in with the rebuild
 
 
 
@@ -262,15 +329,58 @@ class PlotManager:
         """
         Grab the most recent data and append it to the plot
         """
+        if self.plots[0].mode != 'line':
+            if self.cursor is not None:
+                if self.cursor.position == self.cursor.ring.written:
+                    return  # no new records, so no new arrays
+                self.cursor.skip()
+            self.readArrays()
+            return
+
+        if self.cursor is not None:
+            unread = self.cursor.records()  # straight out of shared memory
+        else:
+            self.fileReqQ.put(fh.fileRequest('Read Unread', args=(self.plots[0].xparam, self.plots[0].yparams)))
+            self.logger.critical('###LOAD FILEQ: {:s}'.format('read unread'))
+            self.fileReqQ.join()
+            unread=self.exp.get_fileAns()
+
+        self.plots[0].update(unread)
+
+
 
-        self.fileReqQ.put(fh.fileRequest('Read Unread', args=(self.plots[0].xparam, self.plots[0].yparams)))
-        self.logger.critical('###LOAD FILEQ: {:s}'.format('read unread'))
+    def readArrays(self):
+        """
+        Fetch the arrays to show from the file process, and draw them.
+        """
+        plot = self.plots[0]
+        last = 1 if plot.mode == 'latest' else plot.depth
+        self.fileReqQ.put(fh.fileRequest('Read Arrays', args=(plot.yparams, last)))
+        self.logger.critical('###LOAD FILEQ: {:s}'.format('read arrays'))
         self.fileReqQ.join()
-        unread=self.exp.get_fileAns()
+        plot.showArrays(self.exp.get_fileAns())
 
-        self.plots[0].update(unread)
 
 
+    def attachRing(self, ring):
+        """
+        Read new data for the plots directly from the shared ring which the\
+        instrument process writes, rather than asking the file process.
+
+        Parameters
+        ----------
+        ring : DataRing.DataRing
+            the ring for the current run
+        """
+        self.cursor = ring.cursor()
+
+
+    def detachRing(self):
+        """
+        Go back to asking the file process for new data.
+        """
+        self.cursor = None
+
 
     def clearPlots(self):
         """
@@ -302,7 +412,10 @@ class PlotManager:
 
         state = tk.DISABLED if self.running else tk.NORMAL
         self.changePath = tk.Button(self.window, text='Edit', command=self.chooseDataFile, state=state)
-        self.changePath.grid(row=0, column=4, columnspan=2, sticky='NSE')
+        self.changePath.grid(row=0, column=5, sticky='NSE')
+        self.exportPath = tk.Button(self.window, text='Export Text', command=self.exportDataFile,
+                                    state=tk.NORMAL if self.plotfile != 'None selected' else tk.DISABLED)
+        self.exportPath.grid(row=0, column=4, sticky='NSE')
 
         self.paramFrame = tk.Frame(self.window)
         self.paramFrame.grid(row=1, column=0, columnspan=6, sticky='NSEW')
@@ -390,6 +503,20 @@ class PlotManager:
         self.y2minBox = tk.Entry(self.window, textvariable=self.y2minVar, width=10)
         self.y2maxBox = tk.Entry(self.window, textvariable=self.y2maxVar, width=10)
 
+        tk.Label(self.window, text='Plot type:').grid(row=5, column=0, sticky='NSE')
+        self.modeVar = tk.StringVar()
+        self.modeBox = ttk.Combobox(self.window, textvariable=self.modeVar, width=10, state='readonly')
+        self.modeBox['values'] = PXCplot.modes
+        self.modeBox.grid(row=5, column=1, sticky='NSEW')
+        self.modeVar.set(self.plots[0].mode)
+
+        tk.Label(self.window, text='Thinning:').grid(row=5, column=2, sticky='NSE')
+        self.decimationVar = tk.StringVar()
+        self.decimationBox = ttk.Combobox(self.window, textvariable=self.decimationVar, width=10, state='readonly')
+        self.decimationBox['values'] = PXCplot.decimations
+        self.decimationBox.grid(row=5, column=3, sticky='NSEW')
+        self.decimationVar.set(self.plots[0].decimation)
+
         self.xminBox.grid(row=4, column=0, sticky='NSEW')
         self.xmaxBox.grid(row=4, column=1, sticky='NSEW')
         self.y1minBox.grid(row=4, column=2, sticky='NSEW')
@@ -564,23 +691,44 @@ class PlotManager:
         self.plots[0].autox = self.autoXVar.get()
         self.plots[0].autoy1 = self.autoY1Var.get()
         self.plots[0].autoy2 = self.autoY2Var.get()
+        self.plots[0].mode = self.modeVar.get()
+        self.plots[0].decimation = self.decimationVar.get()
 
         self.plots[0].isSetup = True
         self.rebuildPlots()
         self.window.destroy()
 
 
+    def exportDataFile(self):
+        """
+        Write the file being plotted out in the ``.dat`` text format, e.g.\
+        to open a binary ``.pxcb`` file in other programs.
+        """
+        name = os.path.splitext(os.path.basename(self.pathLabel['text']))[0] + ds.TextStore.extension
+        filepath = filedialog.asksaveasfilename(defaultextension=ds.TextStore.extension, initialfile=name,
+                                                filetypes=(("Text Data Files", "*.dat"), ("All files", "*.*")))
+        if filepath == '':
+            return
+        self.fileReqQ.put(fh.fileRequest('Export Text', args=filepath))
+        self.logger.critical('###LOAD FILEQ: {:s}'.format('export text'))
+        self.fileReqQ.join()
+        if self.exp.get_fileAns() != filepath:
+            tkm.showwarning('Export Text', 'Could not export the data file to {:s}'.format(filepath))
+
+
     def chooseDataFile(self):
         """
         Select a new data file to plot
         """
-        self.plotFileName = filedialog.askopenfilename(filetypes=(("Data Files", "*.dat"), ("All files", "*.*")))
+        self.plotFileName = filedialog.askopenfilename(filetypes=(("Data Files", "*.dat *.pxcb"), ("All files", "*.*")))
 
         self.xaxisBox.state = tk.NORMAL
         for yb in self.yaxisBoxes:
             yb.state = tk.NORMAL
         if self.plotFileName != '':
             self.pathLabel['text'] = self.plotFileName
+            self.exportPath['state'] = tk.NORMAL
+            self.detachRing()  # the ring belongs to the running sequence, not this file
 
             if not self.exp.isFileOpen():
                 self.exp.openFile()
@@ -592,7 +740,7 @@ class PlotManager:
             fileproc.name = 'pfile'
             fileproc.start()
 
-            self.fileReqQ.put(fh.fileRequest('Open File', args=self.plotFileName))
+            self.fileReqQ.put(fh.fileRequest('Browse File', args=self.plotFileName))
             self.logger.critical('###LOAD FILEQ: {:s}'.format('open file'))
             self.fileReqQ.join()
             self.availQuants = hf.plottable(self.exp.get_fileAns())
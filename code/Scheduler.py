@@ -0,0 +1,120 @@
+import math
+import time
+
+
+class Scheduler:
+    """
+    Keeps a loop running at a fixed rate.  Deadlines are laid out on a grid\
+    ``start + n * period`` of ``time.monotonic()``, so the time spent\
+    reading instruments doesn't add to the period and the phase never\
+    drifts.  If a pass through the loop overruns one or more deadlines,\
+    they are skipped and counted as missed, and the loop picks up again on\
+    the next deadline of the same grid.
+
+    Parameters
+    ----------
+    period : float
+        seconds between deadlines
+    spin : float, optional
+        The last few seconds before a deadline are spent checking the\
+        clock rather than sleeping, since ``time.sleep`` can overshoot by\
+        a whole scheduler tick on some systems.
+    nap : float, optional
+        longest single sleep, so that ``wait`` notices an abort promptly
+
+    Attributes
+    ----------
+    ticks : int
+        number of deadlines reached so far
+    missed : int
+        number of deadlines skipped because the loop was still busy
+    """
+
+    def __init__(self, period, spin=0.002, nap=0.25):
+        self.period = float(period)
+        self.spin = spin
+        self.nap = nap
+        self.start()
+
+    def start(self):
+        """
+        Put the first deadline now, and clear the statistics.
+        """
+        self.t0 = time.monotonic()
+        self.ticks = 0
+        self.missed = 0
+        self.lateSum = 0.0
+        self.lateSq = 0.0
+        self.lateMax = 0.0
+
+    def elapsed(self):
+        """
+        Seconds since ``start()``.
+        """
+        return time.monotonic() - self.t0
+
+    def deadline(self, tick):
+        """
+        Monotonic time of a given deadline.
+        """
+        return self.t0 + tick * self.period
+
+    def wait(self, abort=None):
+        """
+        Sleep until the next deadline.
+
+        Parameters
+        ----------
+        abort : function, optional
+            Checked while sleeping; if it returns True, stop waiting early.
+
+        Returns
+        -------
+        bool
+            True if the deadline was reached, False if aborted
+        """
+        tick = self.ticks + 1
+        now = time.monotonic()
+        if now > self.deadline(tick):  # overran: skip to the next deadline still ahead
+            skip = int(math.floor((now - self.t0) / self.period)) + 1
+            self.missed += skip - tick
+            tick = skip
+        target = self.deadline(tick)
+        while True:
+            remaining = target - time.monotonic()
+            if remaining <= 0:
+                break
+            if abort is not None and abort():
+                return False
+            if remaining > self.spin:
+                time.sleep(min(remaining - self.spin, self.nap))
+        late = time.monotonic() - target
+        self.ticks = tick
+        self.lateSum += late
+        self.lateSq += late * late
+        self.lateMax = max(self.lateMax, late)
+        return True
+
+    def jitter(self):
+        """
+        How late the loop woke up, relative to its deadlines.
+
+        Returns
+        -------
+        mean : float
+            average lateness in seconds
+        rms : float
+            root-mean-square lateness in seconds
+        worst : float
+            largest lateness in seconds
+        """
+        waits = max(self.ticks - self.missed, 1)
+        return self.lateSum / waits, math.sqrt(self.lateSq / waits), self.lateMax
+
+    def report(self):
+        """
+        A one-line summary of how well the loop kept time, for the log.
+        """
+        mean, rms, worst = self.jitter()
+        return '{:d} ticks of {:.3f} s, {:d} missed, jitter {:.2f} ms mean, {:.2f} ms rms, {:.2f} ms worst'.format(
+            self.ticks, self.period, self.missed, mean * 1e3, rms * 1e3, worst * 1e3)
@@ -0,0 +1,248 @@
+import json
+import re
+import numpy as np
+
+FORMAT = 'PXC sequence'
+VERSION = 1  # bump this, and add to MIGRATIONS, whenever the layout of a document changes
+
+LEGACY_INTS = ('rows', 'npoints', 'loopPos')  # fields the old text format saved as floats
+LEGACY_FLOATS = ('allValues',)  # lists the old text format saved as strings
+
+
+def shortName(address, model, name):
+    """
+    How an instrument is shown in the sequence (see ``Instrument.__str__``).
+    """
+    return '{:s}:{:s}:{:s}'.format(str(name), address[7:9].strip(':'), model)
+
+
+def plain(value):
+    """
+    Convert a setting into something JSON can hold without guessing:\
+    numpy arrays and scalars become lists and numbers, and any other\
+    object becomes its string, as it always did in the text format.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [plain(x) for x in value]
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    return str(value)
+
+
+def document(app, version=None):
+    """
+    Describe an apparatus and its sequence.
+
+    Parameters
+    ----------
+    app : Apparatus
+    version : str, optional
+        version of the program, recorded for reference
+
+    Returns
+    -------
+    doc : dict
+        ``'format'``, ``'version'`` (of the layout), ``'instruments'``: a\
+        list of ``{'address', 'model', 'name'}``, and ``'commands'``: the\
+        ``SeqCmd.state`` of each step, in order
+    """
+    doc = {'format': FORMAT, 'version': VERSION}
+    if version is not None:
+        doc['pxc'] = version
+    doc['instruments'] = [{'address': inst.address, 'model': inst.model, 'name': inst.name}
+                          for inst in app.instList]
+    doc['commands'] = [{key: plain(val) for key, val in cmd.state().items()} for cmd in app.sequence]
+    return doc
+
+
+def dumps(doc, indent=None):
+    """
+    Write a document out as text.
+
+    Parameters
+    ----------
+    doc : dict
+        the output of ``document``
+    indent : int, optional
+        for files people might read; leave it out for speed
+
+    Returns
+    -------
+    str
+    """
+    if indent is None:
+        return json.dumps(doc, separators=(',', ':'))
+    return json.dumps(doc, indent=indent)
+
+
+def loads(text):
+    """
+    Read a document from text, in the present format or any older one,\
+    including the tab-indented text of sequence files saved before the\
+    format had a version.
+
+    Parameters
+    ----------
+    text : str
+
+    Returns
+    -------
+    doc : dict
+        brought up to date with ``migrate``
+
+    Raises
+    ------
+    ValueError
+        if the text isn't a sequence at all, or is from a newer version
+    """
+    if text.lstrip().startswith('{'):
+        doc = json.loads(text)
+        if doc.get('format') != FORMAT:
+            raise ValueError('Not a sequence file')
+    else:
+        doc = parseLegacy(text)
+    return migrate(doc)
+
+
+def migrate(doc):
+    """
+    Bring a document up to the present ``VERSION``, one step at a time.
+    """
+    version = doc.get('version', 0)
+    if version > VERSION:
+        raise ValueError('Sequence saved by a newer version (format {:d}, this reads up to {:d})'.format(version, VERSION))
+    while version < VERSION:
+        doc = MIGRATIONS[version](doc)
+        version = doc['version']
+    return doc
+
+
+def fromLegacy(doc):
+    """
+    Version 0 (the old text format) to version 1: the text format stored\
+    everything as strings or floats, so put back the types it lost.
+    """
+    for cmd in doc['commands']:
+        for key in LEGACY_INTS:
+            if isinstance(cmd.get(key), float):
+                cmd[key] = int(cmd[key])
+        for key in LEGACY_FLOATS:
+            if isinstance(cmd.get(key), list):
+                cmd[key] = [legacyFloat(x) for x in cmd[key]]
+    doc['version'] = 1
+    return doc
+
+
+def legacyFloat(text):
+    """
+    Read a number from the old text format, which under numpy 2 was\
+    written out as e.g. ``np.float64(0.5)``.
+    """
+    match = re.fullmatch(r'np\.\w+\((.*)\)', text)
+    return float(match.group(1) if match else text)
+
+
+MIGRATIONS = {0: fromLegacy}  # version: function which upgrades a document from that version to the next
+
+
+def parseLegacy(text):
+    """
+    Read the text format used before sequences were saved as JSON: an\
+    ``INSTRUMENTS:`` section of tab-separated address, model and name,\
+    then a ``COMMANDS:`` section of ``Sequence Command`` blocks with one\
+    ``key = value`` line per setting.
+
+    Returns
+    -------
+    doc : dict
+        a version 0 document
+    """
+    lines = text.split('\n')
+    try:
+        start = lines.index('INSTRUMENTS:')
+        stop = lines.index('COMMANDS:')
+    except ValueError:
+        raise ValueError('Not a sequence file')
+
+    instruments = []
+    for line in lines[start+1:stop]:
+        if line.strip() == '':
+            continue
+        try:
+            iaddr, imodel, iname = line.strip().split('\t')
+        except ValueError:
+            iaddr, imodel = line.strip().split('\t')
+            iname = None
+        instruments.append({'address': iaddr, 'model': imodel, 'name': iname})
+
+    # parse the sequence into a list of dicts, one for each step
+    allSteps = []
+    for line in lines[stop+1:]:
+        if line != '':
+            if re.match('Sequence Command', line) is not None:
+               allSteps.append({})
+            elif line[0] == '\t':
+               try:
+                   name = re.search('(.+) =', line.strip()).group(1)
+                   try:
+                       val = re.search('= (.+)', line.strip()).group(1)
+                   except AttributeError:
+                       val = ''
+                   if val != '':
+                       if val[0] == '[':
+                           val = val.split(',')
+                           val = [x.strip('[]"\' ') for x in val]
+                       if name == 'rows':
+                           allSteps[-1][name] = int(val)
+                       elif name == 'enabled':
+                           allSteps[-1][name] = (val.strip()=='True')
+                       else:
+                           try:
+                               allSteps[-1][name] = float(val)
+                           except (ValueError, TypeError):
+                               allSteps[-1][name] = val
+               except AttributeError:
+                   pass
+    return {'format': FORMAT, 'version': 0, 'instruments': instruments, 'commands': allSteps}
+
+
+def remap(doc, changes):
+    """
+    Move a sequence onto different instruments, e.g. when loading a file\
+    saved on another setup.
+
+    Parameters
+    ----------
+    doc : dict
+        a document, which is changed in place
+    changes : dict
+        ``{old address: (new address, new model, new name)}``
+
+    Returns
+    -------
+    doc : dict
+    """
+    renames = {}
+    for inst in doc['instruments']:
+        if inst['address'] in changes:
+            old = shortName(inst['address'], inst['model'], inst['name'])
+            inst['address'], inst['model'], inst['name'] = changes[inst['address']]
+            renames[old] = shortName(inst['address'], inst['model'], inst['name'])
+
+    def rename(val):
+        if isinstance(val, str):
+            return renames.get(val, val)
+        if isinstance(val, list):
+            return [rename(x) for x in val]
+        return val
+
+    for cmd in doc['commands']:
+        for key in cmd:
+            cmd[key] = rename(cmd[key])
+    return doc
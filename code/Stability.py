@@ -0,0 +1,188 @@
+import collections
+import math
+
+
+class StabilityDetector:
+    """
+    Decides whether a parameter has settled on a target value.  It is fed\
+    one ``(time, value)`` sample at a time, and keeps only the samples\
+    from the last ``window`` seconds.  The smallest and largest of those\
+    are tracked with monotonic deques, and running sums give the mean,\
+    standard deviation and least-squares slope, so each new sample costs\
+    the same however long the window is or however often it is polled.
+
+    The parameter is stable once it has been watched for at least\
+    ``window`` seconds and every sample in that time was within\
+    ``tolerance`` of ``target``.  Optionally, the fitted slope and the\
+    standard deviation over the window must also be small enough.
+
+    Parameters
+    ----------
+    target : float
+        the value to settle on
+    tolerance : float
+        largest allowed deviation from ``target``
+    window : float
+        seconds the parameter must stay within ``tolerance``
+    maxSlope : float, optional
+        largest allowed drift, in units per second.  Zero or None to ignore.
+    maxNoise : float, optional
+        largest allowed standard deviation.  Zero or None to ignore.
+    minSamples : int, optional
+        fewest samples in the window before it can count as stable
+    """
+
+    def __init__(self, target, tolerance, window, maxSlope=None, maxNoise=None, minSamples=1):
+        self.target = float(target)
+        self.tolerance = float(tolerance)
+        self.window = max(0.0, float(window))
+        self.maxSlope = maxSlope if maxSlope else None
+        self.maxNoise = maxNoise if maxNoise else None
+        self.minSamples = max(1, int(minSamples))
+        self.reset()
+
+    def reset(self):
+        """
+        Forget every sample, e.g. after the target has been changed.
+        """
+        self.samples = collections.deque()
+        self.lows = collections.deque()   # values increase from left to right
+        self.highs = collections.deque()  # values decrease from left to right
+        self.since = None
+        self.origin = None  # sums are taken relative to the first sample, to keep their precision
+        self.st = self.sv = self.stt = self.svv = self.stv = 0.0
+
+    def add(self, t, value):
+        """
+        Take one sample.
+
+        Parameters
+        ----------
+        t : float
+            time of the sample in seconds, e.g. ``Scheduler.elapsed()``;\
+            it must not decrease from one sample to the next
+        value : float
+            A reading which isn't a number, such as the ``'-'`` an\
+            instrument gives when it doesn't answer, or None, is skipped:\
+            it doesn't count as a sample.
+
+        Returns
+        -------
+        bool
+            True if the parameter is now stable
+        """
+        t = float(t)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = math.nan
+        if math.isnan(value):
+            return self.isStable()  # judged on the samples there are
+        if self.since is None:
+            self.since = t
+            self.origin = (t, value)
+        x = t - self.origin[0]
+        y = value - self.origin[1]
+
+        self.samples.append((t, value))
+        self.st += x
+        self.sv += y
+        self.stt += x * x
+        self.svv += y * y
+        self.stv += x * y
+
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((t, value))
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((t, value))
+
+        self.expire(t)
+        return self.isStable(t)
+
+    def expire(self, now):
+        """
+        Drop the samples which have fallen out of the window.
+        """
+        start = now - self.window
+        while self.samples[0][0] < start:
+            t, value = self.samples.popleft()
+            x = t - self.origin[0]
+            y = value - self.origin[1]
+            self.st -= x
+            self.sv -= y
+            self.stt -= x * x
+            self.svv -= y * y
+            self.stv -= x * y
+        while self.lows[0][0] < start:
+            self.lows.popleft()
+        while self.highs[0][0] < start:
+            self.highs.popleft()
+
+    def count(self):
+        return len(self.samples)
+
+    def minimum(self):
+        return self.lows[0][1] if self.lows else math.nan
+
+    def maximum(self):
+        return self.highs[0][1] if self.highs else math.nan
+
+    def mean(self):
+        n = len(self.samples)
+        return self.origin[1] + self.sv / n if n else math.nan
+
+    def noise(self):
+        """
+        Standard deviation of the samples in the window.
+        """
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        return math.sqrt(max(0.0, self.svv / n - (self.sv / n) ** 2))
+
+    def slope(self):
+        """
+        Least-squares slope of the samples in the window, in units per second.
+        """
+        n = len(self.samples)
+        spread = n * self.stt - self.st * self.st
+        if n < 2 or spread <= 0:
+            return 0.0
+        return (n * self.stv - self.st * self.sv) / spread
+
+    def isStable(self, now=None):
+        """
+        Whether the parameter has settled.
+
+        Parameters
+        ----------
+        now : float, optional
+            current time; defaults to the time of the latest sample
+
+        Returns
+        -------
+        bool
+        """
+        if not self.samples:
+            return False
+        if now is None:
+            now = self.samples[-1][0]
+        if now - self.since < self.window or len(self.samples) < self.minSamples:
+            return False
+        if abs(self.maximum() - self.target) >= self.tolerance \
+                or abs(self.minimum() - self.target) >= self.tolerance:
+            return False
+        if self.maxSlope is not None and abs(self.slope()) > self.maxSlope:
+            return False
+        if self.maxNoise is not None and self.noise() > self.maxNoise:
+            return False
+        return True
+
+    def report(self):
+        """
+        A one-line summary of the window, for the log.
+        """
+        return '{:d} samples over {:.1f} s: {:.4g} to {:.4g}, mean {:.4g}, sd {:.3g}, slope {:.3g}/s'.format(
+            self.count(), self.window, self.minimum(), self.maximum(), self.mean(), self.noise(), self.slope())
@@ -2,9 +2,10 @@ import tkinter as tk
 from tkinter import ttk
 from . import SeqCommand as sc
 import FileHandlers as fh
-from datetime import datetime
-import time
+import Scheduler as sch
+import Stability as st
 import HelperFunctions as hf
+import BusExecutor as bx
 import numpy as np
 
 
@@ -48,6 +49,12 @@ class CMeasCmd(sc.SeqCmd):
     stability : float
         maximum deviation from ``conditionVal`` for it still to be \
         considered stable
+    maxSlope : float
+        if nonzero, the drift of the parameter over ``stableTime`` (units\
+        per second) must also be less than this
+    maxNoise : float
+        if nonzero, the standard deviation of the parameter over\
+        ``stableTime`` must also be less than this
     pollTime : float
         how often (in seconds) to check the condition parameter
     mode : str
@@ -67,6 +74,8 @@ class CMeasCmd(sc.SeqCmd):
         self.waitParam = ''  # what (if anything) to wait for
         self.stableTime = 10.0  # How long to require stability
         self.stability = 1.0  # Stay less than this value away from the final value for the required time
+        self.maxSlope = 0.0  # optional limit on drift while stable, zero to ignore
+        self.maxNoise = 0.0  # optional limit on standard deviation while stable, zero to ignore
         self.pollTime = 1.0  # Check the value this often
         self.target = 0.0
 
@@ -96,9 +105,9 @@ class CMeasCmd(sc.SeqCmd):
         """
         self.running = running
         self.rows = int(self.rows)
-        self.labels = [None for x in range(4)]
-        self.boxes = [None for x in range(4)]
-        self.units = [None for x in range(4)]
+        self.labels = [None for x in range(6)]
+        self.boxes = [None for x in range(6)]
+        self.units = [None for x in range(6)]
         self.waitTrace = None
         self.waitParamTrace = None
         state = tk.DISABLED if self.running else tk.NORMAL
@@ -119,6 +128,8 @@ class CMeasCmd(sc.SeqCmd):
         self.waitParamVar = tk.StringVar()  # what (if anything) to wait for
         self.stableTimeVar = tk.DoubleVar()  # How long to require stability
         self.stabilityVar = tk.DoubleVar()  # Stay less than this value away from the final value for the required time
+        self.maxSlopeVar = tk.DoubleVar()  # optional limit on drift while stable, zero to ignore
+        self.maxNoiseVar = tk.DoubleVar()  # optional limit on standard deviation while stable, zero to ignore
         self.pollTimeVar = tk.DoubleVar()  # Check the value this often
         self.targetVar = tk.DoubleVar()
 
@@ -128,6 +139,8 @@ class CMeasCmd(sc.SeqCmd):
         self.waitParamVar.set(self.waitParam)
         self.stableTimeVar.set(self.stableTime)
         self.stabilityVar.set(self.stability)
+        self.maxSlopeVar.set(self.maxSlope)
+        self.maxNoiseVar.set(self.maxNoise)
         self.pollTimeVar.set(self.pollTime)
         self.targetVar.set(self.target)
 
@@ -172,11 +185,11 @@ class CMeasCmd(sc.SeqCmd):
         """
 
         rowpx = self.rowheight*(self.rows+1)
-        condpx = self.rowheight*3 if self.waitVar.get() == 'Time' else self.rowheight*7
+        condpx = self.rowheight*3 if self.waitVar.get() == 'Time' else self.rowheight*9
         height = max((rowpx,condpx))
         width = 600 if self.waitVar.get() == 'Time' else 830
         self.window.geometry('{:d}x{:d}'.format(width,height))
-        for ii in range(max(7, self.rows+1)):
+        for ii in range(max(9, self.rows+1)):
             self.window.grid_rowconfigure(ii, weight=0, minsize=self.rowheight)
 
 
@@ -288,6 +301,8 @@ class CMeasCmd(sc.SeqCmd):
             unit = param.units
             self.units[0]['text'] = unit
             self.units[1]['text'] = unit
+            self.units[3]['text'] = '{}/s'.format(unit) if unit else '/s'
+            self.units[4]['text'] = unit
 
         self.updateValues()
 
@@ -334,6 +349,8 @@ class CMeasCmd(sc.SeqCmd):
             self.labels[1] = tk.Label(self.window, text='Value:')
             self.labels[2] = tk.Label(self.window, text='Stability Window: +/-')
             self.labels[3] = tk.Label(self.window, text='Stable Time:')
+            self.labels[4] = tk.Label(self.window, text='Max Slope (0 ignores):')
+            self.labels[5] = tk.Label(self.window, text='Max Noise (0 ignores):')
 
             state = tk.DISABLED if self.running else tk.NORMAL
             self.boxes[0] = ttk.Combobox(self.window, textvariable=self.waitInstVar, width=20, state=state)
@@ -354,6 +371,8 @@ class CMeasCmd(sc.SeqCmd):
             self.boxes[1] = tk.Entry(self.window, textvariable=self.targetVar, state=state)
             self.boxes[2] = tk.Entry(self.window, textvariable=self.stabilityVar, state=state)
             self.boxes[3] = tk.Entry(self.window, textvariable=self.stableTimeVar, state=state)
+            self.boxes[4] = tk.Entry(self.window, textvariable=self.maxSlopeVar, state=state)
+            self.boxes[5] = tk.Entry(self.window, textvariable=self.maxNoiseVar, state=state)
 
             inst = self.instruments[self.stringInsts.index(self.waitInstVar.get())]
             param = inst.getParam(self.waitParamVar.get())
@@ -361,6 +380,8 @@ class CMeasCmd(sc.SeqCmd):
             self.units[0] = tk.Label(self.window, text=unit)
             self.units[1] = tk.Label(self.window, text=unit)
             self.units[2] = tk.Label(self.window, text='s')
+            self.units[3] = tk.Label(self.window, text='{}/s'.format(unit) if unit else '/s')
+            self.units[4] = tk.Label(self.window, text=unit)
 
             for ii in range(len(self.labels)):
                 self.labels[ii].grid(column=0, row=3 + ii, sticky='NSE', padx=5)
@@ -397,6 +418,8 @@ class CMeasCmd(sc.SeqCmd):
                 self.targetVar.set(min(self.targetVar.get(), pmax))
                 self.stabilityVar.set(abs(min(self.stabilityVar.get(), pmax)))
 
+        self.maxSlopeVar.set(abs(self.maxSlopeVar.get()))
+        self.maxNoiseVar.set(abs(self.maxNoiseVar.get()))
         self.pollTimeVar.set(max(0.1, self.pollTimeVar.get()))
 
 
@@ -424,6 +447,8 @@ class CMeasCmd(sc.SeqCmd):
         self.waitParam = self.waitParamVar.get()
         self.stableTime = self.stableTimeVar.get()
         self.stability = self.stabilityVar.get()
+        self.maxSlope = self.maxSlopeVar.get()
+        self.maxNoise = self.maxNoiseVar.get()
         self.pollTime = self.pollTimeVar.get()
         self.target = self.targetVar.get()
 
@@ -451,6 +476,8 @@ class CMeasCmd(sc.SeqCmd):
         self.boxes = []
         self.labels = []
         self.stabilityVar = None
+        self.maxSlopeVar = None
+        self.maxNoiseVar = None
         self.paramBoxes = []
         self.instBoxes = []
         self.selInstsVar = []
@@ -472,6 +499,35 @@ class CMeasCmd(sc.SeqCmd):
         self.title = hf.enumSequence(self.pos, self.title)
 
 
+    def compile(self):
+        """
+        Resolve the rows, and the condition if there is one, to their\
+        instruments, parameters and data file headers.
+
+        Returns
+        -------
+        plan : dict
+            ``'reads'``: list of ``(inst, param)`` to read every time,\
+            ``'headers'``: the ``measHeaders`` of each, and, when waiting on\
+            a condition, ``'waitHeader'``: where to find its value and\
+            ``'waitText'``: the status line
+        """
+        sc.SeqCmd.compile(self)
+        allInsts = self.selInsts[:]
+        allParams = self.selParams[:]
+        if self.wait == 'Condition':
+            allInsts.append(self.waitInst)
+            allParams.append(self.waitParam)
+            inst, param = self.bind(self.waitInst, self.waitParam)
+            self.plan['waitHeader'] = sc.formatHeader(inst, param, param.units)
+            self.plan['waitText'] = 'Condition:  \t{:s} = {:.0f} +/- {:.1f}, {:.0f} s'.format(
+                param.name, self.target, self.stability, self.stableTime)
+        reads = [self.bind(allInsts[ii], allParams[ii]) for ii in range(len(allInsts))]
+        self.plan['reads'] = reads
+        self.plan['headers'] = [sc.measHeaders(inst, param) for inst, param in reads]
+        return self.plan
+
+
     def execute(self, fileReqQ):
         """
         Actually run the sequence
@@ -481,37 +537,24 @@ class CMeasCmd(sc.SeqCmd):
         fileReqQ : multiprocessing.Queue
             Queue for sending data to the file
         """
-        self.stringInsts = [str(x) for x in self.instruments]
         if not self.exp.isAborted():
+            plan = self.planned()
+            reads = plan['reads']
+            headers = plan['headers']
             waitIter = 0
-            starttime = datetime.today()
             timeElapsed = 0
             self.polltime = max(0.1, self.pollTime)  # don't let the user check more often than 10x per second
-            datapoints = int(
-                self.stableTime / self.polltime)  # number of most recent datapoints to use when checking for stability
-            stableData = [self.target + 2 * self.stability for x in
-                          range(datapoints)]  # buffer for most recent datapoints: initialize to outside stability window
+            detector = st.StabilityDetector(self.target, self.stability, self.stableTime, self.maxSlope,
+                                            self.maxNoise)  # stable once the last stableTime seconds are all in range
             timeout = self.timeout  # how long to wait before moving on (regardless of condition
             record = {}
+            schedule = sch.Scheduler(self.polltime)  # read on a fixed grid, however long the reads take
             while timeElapsed <= (timeout if timeout > 0 else 1e7):  # if zero, wait about four months)
-                record['Timestamp'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S.%f')  # always grab a timestamp
+                record['Timestamp'] = hf.timestampNs()  # always grab a timestamp
 
-                allInsts = self.selInsts[:]
-                allParams = self.selParams[:]
-                if self.wait == 'Condition':
-                    allInsts.append(self.waitInst)
-                    allParams.append(self.waitParam)
-
-                for ii in range(len(allInsts)):
-                    inst = self.instruments[self.stringInsts.index(allInsts[ii])]
-                    param = inst.getParam(allParams[ii])
-                    val = inst.readParam(str(param))
-                    if len(val) > 1:
-                        for jj, v in enumerate(val):
-                            unit = param.units[jj] if param.type == 'cont' else None
-                            record[sc.formatHeader(inst, param.comps[jj], unit)] = v
-                    else:
-                        record[sc.formatHeader(inst, param.name, param.units)] = val[0]
+                vals = bx.readAll(reads)  # separate buses are read at the same time
+                for cols, val in zip(headers, vals):
+                    sc.fillRecord(record, cols, val)
 
                 self.log(str(record))
                 # Push the data onto the queue for writing the file
@@ -519,24 +562,38 @@ class CMeasCmd(sc.SeqCmd):
                 self.log('###LOAD FILEQ: {:s}'.format('write line'))
 
                 if self.wait == 'Condition':
-                    inst = self.instruments[self.stringInsts.index(self.waitInst)]
-                    param = inst.getParam(self.waitParam)
-                    waitVal = record[sc.formatHeader(inst, param, param.units)]
-                    stableData[waitIter % datapoints] = float(waitVal)
-                    self.status[1] = 'Condition:  \t{:s} = {:.0f} +/- {:.1f}, {:.0f} s'.format(
-                        param.name, self.target, self.stability, self.stableTime)
+                    waitVal = record.get(plan['waitHeader'])  # missing if the reading failed
+                    self.status[1] = plan['waitText']
                     waitIter += 1
-                    if abs(max(stableData) - self.target) < self.stability \
-                            and abs(min(stableData) - self.target) < self.stability:
+                    if detector.add(timeElapsed, waitVal):
                         break
 
-                time.sleep(self.polltime)  # wait for the specified amount of time
-                timeElapsed = (datetime.today() - starttime).seconds + (datetime.today() - starttime).microseconds * 1e-6
+                schedule.wait(self.exp.isAborted)  # wait for the next sample time
+                timeElapsed = schedule.elapsed()
                 self.log(timeElapsed)
                 self.status[2] = 'Timeout:  \t{:.0f} s/{:.0f} s'.format(np.floor(timeElapsed), self.timeout)
                 self.exp.setStatus(self.status)
                 if self.exp.isAborted():
                     break
+            self.log(schedule.report())
+            if self.wait == 'Condition':
+                self.log(detector.report())
+
+
+    def getMeasTypes(self):
+        """
+        How each of the headers from ``getMeasHeaders`` should be stored,\
+        from the types of the parameters measured.
+
+        Returns
+        -------
+        dict
+            ``{header: numpy dtype string}``
+        """
+        dtypes = sc.SeqCmd.getMeasTypes(self)  # the condition, if there is one
+        for ii in range(self.rows):
+            dtypes.update(sc.measTypes(*self.bind(self.selInsts[ii], self.selParams[ii])))
+        return dtypes
 
 
     def getMeasHeaders(self):
@@ -560,19 +617,7 @@ class CMeasCmd(sc.SeqCmd):
         """
         headers = []
         for ii in range(self.rows):
-            inst = self.instruments[self.stringInsts.index(self.selInsts[ii])]
-            param = inst.getParam(self.selParams[ii])
-            if type(param.comps) is not list:
-                if param.type == 'cont':
-                    headers.append(sc.formatHeader(inst, param, param.units))
-                else:
-                    headers.append(sc.formatHeader(inst, param))
-            else:
-                for ii, comp in enumerate(param.comps):
-                    if param.type == 'cont':
-                        headers.append(sc.formatHeader(inst, comp, param.units[ii]))
-                    else:
-                        headers.append(sc.formatHeader(inst, comp))
+            headers += sc.measHeaders(*self.bind(self.selInsts[ii], self.selParams[ii]))
 
         if self.wait == 'Condition':
             inst = self.instruments[self.stringInsts.index(self.waitInst)]
@@ -2,9 +2,9 @@ import tkinter as tk
 from tkinter import ttk
 from . import SeqCommand as sc
 import HelperFunctions as hf
-from datetime import datetime
+import Scheduler as sch
+import Stability as st
 import numpy as np
-import time
 import random
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -21,6 +21,11 @@ class LoopCmd(sc.SeqCmd):
     ----------
     mode : str
     spacing : str
+    wait : str
+        What to wait for after each step: ``'Time'`` (``timeout``\
+        seconds), ``'Condition'``, or ``'Offload'``, which hands the whole\
+        sweep to the instrument (see ``offload``) and dwells ``timeout``\
+        seconds at each point.
     
     """
     cmdname='Loop'
@@ -41,7 +46,7 @@ class LoopCmd(sc.SeqCmd):
         self.dir = 'Up First'  # up first or down first (cycles)
         self.cycles = 1  # number of revolutions around the cycle, supports half-integers
 
-        self.wait = 'Time'  # wait for 'Time' or 'Condition'
+        self.wait = 'Time'  # wait for 'Time' or 'Condition', or 'Offload' the sweep to the instrument
         self.timeout = 10.0  # how long to wait for each set before proceeding
         self.sweepInst = ''
         self.sweepParam = ''
@@ -49,6 +54,8 @@ class LoopCmd(sc.SeqCmd):
         self.waitParam = ''  # what (if anything) to wait for
         self.stableTime = 10.0  # How long to require stability
         self.stability = 1.0  # Stay less than this value away from the final value for the required time
+        self.maxSlope = 0.0  # optional limit on drift while stable, zero to ignore
+        self.maxNoise = 0.0  # optional limit on standard deviation while stable, zero to ignore
         self.pollTime = 1.0  # Check the value this often
 
         self.title = 'Loop'
@@ -72,9 +79,9 @@ class LoopCmd(sc.SeqCmd):
         self.labels1 = [None for x in range(7)]
         self.boxes1 = [None for x in range(7)]
         self.units1 = [None for x in range(7)]
-        self.labels2 = [None for x in range(5)]
-        self.boxes2 = [None for x in range(5)]
-        self.units2 = [None for x in range(5)]
+        self.labels2 = [None for x in range(7)]
+        self.boxes2 = [None for x in range(7)]
+        self.units2 = [None for x in range(7)]
         self.instBox = None
         self.paramBox = None
         self.waitParamBox = None
@@ -104,6 +111,8 @@ class LoopCmd(sc.SeqCmd):
         self.waitParamVar = tk.StringVar()  # what (if anything) to wait for
         self.stableTimeVar = tk.DoubleVar()  # How long to require stability
         self.stabilityVar = tk.DoubleVar()  # Stay less than this value away from the final value for the required time
+        self.maxSlopeVar = tk.DoubleVar()  # optional limit on drift while stable, zero to ignore
+        self.maxNoiseVar = tk.DoubleVar()  # optional limit on standard deviation while stable, zero to ignore
         self.pollTimeVar = tk.DoubleVar()  # Check the value this often
 
         self.waitVar.set(self.wait)
@@ -124,6 +133,8 @@ class LoopCmd(sc.SeqCmd):
         self.waitParamVar.set(self.waitParam)
         self.stableTimeVar.set(self.stableTime)
         self.stabilityVar.set(self.stability)
+        self.maxSlopeVar.set(self.maxSlope)
+        self.maxNoiseVar.set(self.maxNoise)
         self.pollTimeVar.set(self.pollTime)  # Check the value this often
         self.modeVar.set(self.mode)
 
@@ -162,7 +173,7 @@ class LoopCmd(sc.SeqCmd):
 
         tk.Label(self.window, text='On step, wait for:').grid(column=3, row=1, sticky='NSE', padx=5)
         self.waitBox = ttk.Combobox(self.window, textvariable=self.waitVar, state=state)
-        self.waitBox['values'] = ['Time', 'Condition']
+        self.waitBox['values'] = ['Time', 'Condition', 'Offload']
         if self.wait not in self.waitBox['values']:
             self.waitBox.current(0)
         else:
@@ -236,8 +247,9 @@ class LoopCmd(sc.SeqCmd):
             inst = self.instruments[self.stringInsts.index(self.waitInstVar.get())]
             param = inst.getParam(self.waitParamVar.get())
             unit = param.units
-            unit = param.units
             self.units2[1]['text'] = unit
+            self.units2[3]['text'] = '{}/s'.format(unit) if unit else '/s'
+            self.units2[4]['text'] = unit
 
         self.updateValues()
 
@@ -350,7 +362,7 @@ class LoopCmd(sc.SeqCmd):
 
     def updateWait(self, *args):
         state = tk.DISABLED if self.running else tk.NORMAL
-        if self.waitVar.get() == 'Time':
+        if self.waitVar.get() in ('Time', 'Offload'):
             for ii in range(len(self.labels2)):
                 if self.labels2[ii] is not None:
                     self.labels2[ii].destroy()
@@ -371,7 +383,7 @@ class LoopCmd(sc.SeqCmd):
                 self.waitParamBox.destroy()
                 self.waitParamBox = None
 
-            self.labels2[0] = tk.Label(self.window, text='Delay Time:')
+            self.labels2[0] = tk.Label(self.window, text='Delay Time:' if self.waitVar.get() == 'Time' else 'Dwell Time:')
 
             self.boxes2[0] = tk.Entry(self.window, textvariable=self.timeoutVar, state=state)
 
@@ -396,8 +408,10 @@ class LoopCmd(sc.SeqCmd):
             self.labels2[0] = tk.Label(self.window, text='Condition:')  # change first label to proper value
             self.labels2[1] = tk.Label(self.window, text='Stability Window: +/-')
             self.labels2[2] = tk.Label(self.window, text='Stable Time:')
-            self.labels2[3] = tk.Label(self.window, text='Polling Time:')
-            self.labels2[4] = tk.Label(self.window, text='Timeout (0 waits forever):')
+            self.labels2[3] = tk.Label(self.window, text='Max Slope (0 ignores):')
+            self.labels2[4] = tk.Label(self.window, text='Max Noise (0 ignores):')
+            self.labels2[5] = tk.Label(self.window, text='Polling Time:')
+            self.labels2[6] = tk.Label(self.window, text='Timeout (0 waits forever):')
 
             self.boxes2[0] = ttk.Combobox(self.window, textvariable=self.waitInstVar, width=20, state=state)
             self.boxes2[0]['values'] = self.stringInsts[:]
@@ -414,14 +428,18 @@ class LoopCmd(sc.SeqCmd):
 
             self.boxes2[1] = tk.Entry(self.window, textvariable=self.stabilityVar, state=state)
             self.boxes2[2] = tk.Entry(self.window, textvariable=self.stableTimeVar, state=state)
-            self.boxes2[3] = tk.Entry(self.window, textvariable=self.pollTimeVar, state=state)
-            self.boxes2[4] = tk.Entry(self.window, textvariable=self.timeoutVar, state=state)
+            self.boxes2[3] = tk.Entry(self.window, textvariable=self.maxSlopeVar, state=state)
+            self.boxes2[4] = tk.Entry(self.window, textvariable=self.maxNoiseVar, state=state)
+            self.boxes2[5] = tk.Entry(self.window, textvariable=self.pollTimeVar, state=state)
+            self.boxes2[6] = tk.Entry(self.window, textvariable=self.timeoutVar, state=state)
 
             unit = param.units
             self.units2[1] = tk.Label(self.window, text=unit)
             self.units2[2] = tk.Label(self.window, text='s')
-            self.units2[3] = tk.Label(self.window, text='s')
-            self.units2[4] = tk.Label(self.window, text='s')
+            self.units2[3] = tk.Label(self.window, text='{}/s'.format(unit) if unit else '/s')
+            self.units2[4] = tk.Label(self.window, text=unit)
+            self.units2[5] = tk.Label(self.window, text='s')
+            self.units2[6] = tk.Label(self.window, text='s')
 
             for ii in range(len(self.labels2)):
                 if self.labels2[ii] is not None:
@@ -490,6 +508,8 @@ class LoopCmd(sc.SeqCmd):
         if self.waitVar.get() == 'Condition':
             inst = self.instruments[self.stringInsts.index(self.waitInstVar.get())]
             param = inst.getParam(self.waitParamVar.get())
+            self.maxSlopeVar.set(abs(self.maxSlopeVar.get()))
+            self.maxNoiseVar.set(abs(self.maxNoiseVar.get()))
             self.pollTimeVar.set(max(0.1, self.pollTimeVar.get()))
 
         # actually build the arrays of values
@@ -637,6 +657,8 @@ class LoopCmd(sc.SeqCmd):
         self.waitParam = self.waitParamVar.get()
         self.stableTime = self.stableTimeVar.get()
         self.stability = self.stabilityVar.get()
+        self.maxSlope = self.maxSlopeVar.get()
+        self.maxNoise = self.maxNoiseVar.get()
         self.pollTime = self.pollTimeVar.get()
         self.mode = self.modeVar.get()
 
@@ -655,6 +677,8 @@ class LoopCmd(sc.SeqCmd):
         self.pollTimeVar = None
         self.waitVar = None
         self.stabilityVar = None
+        self.maxSlopeVar = None
+        self.maxNoiseVar = None
         self.boxes1 = []
         self.boxes2 = []
         self.labels1 = []
@@ -686,48 +710,129 @@ class LoopCmd(sc.SeqCmd):
         return self.iteration >= len(self.allValues)
 
 
+    def compile(self):
+        """
+        Resolve the swept parameter and, if there is one, the condition.\
+        The command for every point of the sweep is encoded here, so each\
+        pass through the loop just sends the next one.
+
+        Returns
+        -------
+        plan : dict
+            ``'inst'`` and ``'param'`` being swept, ``'cmds'``: the encoded\
+            write for each of ``allValues`` (None where ``writeParam`` has\
+            to do it), and when waiting on a condition, ``'waitInst'``,\
+            ``'waitParam'`` and ``'waitHeader'``.  ``'offload'`` says whether\
+            the sweep will be run by the instrument, and if so\
+            ``'sweepHeaders'`` are the columns for its readings.
+        """
+        sc.SeqCmd.compile(self)
+        inst, param = self.bind(self.sweepInst, self.sweepParam)
+        self.plan.update(inst=inst, param=param, cmds=[inst.encodeWrite(str(param), x) for x in self.allValues])
+        self.plan['offload'] = self.wait == 'Offload' and inst.sweepable(param, len(self.allValues))
+        if self.plan['offload']:
+            self.plan['sweepHeaders'] = [sc.formatHeader(inst, name, unit) for name, unit in inst.sweepReadback(param)]
+        elif self.wait == 'Offload':
+            self.log("{:s} can't run a {:d} point sweep of {:s} by itself, so it will be stepped one point at a time".format(
+                str(inst), len(self.allValues), str(param)))
+        if self.wait == 'Condition':
+            wInst, wParam = self.bind(self.waitInst, self.waitParam)
+            self.plan.update(waitInst=wInst, waitParam=wParam,
+                             waitHeader=sc.formatHeader(wInst, wParam, wParam.units))
+        return self.plan
+
+
+    def offload(self, fileReqQ):
+        """
+        Run the whole sweep on the instrument: send it every value at once,\
+        let it step through them with its own timing, and then collect the\
+        readings it took along the way in one go.  The steps inside the\
+        loop aren't run, since nothing waits for them between points.
+
+        Parameters
+        ----------
+        fileReqQ : multiprocessing.Queue
+            where the readings are sent, one line per point
+        """
+        plan = self.planned()
+        inst, param = plan['inst'], plan['param']
+        self.updateTitle()
+        self.status = '{:s}, {:d} points on {:s}'.format(hf.shortenLoop(self.title), len(self.allValues), str(inst))
+        self.exp.setStatusLoop(self.status)
+
+        if inst.loadSweep(str(param), [float(x) for x in self.allValues], self.timeout) is False:
+            return  # the driver explains why in the log
+        start = hf.timestampNs()
+        inst.startSweep()
+        schedule = sch.Scheduler(max(0.1, self.pollTime))  # check on it on a fixed grid
+        while not inst.sweepDone():
+            if not schedule.wait(self.exp.isAborted):
+                inst.stopSweep()
+                break
+
+        for seconds, vals in inst.fetchSweep():
+            record = dict(zip(plan['sweepHeaders'], vals))
+            record['Timestamp'] = start + int(seconds * 1e9)  # the instrument's own timing
+            fileReqQ.put(fh.fileRequest('Write Line', record))
+        self.log(schedule.report())
+
+
     def execute(self, fileReqQ):
+        """
+        Set the next value, and wait as asked.
+
+        Returns
+        -------
+        bool or None
+            True if the instrument ran the whole sweep, in which case the\
+            sequence carries on after the ``LoopEnd``
+        """
         if not self.exp.isAborted():
-            inst = self.instruments[self.stringInsts.index(self.sweepInst)]
-            param = inst.getParam(self.sweepParam)
-            inst.writeParam(str(param), self.allValues[self.iteration])
+            plan = self.planned()
+            if plan['offload'] and self.iteration == 0:
+                self.offload(fileReqQ)
+                self.exp.setStatusLoop('')
+                return True
+            inst = plan['inst']
+            cmd = plan['cmds'][self.iteration]
             thisVal = self.allValues[self.iteration]
+            if cmd is None:
+                inst.writeParam(str(plan['param']), thisVal)
+            else:
+                inst.sendBatch([cmd])  # already encoded
             self.iteration += 1
             self.updateTitle()
             self.status = '{:s}, {:d}/{:d}'.format(hf.shortenLoop(self.title), int(self.iteration), int(self.npoints))
             self.exp.setStatusLoop(self.status)
 
             waitIter = 0
-            starttime = datetime.today()
             timeElapsed = 0
             target = float(thisVal)
             stability = float(self.stability)
             polltime = max(0.1, self.pollTime)  # don't let the user check more often than 10x per second
-            datapoints = int(self.stableTime / polltime)  # number of most recent datapoints to use for stability check
-            stableData = [target + 2 * stability for x in
-                          range(datapoints)]  # buffer for most recent datapoints: initialize to outside stability window
+            detector = st.StabilityDetector(target, stability, self.stableTime, self.maxSlope,
+                                            self.maxNoise)  # stable once the last stableTime seconds are all in range
             timeout = self.timeout  # how long to wait before moving on (regardless of condition
 
-            if self.wait == 'Condition':  # get the actual reference to the instrument so you can read this condition
-                wInst = self.instruments[self.stringInsts.index(self.waitInst)]
-                wParam = inst.getParam(self.waitParam)
+            if self.wait == 'Condition':  # the instrument and parameter to read for this condition
+                wInst, wParam, wHeader = plan['waitInst'], plan['waitParam'], plan['waitHeader']
 
+            schedule = sch.Scheduler(polltime)  # check on a fixed grid, however long the reads take
             while timeElapsed <= (timeout if (timeout > 0) else 1e7):
-                if self.wait == 'Time' and self.timeout==0:
+                if self.wait != 'Condition' and self.timeout==0:
                     break
                 else:
-                    time.sleep(polltime)  # wait for the specified amount of time
-                    timeElapsed = (datetime.now() - starttime).seconds + (datetime.now() - starttime).microseconds * 1e-6
+                    schedule.wait(self.exp.isAborted)  # wait for the next check
+                    timeElapsed = schedule.elapsed()
 
                 if self.wait == 'Condition':
                     record = {}
                     measured = wInst.readParam(str(wParam))
-                    record[sc.formatHeader(wInst,wParam, wParam.units)] = measured[0]
-                    record['Timestsc.amp'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S.%f') # always grab a timestamp
+                    record[wHeader] = measured[0]
+                    record['Timestamp'] = hf.timestampNs()  # always grab a timestamp
                     fileReqQ.put(fh.fileRequest('Write Line', record))  # push to file writing queue
-                    stableData[waitIter % datapoints] = float(measured[0])
                     waitIter += 1
-                    if abs(max(stableData) - target) < stability and abs(min(stableData) - target) < stability:
+                    if detector.add(timeElapsed, measured[0]):
                         break
                 if self.exp.isAborted():
                     break
@@ -760,6 +865,10 @@ class LoopCmd(sc.SeqCmd):
             inst = self.instruments[self.stringInsts.index(self.waitInst)]
             param = inst.getParam(self.waitParam)
             headers.append(sc.formatHeader(inst,param, param.units))
+        elif self.wait == 'Offload':
+            inst = self.instruments[self.stringInsts.index(self.sweepInst)]
+            param = inst.getParam(self.sweepParam)
+            headers += [sc.formatHeader(inst, name, unit) for name, unit in inst.sweepReadback(param)]
         return headers
 
 
@@ -778,9 +887,15 @@ class LoopEnd(sc.SeqCmd):
 
 
 
+    def compile(self):
+        sc.SeqCmd.compile(self)
+        self.loopPos = self.app.sequence.index(self.loop)
+        return self.plan
+
+
     def execute(self, fileReqQ):
         if not self.loop.isDone() and not self.exp.isAborted():
-            return self.app.sequence.index(self.loop)
+            return self.loopPos
         else:
             self.exp.setStatusLoop('')
             self.loop.iteration = 0  # reset the counter for the next run!
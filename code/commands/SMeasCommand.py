@@ -2,8 +2,8 @@ import tkinter as tk
 from tkinter import ttk
 from . import SeqCommand as sc
 import FileHandlers as fh
-from datetime import datetime
 import HelperFunctions as hf
+import BusExecutor as bx
 
 
 class SMeasCmd(sc.SeqCmd):
@@ -46,6 +46,23 @@ class SMeasCmd(sc.SeqCmd):
         if not dup:
             self.edit()
 
+    def compile(self):
+        """
+        Resolve each row to its instrument, parameter and data file headers.
+
+        Returns
+        -------
+        plan : dict
+            ``'reads'``: list of ``(inst, param)``, and ``'headers'``: the\
+            ``measHeaders`` of each
+        """
+        sc.SeqCmd.compile(self)
+        reads = [self.bind(self.selInsts[ii], self.selParams[ii]) for ii in range(len(self.selInsts))]
+        self.plan['reads'] = reads
+        self.plan['headers'] = [sc.measHeaders(inst, param) for inst, param in reads]
+        return self.plan
+
+
     def execute(self, fileReqQ):
         """
         Perform the one-time measurement by running the rows one by one.
@@ -58,30 +75,17 @@ class SMeasCmd(sc.SeqCmd):
         """
         # query the selected values to the selected parameters on the selected instruments, write to file
         if not self.exp.isAborted():
+            plan = self.planned()
             record = dict()
-            record['Timestamp'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S.%f')  # always grab a timestamp
+            record['Timestamp'] = hf.timestampNs()  # always grab a timestamp
+
+            vals = bx.readAll(plan['reads'])  # separate buses are read at the same time; each val is a list
 
-            for ii in range(len(self.selInsts)):
-                inst = self.instruments[self.stringInsts.index(self.selInsts[ii])]
-                param = inst.getParam(self.selParams[ii])
+            for (inst, param), headers, val in zip(plan['reads'], plan['headers'], vals):
                 self.status[1] = 'Instrument:\t{:s}'.format(str(inst))
                 self.status[2] = 'Parameter:\t{:s}'.format(str(param))
-                val = inst.readParam(str(param))  # returns a list, even if there's only one element
-                try:
-                    if len(val) > 1:
-                        for jj, v in enumerate(val):
-                            try:
-                                unit = param.units[jj]
-                            except IndexError:
-                                unit = None
-                            try:
-                                record[sc.formatHeader(inst, param.comps[jj], unit)] = v
-                            except (IndexError, TypeError):
-                                record[sc.formatHeader(inst, param.name, unit)] = val
-                    else:
-                        record[sc.formatHeader(inst, param.name, param.units)] = val[0]
-                except TypeError:
-                   print('Instrument error: could not get a value for parameter {:s} on {:s}'.format(str(param), str(inst)))
+                if not sc.fillRecord(record, headers, val):
+                    print('Instrument error: could not get a value for parameter {:s} on {:s}'.format(str(param), str(inst)))
             print(record)
             fileReqQ.put(fh.fileRequest('Write Line', record))  # push to file writing queue
 
@@ -273,6 +277,22 @@ class SMeasCmd(sc.SeqCmd):
         for ii in range(self.rows):
             self.window.grid_rowconfigure(ii, weight=1, minsize=self.rowheight)
 
+    def getMeasTypes(self):
+        """
+        How each of the headers from ``getMeasHeaders`` should be stored,\
+        from the types of the parameters measured.
+
+        Returns
+        -------
+        dict
+            ``{header: numpy dtype string}``
+        """
+        dtypes = {}
+        for ii in range(self.rows):
+            dtypes.update(sc.measTypes(*self.bind(self.selInsts[ii], self.selParams[ii])))
+        return dtypes
+
+
     def getMeasHeaders(self):
         """
         Look through the list of parameters and instruments to be measured,
@@ -285,19 +305,7 @@ class SMeasCmd(sc.SeqCmd):
         """
         headers = []
         for ii in range(self.rows):
-            inst = self.instruments[self.stringInsts.index(self.selInsts[ii])]
-            param = inst.getParam(self.selParams[ii])
-            if type(param.comps) is not list:
-                if param.type == 'cont':
-                    headers.append(sc.formatHeader(inst, param, param.units))
-                else:
-                    headers.append(sc.formatHeader(inst, param))
-            else:
-                for ii,comp in enumerate(param.comps):
-                    if param.type == 'cont':
-                        headers.append(sc.formatHeader(inst, comp, param.units[ii]))
-                    else:
-                        headers.append(sc.formatHeader(inst, comp))
+            headers += sc.measHeaders(*self.bind(self.selInsts[ii], self.selParams[ii]))
         return headers
 
 
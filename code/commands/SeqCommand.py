@@ -1,8 +1,9 @@
 import abc
 import numpy as np
+import DataStores as ds
 
 
-def formatHeader(inst, param, unit=None):
+def formatHeader(inst, param, unit=None, array=False):
     """
     Generalized function for how headers look in the datafile
     
@@ -14,6 +15,9 @@ def formatHeader(inst, param, unit=None):
         name of the parameter
     unit : str (optional)
         unit of the parameter
+    array : bool (optional)
+        whether the parameter is array-valued, in which case the column\
+        is tagged so the file process keeps the arrays in binary
     
     Returns
     -------
@@ -23,9 +27,85 @@ def formatHeader(inst, param, unit=None):
     text = "{:s}--{:s}".format(str(inst), str(param))
     if unit is not None:
         text = "{:s} ({:s})".format(text, unit)
+    if array:
+        text += ds.ARRAYTAG
     return text
 
 
+def measHeaders(inst, param):
+    """
+    Data file headers which a reading of one parameter fills in: one for\
+    each component of a compound parameter, otherwise just the one.
+
+    Parameters
+    ----------
+    inst : Instrument
+    param : Param
+
+    Returns
+    -------
+    list of str
+    """
+    if type(param.comps) is not list:
+        if param.type == 'cont':
+            return [formatHeader(inst, param, param.units, param.isArray())]
+        return [formatHeader(inst, param)]
+    if param.type == 'cont':
+        return [formatHeader(inst, comp, param.units[ii], param.isArray()) for ii, comp in enumerate(param.comps)]
+    return [formatHeader(inst, comp) for comp in param.comps]
+
+
+def measTypes(inst, param):
+    """
+    How the columns from ``measHeaders`` are stored, decided by the type of\
+    the parameter rather than by what its headers look like: continuous\
+    parameters are floats, whether or not they have units, discrete ones\
+    are their integer codes, and array columns hold the integer length of\
+    each array.
+
+    Parameters
+    ----------
+    inst : Instrument
+    param : Param
+
+    Returns
+    -------
+    dict
+        ``{header: numpy dtype string}``
+    """
+    dtype = '<f8' if param.type == 'cont' and not param.isArray() else '<i8'
+    return dict.fromkeys(measHeaders(inst, param), dtype)
+
+
+def fillRecord(record, headers, val):
+    """
+    Put one reading into a data record.
+
+    Parameters
+    ----------
+    record : dict
+        the line of data being built
+    headers : list of str
+        the output of ``measHeaders`` for the parameter
+    val : list
+        the output of ``readParam`` for the parameter
+
+    Returns
+    -------
+    bool
+        False if there was no reading to put in
+    """
+    if val is None:
+        return False
+    if len(headers) > 1:
+        record.update(zip(headers, val))
+    elif len(val) > 1:
+        record[headers[0]] = val
+    else:
+        record[headers[0]] = val[0]
+    return True
+
+
 class SeqCmd(metaclass=abc.ABCMeta):
     """
     Superclass for all different types of command steps
@@ -69,9 +149,15 @@ class SeqCmd(metaclass=abc.ABCMeta):
         True if this command will execute with the rest of the sequence.
     app : Apparatus
     gui : ExpGUI
+    plan : dict
+        Everything ``execute`` needs, looked up once by ``compile`` before\
+        the run starts, or None if the command hasn't been compiled.
     
     """
     cmdname = 'UNNAMED COMMAND'
+    transient = ['status', 'title', 'pos', 'instruments',
+                 'loop', 'iteration', 'exp', 'app', 'gui',
+                 'window', 'running', 'stringInsts', 'plan']  # attributes which aren't saved with the sequence
     def __init__(self, exp, app, pos=None, dup=False, gui=None):
         self.title = ""
         self.exp = exp
@@ -83,6 +169,7 @@ class SeqCmd(metaclass=abc.ABCMeta):
         self.enabled = True
         self.app = app
         self.gui = gui
+        self.plan = None
 
 
     def log(self, event):
@@ -107,8 +194,66 @@ class SeqCmd(metaclass=abc.ABCMeta):
             if inst.name is not None:
                 self.instruments.append(inst)
         self.stringInsts = [str(x) for x in self.instruments]
+
+
+    def bind(self, instName, paramName):
+        """
+        Find an instrument and one of its parameters by name.
+
+        Parameters
+        ----------
+        instName : str
+            as shown in the configuration window
+        paramName : str
+
+        Returns
+        -------
+        inst : Instrument
+        param : Param
+        """
+        inst = self.instruments[self.stringInsts.index(instName)]
+        return inst, inst.getParam(paramName)
+
+
+    def compile(self):
+        """
+        Look up everything ``execute`` will need (instruments, parameters,\
+        headers, encoded commands) and keep it in ``plan``, so that running\
+        the step, perhaps thousands of times in a loop, never has to search\
+        for anything by name.  ``Apparatus.compileSequence`` calls this once\
+        before each run; subclasses extend it.
+
+        Returns
+        -------
+        plan : dict
+        """
+        self.stringInsts = [str(x) for x in self.instruments]
+        self.plan = {}
+        return self.plan
+
+
+    def planned(self):
+        """
+        The ``plan``, compiling it first if that hasn't been done.
+        """
+        return self.plan if self.plan is not None else self.compile()
     
     
+    def getMeasTypes(self):
+        """
+        How each of the headers from ``getMeasHeaders`` should be stored.\
+        Conditions and sweeps are always continuous, so by default every\
+        column is a float; commands which measure arbitrary parameters\
+        override this using ``measTypes``.
+
+        Returns
+        -------
+        dict
+            ``{header: numpy dtype string}``
+        """
+        return dict.fromkeys(self.getMeasHeaders(), '<f8')
+
+
     def copy(self):
         """
         Makes a copy of the given object--this is somewhere between\
@@ -126,34 +271,26 @@ class SeqCmd(metaclass=abc.ABCMeta):
                 new.__dict__[key] = self.__dict__[key][:]
             else:  # just normal assignment works fine
                 new.__dict__[key] = self.__dict__[key]
+        new.plan = None  # the copy may be edited, so it gets compiled on its own
         return new
     
     
-    def description(self):
+    def state(self):
         """
-        Generates a text description of the step object.
-        All Tk specific variables or other temporary ones are set to None or [] by cmd.accept(),
-        so this code ignores all such variables.
-        
+        The settings of this step which are saved with the sequence, for\
+        ``SequenceFiles``.  The ``transient`` attributes and anything which\
+        has been cleared (None or empty) are left out.
+
         Returns
         -------
-        descriptor : str
-            Human- and machine-readable description of this command.
+        state : dict
+            attribute names and their values
         """
-        ignoreList = ['status', 'title', 'pos', 'instruments',
-                      'loop', 'iteration', 'exp', 'app', 'gui',
-                      'window', 'running', 'stringInsts']
-        
-        descriptor = 'Sequence Command {:d}:\n'.format(self.pos)   # start the descriptor block with known opening
-        for key in self.__dict__.keys():       # for every instance variable
-            if key not in ignoreList:          # if it is an interesting one
-                if isinstance(self.__dict__[key], list):   # if it's a list
-                    if len(self.__dict__[key])>0:          # ignore it if it's empty
-                        descriptor += '\t{:s} = {:s}\n'.format(str(key), str(self.__dict__[key]))
-                elif isinstance(self.__dict__[key], np.ndarray):
-                    if len(self.__dict__[key]) > 0:  # ignore it if it's empty
-                        descriptor += '\t{:s} = {:s}\n'.format(str(key), str(list(self.__dict__[key])))
-                else:
-                    if self.__dict__[key] is not None:     # ignore ones which have been cleared, too
-                        descriptor += '\t{:s} = {:s}\n'.format(str(key), str(self.__dict__[key]))
-        return descriptor
+        state = {}
+        for key, val in self.__dict__.items():
+            if key in self.transient or val is None:
+                continue
+            if isinstance(val, (list, np.ndarray)) and len(val) == 0:
+                continue
+            state[key] = val
+        return state
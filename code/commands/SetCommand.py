@@ -415,6 +415,54 @@ class SetCmd(sc.SeqCmd):
         self.updateSize()        
         
         
+    def compile(self):
+        """
+        Resolve the rows once: the instrument and parameter of each, the\
+        value to write (with labels of discrete parameters already turned\
+        into values), the command string where it can be worked out ahead\
+        of time, and the status text to show.  Consecutive rows whose\
+        commands are known and go to the same instrument are grouped, so\
+        that ``execute`` can send each group in one message.
+
+        Returns
+        -------
+        plan : dict
+            ``'writes'``: list of ``(inst, name, val, cmd, instText, paramText)``,\
+            and ``'groups'``: the same writes split into lists to be sent\
+            together.  Rows without a ``cmd`` are always on their own.
+        """
+        sc.SeqCmd.compile(self)
+        writes = []
+        for ii in range(len(self.selInsts)):  # cycle through the instruments selected
+            inst, param = self.bind(self.selInsts[ii], self.selParams[ii])
+            if self.selVals[ii] != '':    # if a value has actually been set, and not left blank
+                if param.type == 'disc':
+                    labeledVals = ["{:s} ({:s})".format(param.labels[jj], param.vals[jj]) for jj in
+                                   range(len(param.vals))]  # regenerate the list of values paired with meanings
+                    val = param.vals[labeledVals.index(self.selVals[ii])]   # search it to get proper value
+                    paramText = 'Parameter:\t{:s} = {:s}'.format(str(param), self.selVals[ii])
+                else:
+                    val = self.selVals[ii]
+                    paramText = 'Parameter:\t{:s} = {:s} {:s}'.format(str(param), str(self.selVals[ii]), str(param.units))
+            elif param.type == 'act':
+                val = None  # if it's an action, it won't need a value
+                paramText = 'Parameter:\t{:s}'.format(str(param))
+            else:
+                continue  # the user didn't supply a value, even though I asked for one.  Forget that clown.
+            writes.append((inst, self.selParams[ii], val, inst.encodeWrite(self.selParams[ii], val),
+                           'Instrument:\t{:s}'.format(str(inst)), paramText))
+        self.plan['writes'] = writes
+        groups = []
+        for write in writes:
+            last = groups[-1][-1] if len(groups) > 0 else None
+            if last is not None and write[3] is not None and last[3] is not None and write[0] is last[0]:
+                groups[-1].append(write)
+            else:
+                groups.append([write])
+        self.plan['groups'] = groups
+        return self.plan
+
+
     def execute(self, fileReqQ):
         """
         Write the selected values to the selected parameters on the selected instruments
@@ -424,31 +472,16 @@ class SetCmd(sc.SeqCmd):
         fileReqQ : multiprocessing.Queue
             queue for sending data to the file (unused, but required for superclass)
         """
-        self.stringInsts = [str(x) for x in self.instruments]
         if not self.exp.isAborted():            # if the sequence is still running
-            self.actualInsts = [self.instruments[self.stringInsts.index(x)] for x in self.selInsts]
-            for ii in range(len(self.selInsts)):  # cycle through the instruments selected
-                param = self.actualInsts[ii].getParam(self.selParams[ii])  # get the reference to the param itself
-                self.status[1] = 'Instrument:\t{:s}'.format(str(self.actualInsts[ii]))
-                if self.selVals[ii] is not '':    # if a value has actually been set, and not left blank
-                    if param.type == 'disc':
-                        labeledVals = ["{:s} ({:s})".format(param.labels[ii], param.vals[ii]) for ii in
-                                       range(len(param.vals))]  # regenerate the list of values paired with meanings
-                        val = param.vals[labeledVals.index(self.selVals[ii])]   # search it to get proper value
-                        self.status[2] = 'Parameter:\t{:s} = {:s}'.format(str(param), self.selVals[ii])
-                        self.exp.setStatus(self.status)
-                        self.actualInsts[ii].writeParam(self.selParams[ii], val)  # actually write the thing
-                    else:
-                        self.status[2] = 'Parameter:\t{:s} = {:s} {:s}'.format(str(param), str(self.selVals[ii]), str(param.units))
-                        self.exp.setStatus(self.status)
-                        self.actualInsts[ii].writeParam(self.selParams[ii], self.selVals[ii])  # write it
+            for group in self.planned()['groups']:
+                inst, name, val, cmd, instText, paramText = group[-1]
+                self.status[1] = instText
+                self.status[2] = paramText
+                self.exp.setStatus(self.status)
+                if cmd is None:
+                    inst.writeParam(name, val)  # macros, and anything that needs explaining to the user
                 else:
-                    if param.type == 'act':
-                        self.status[2] = 'Parameter:\t{:s}'.format(str(param))
-                        self.exp.setStatus(self.status)
-                        self.actualInsts[ii].writeParam(self.selParams[ii])  # if it's an action, it won't need a value
-                    else:
-                        pass  # the user didn't supply a value, even though I asked for one.  Forget that clown.
+                    inst.sendBatch([write[3] for write in group])  # already encoded, one message if it can be
 
 
     def getMeasHeaders(self):
@@ -2,8 +2,8 @@ import tkinter as tk
 from tkinter import ttk
 from . import SeqCommand as sc
 import FileHandlers as fh
-from datetime import datetime
-import time
+import Scheduler as sch
+import Stability as st
 import HelperFunctions as hf
 
 class WaitCmd(sc.SeqCmd):
@@ -44,6 +44,12 @@ class WaitCmd(sc.SeqCmd):
     stability : float
         maximum deviation from ``conditionVal`` for it still to be \
         considered stable
+    maxSlope : float
+        if nonzero, the drift of the parameter over ``stableTime`` (units\
+        per second) must also be less than this
+    maxNoise : float
+        if nonzero, the standard deviation of the parameter over\
+        ``stableTime`` must also be less than this
     pollTime : float
         how often (in seconds) to check the condition parameter
     mode : str
@@ -60,6 +66,8 @@ class WaitCmd(sc.SeqCmd):
         self.conditionVal = 0.0
         self.stableTime = 10.0
         self.stability = 1.0  # Stay less than this value away from the final value for the required time
+        self.maxSlope = 0.0  # optional limit on drift while stable, zero to ignore
+        self.maxNoise = 0.0  # optional limit on standard deviation while stable, zero to ignore
         self.pollTime = 1.0  # Check the value this often
         self.mode = 'Time'
 
@@ -102,6 +110,8 @@ class WaitCmd(sc.SeqCmd):
         self.conditionValVar = tk.DoubleVar()
         self.stableTimeVar = tk.DoubleVar()
         self.stabilityVar = tk.DoubleVar()  # Stay less than this value away from the final value for the required time
+        self.maxSlopeVar = tk.DoubleVar()  # optional limit on drift while stable, zero to ignore
+        self.maxNoiseVar = tk.DoubleVar()  # optional limit on standard deviation while stable, zero to ignore
         self.pollTimeVar = tk.DoubleVar()  # Check the value this often
         self.modeVar = tk.StringVar()
 
@@ -112,12 +122,14 @@ class WaitCmd(sc.SeqCmd):
         self.stableTimeVar.set(self.stableTime)
         self.stabilityVar.set(
            self.stability)  # Stay less than this value away from the final value for the required time
+        self.maxSlopeVar.set(self.maxSlope)
+        self.maxNoiseVar.set(self.maxNoise)
         self.pollTimeVar.set(self.pollTime)  # Check the value this often
         self.modeVar.set(self.mode)
 
-        self.labels = [None for x in range(6)]
-        self.boxes = [None for x in range(6)]
-        self.units = [None for x in range(5)]
+        self.labels = [None for x in range(8)]
+        self.boxes = [None for x in range(8)]
+        self.units = [None for x in range(7)]
         self.paramBox = None
         self.modeTrace = None
         self.unitTrace = None
@@ -173,16 +185,18 @@ class WaitCmd(sc.SeqCmd):
             self.boxes[0].grid(column=1, row=1, sticky='NSEW', padx=5)
 
         else:  # mode = 'Condition
-            self.window.geometry('550x150')
+            self.window.geometry('550x200')
             if self.labels[0] is not None:
                self.labels[0].destroy()
             self.labels[0] = tk.Label(self.window, text='Condition:')  # change first label to proper value
             self.labels[1] = tk.Label(self.window, text='Value:')
             self.labels[2] = tk.Label(self.window, text='Stability Window: +/-')
             self.labels[3] = tk.Label(self.window, text='Stable Time:')
-            self.labels[4] = tk.Label(self.window, text='Polling Time:')
-            self.labels[5] = tk.Label(self.window, text='Timeout (0 waits forever):')
-            for ii in range(6):
+            self.labels[4] = tk.Label(self.window, text='Max Slope (0 ignores):')
+            self.labels[5] = tk.Label(self.window, text='Max Noise (0 ignores):')
+            self.labels[6] = tk.Label(self.window, text='Polling Time:')
+            self.labels[7] = tk.Label(self.window, text='Timeout (0 waits forever):')
+            for ii in range(8):
                self.labels[ii].grid(column=0, row=ii + 1, sticky='NSE', padx=5)
 
             if self.boxes[0] is not None:
@@ -202,12 +216,14 @@ class WaitCmd(sc.SeqCmd):
             self.boxes[1] = tk.Entry(self.window, textvariable=self.conditionValVar, state=state)
             self.boxes[2] = tk.Entry(self.window, textvariable=self.stabilityVar, state=state)
             self.boxes[3] = tk.Entry(self.window, textvariable=self.stableTimeVar, state=state)
-            self.boxes[4] = tk.Entry(self.window, textvariable=self.pollTimeVar, state=state)
-            self.boxes[5] = tk.Entry(self.window, textvariable=self.timeoutVar, state=state)
+            self.boxes[4] = tk.Entry(self.window, textvariable=self.maxSlopeVar, state=state)
+            self.boxes[5] = tk.Entry(self.window, textvariable=self.maxNoiseVar, state=state)
+            self.boxes[6] = tk.Entry(self.window, textvariable=self.pollTimeVar, state=state)
+            self.boxes[7] = tk.Entry(self.window, textvariable=self.timeoutVar, state=state)
 
             self.boxes[0].grid(column=1, row=1, sticky='NSEW', padx=5)
             self.paramBox.grid(column=2, row=1, sticky='NSEW', padx=5)
-            for ii in range(1,6):
+            for ii in range(1,8):
                self.boxes[ii].grid(column=1, row=ii + 1, sticky='NSEW', padx=5, columnspan=2)
             if not self.running:
                 self.unitTrace = self.conditionParamVar.trace("w", self.updateUnits)
@@ -216,10 +232,12 @@ class WaitCmd(sc.SeqCmd):
             self.units[0] = tk.Label(self.window, text='')
             self.units[1] = tk.Label(self.window, text='')
             self.units[2] = tk.Label(self.window, text='s')
-            self.units[3] = tk.Label(self.window, text='s')
-            self.units[4] = tk.Label(self.window, text='s')
+            self.units[3] = tk.Label(self.window, text='/s')
+            self.units[4] = tk.Label(self.window, text='')
+            self.units[5] = tk.Label(self.window, text='s')
+            self.units[6] = tk.Label(self.window, text='s')
 
-            for ii in range(5):
+            for ii in range(7):
                self.units[ii].grid(column=3, row=ii + 2, sticky='NSW', padx=5)
             self.updateUnits()
 
@@ -241,6 +259,8 @@ class WaitCmd(sc.SeqCmd):
         units = param.units
         for ii in range(2):
             self.units[ii]['text'] = units
+        self.units[3]['text'] = '{}/s'.format(units) if units else '/s'
+        self.units[4]['text'] = units
 
     def accept(self):
         """
@@ -262,6 +282,8 @@ class WaitCmd(sc.SeqCmd):
         self.conditionVal = self.conditionValVar.get()
         self.stableTime = self.stableTimeVar.get()
         self.stability = self.stabilityVar.get()
+        self.maxSlope = abs(self.maxSlopeVar.get())
+        self.maxNoise = abs(self.maxNoiseVar.get())
         self.pollTime = self.pollTimeVar.get()
         self.mode = self.modeVar.get()
 
@@ -281,6 +303,8 @@ class WaitCmd(sc.SeqCmd):
         self.labels = []
         self.stableTimeVar = None
         self.stabilityVar = None
+        self.maxSlopeVar = None
+        self.maxNoiseVar = None
         self.modeVar = None
         self.conditionVar = None
         self.units = []
@@ -297,6 +321,22 @@ class WaitCmd(sc.SeqCmd):
         self.title = hf.enumSequence(self.pos, self.title)
 
 
+    def compile(self):
+        """
+        Resolve the condition to its instrument, parameter and header.
+
+        Returns
+        -------
+        plan : dict
+            when waiting on a condition, ``'inst'``, ``'param'`` and ``'header'``
+        """
+        sc.SeqCmd.compile(self)
+        if self.mode == 'Condition':
+            inst, param = self.bind(self.conditionInst, self.conditionParam)
+            self.plan.update(inst=inst, param=param, header=sc.formatHeader(str(inst), str(param), param.units))
+        return self.plan
+
+
     def execute(self, fileReqQ):
         """
         Run this sequence command and wait for the specified condition.
@@ -308,40 +348,35 @@ class WaitCmd(sc.SeqCmd):
             the termination is conditioned on a parameter, in which case \
             the interrogated parameter is saved to the file.
         """
-        self.stringInsts = [str(x) for x in self.instruments]
+        plan = self.planned()
         iteration = 0
-        starttime = datetime.today()
         timeElapsed = 0
         target = self.conditionVal
         stability = self.stability
         polltime = max(0.1, self.pollTime)  # don't let the user check more often than 10x per second
-        datapoints = max(2, int(
-           self.stableTime / polltime))  # number of most recent datapoints to use when checking for stability
-        stableData = [target + 2 * stability for x in
-                     range(datapoints)]  # buffer for most recent datapoints: initialize to outside stability window
+        detector = st.StabilityDetector(target, stability, self.stableTime, self.maxSlope, self.maxNoise,
+                                        minSamples=2)  # stable once the last stableTime seconds are all in range
         timeout = self.timeout  # how long to wait before moving on (regardless of condition
         if not self.exp.isAborted():
             if self.mode == 'Condition':  # get the actual reference to the instrument so you can read this condition
-                inst = self.instruments[self.stringInsts.index(self.conditionInst)]
-                param = inst.getParam(self.conditionParam)
-                header = sc.formatHeader(str(inst), str(param), param.units)
+                inst, param, header = plan['inst'], plan['param'], plan['header']
                 self.status[1] = 'Condition:  \t{:s} = {:.0f} +/- {:.1f}, {:.0f} s'.format(
                     header, target, stability, self.stableTime)
 
+            counttime = polltime if self.mode == 'Condition' else 0.2  # how often to check conditions, default is 1s
+            schedule = sch.Scheduler(counttime)  # check on a fixed grid, however long the reads take
             while timeElapsed <= (timeout if timeout > 0 else 1e7):  # if zero, wait forever. ("forever" = 4 months)
-                counttime = polltime if self.mode == 'Condition' else 0.2  # how often to check conditions, default is 1s
-                time.sleep(counttime)  # wait for the specified amount of time
-                timeElapsed = (datetime.now() - starttime).seconds + (datetime.now() - starttime).microseconds * 1e-6
+                schedule.wait(self.exp.isAborted)  # wait for the next check
+                timeElapsed = schedule.elapsed()
 
                 if self.mode == 'Condition':
                     record = {}
                     measured = inst.readParam(str(param))
                     record[header] = measured[0]
-                    record['Timestamp'] = datetime.today().strftime('%Y-%m-%d %H:%M:%S.%f')  # always grab a timestamp
+                    record['Timestamp'] = hf.timestampNs()  # always grab a timestamp
                     fileReqQ.put(fh.fileRequest('Write Line', record))  # push to file writing queue
-                    stableData[iteration % datapoints] = float(measured[0])
                     iteration += 1
-                    if abs(max(stableData) - target) < stability and abs(min(stableData) - target) < stability:
+                    if detector.add(timeElapsed, measured[0]):
                         break
 
                 if timeout is not 0:
@@ -349,6 +384,9 @@ class WaitCmd(sc.SeqCmd):
                 if self.exp.isAborted():
                     break
                 self.exp.setStatus(self.status)
+            if self.mode == 'Condition':
+                self.log(schedule.report())
+                self.log(detector.report())
 
 
     def getMeasHeaders(self):
@@ -5,6 +5,7 @@ from .import Parameter as pm
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class AgE3640A(InstClass.Instrument):
     idnString = 'Agilent Technologies,E3640A'
+    cmdSeparator = ';:'
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -21,10 +21,86 @@ class InstRef():
     def clearName(self):
         self.name = None
 
+class RetryPolicy:
+    """
+    How hard an instrument tries to get an answer, and when to give up on it.
+
+    A failed query is retried after a delay which starts at ``delay`` and\
+    is multiplied by ``backoff`` each time, up to ``maxDelay``.  If\
+    ``failLimit`` reads in a row fail outright, the instrument is marked\
+    degraded for ``cooldown`` seconds: reads return ``'-'`` straight away\
+    without touching the bus.  After the cooldown, the next read is a\
+    single probe; if it works the instrument is healthy again, and if not\
+    it goes straight back to being degraded.
+
+    Parameters
+    ----------
+    attempts : int, optional
+        most tries per read
+    delay : float, optional
+        seconds to wait before the first retry
+    backoff : float, optional
+        factor by which the delay grows on each retry
+    maxDelay : float, optional
+        longest wait between tries
+    failLimit : int, optional
+        failed reads in a row before the instrument is marked degraded
+    cooldown : float, optional
+        seconds to leave a degraded instrument alone
+    """
+
+    def __init__(self, attempts=5, delay=0.05, backoff=2.0, maxDelay=1.0, failLimit=3, cooldown=60.0):
+        self.attempts = attempts
+        self.delay = delay
+        self.backoff = backoff
+        self.maxDelay = maxDelay
+        self.failLimit = failLimit
+        self.cooldown = cooldown
+
+    def wait(self, attempt):
+        """
+        Seconds to wait before a given retry (numbered from one).
+        """
+        return min(self.delay * self.backoff**(attempt - 1), self.maxDelay)
+
+
 class Instrument(metaclass=abc.ABCMeta):
     """
     Abstract class describing a generalized instrument.
+
+    Attributes
+    ----------
+    retryPolicy : RetryPolicy
+        How failed reads are retried, shared by every instrument of the\
+        class unless an instance is given its own.
+    failures : int
+        reads in a row which have failed outright
+    degradedUntil : float or None
+        ``time.monotonic()`` at which a degraded instrument will be tried\
+        again, or ``None`` if it's healthy
+    retryStats : dict
+        running counts of ``'reads'``, ``'retries'``, ``'failures'`` (reads\
+        which got no answer at all) and ``'skipped'`` (reads not attempted\
+        because the instrument was degraded)
+    cmdSeparator : str or None
+        What to put between commands to send several in one message, or\
+        ``None`` if the instrument only takes one command at a time.  SCPI\
+        instruments use ``';:'``, which also returns to the root of the\
+        command tree.
+    replySeparator : str
+        What separates the replies to a combined query.
+    sweepParams : tuple of str
+        Parameters which the instrument can step through a whole list of\
+        values by itself (see ``loadSweep``), so that a loop over them\
+        doesn't have to send every point over the bus.
+    sweepLength : int
+        Most values the instrument can hold for one such sweep.
     """
+    cmdSeparator = None
+    replySeparator = ';'
+    retryPolicy = RetryPolicy()
+    sweepParams = ()
+    sweepLength = 0
 
     # Initialize instrument name and address.
 
@@ -37,8 +113,90 @@ class Instrument(metaclass=abc.ABCMeta):
         self.model = type(self).__name__
         self.visa = self.apparatus.rm.open_resource(self.address)
         self.writeDelay = 0
+        self.failures = 0
+        self.degradedUntil = None
+        self.retryStats = {'reads': 0, 'retries': 0, 'failures': 0, 'skipped': 0}
         
         
+    @property
+    def pnames(self):
+        """
+        Names of all of the parameters, in order.  Setting this (which every\
+        driver does once its ``params`` are built) also builds the lookup\
+        tables used by ``getParam``, ``readParam``, ``writeParam`` and the\
+        ``get*Params`` family.
+        """
+        return self._pnames
+
+    @pnames.setter
+    def pnames(self, names):
+        self._pnames = names
+        if names is None:
+            self._lookup = None
+            self._filtered = {}
+            return
+        lookup = type(self).__dict__.get('_classLookup')
+        if lookup is None or lookup['names'] != names:
+            lookup = self.buildLookup()
+            if '_classLookup' not in type(self).__dict__:
+                type(self)._classLookup = lookup  # the first instance sets up the whole class
+        self._lookup = lookup
+        self._filtered = {kind: [self.params[ii] for ii in indices] for kind, indices in lookup['filters'].items()}
+
+    def buildLookup(self):
+        """
+        Make the tables which map parameter and component names to positions\
+        in ``params``, and list which parameters have each capability.  These\
+        only depend on the driver class, so they are shared by all of its\
+        instances.
+
+        Returns
+        -------
+        dict
+            ``'names'``, ``'index'`` (name to position), ``'comps'``\
+            (component name to position), and ``'filters'`` (capability to\
+            list of positions)
+        """
+        index = {}
+        comps = {}
+        for ii, pm in enumerate(self.params):
+            index.setdefault(pm.name, ii)
+            if pm.comps is not None:
+                for comp in pm.comps:
+                    comps.setdefault(comp, ii)
+        tests = {'W': lambda pm: pm.write is not None,
+                 'WC': lambda pm: pm.write is not None and pm.type != 'cont',
+                 'WCS': lambda pm: pm.write is not None and pm.type == 'cont' and pm.comps is None,
+                 'Q': lambda pm: pm.query is not None,
+                 'QC': lambda pm: pm.query is not None and pm.type == 'cont',
+                 'QCS': lambda pm: pm.query is not None and pm.type == 'cont' and pm.comps is None}
+        filters = {kind: [ii for ii, pm in enumerate(self.params) if test(pm)] for kind, test in tests.items()}
+        return {'names': list(self._pnames), 'index': index, 'comps': comps, 'filters': filters}
+
+    def lookupParam(self, param):
+        """
+        Find a parameter by name.
+
+        Parameters
+        ----------
+        param : str or Param
+            name of the parameter
+
+        Returns
+        -------
+        Param
+            the parameter
+
+        Raises
+        ------
+        ValueError
+            if there's no parameter by that name
+        """
+        ii = self._lookup['index'].get(str(param))
+        if ii is None:
+            raise ValueError('No such parameter!')
+        return self.params[ii]
+
     def log(self, event):
         self.apparatus.logger.info(self.name)
         self.apparatus.logger.info(event)
@@ -79,84 +237,49 @@ class Instrument(metaclass=abc.ABCMeta):
         """
         Returns a list of all writable parameters
         """
-        wparams = []
-        for pm in self.params:
-            if pm.write is not None:
-                wparams.append(pm)
-        return wparams
+        return self._filtered['W'][:]
 
     def getWCParams(self):
         """
         Returns a list of all writable continuous parameters
         """
-        wparams = []
-        for pm in self.params:
-            if pm.write is not None:
-                if pm.type != 'cont':
-                    wparams.append(pm)
-        return wparams
+        return self._filtered['WC'][:]
 
     def getWCSParams(self):
         """
         Returns a list of all writable, continuous, simple parameters
         """
-        wparams = []
-        for pm in self.params:
-            if pm.write is not None and pm.type == 'cont' and pm.comps is None:
-                wparams.append(pm)
-        return wparams
+        return self._filtered['WCS'][:]
 
     def getQParams(self):
         """
         Returns a list of all queryable parameters
         """
-        qparams = []
-        for pm in self.params:
-            if pm.query is not None:
-                qparams.append(pm)
-        return qparams
+        return self._filtered['Q'][:]
 
     def getQCParams(self):
         """
         Returns a list of all readable continuous parameters
         """
-        qparams = []
-        for pm in self.params:
-            if pm.query is not None and pm.type == 'cont':
-                qparams.append(pm)
-        return qparams
+        return self._filtered['QC'][:]
 
     def getQCSParams(self):
         """
         Returns a list of all readable, continuous, simple parameters
         """
-        qparams = []
-        for pm in self.params:
-            if pm.query is not None and pm.type == 'cont' and pm.comps is None:
-                qparams.append(pm)
-        return qparams
+        return self._filtered['QCS'][:]
 
     def getParam(self, param):
-        try:
-            thisparam = self.params[self.pnames.index(param)]
-            return thisparam
-        except ValueError:
-            iscomp = False
-            for pm in self.params:
-                try:
-                    if param in pm.comps:
-                        iscomp=True
-                        break
-                except TypeError:
-                    pass
-            if iscomp:
-                return pm
-            else:
+        ii = self._lookup['index'].get(param)
+        if ii is None:
+            ii = self._lookup['comps'].get(param)  # maybe it's one component of a compound parameter
+            if ii is None:
                 raise ValueError('No such parameter!')
+        return self.params[ii]
 
     def readParam(self, param):
         try:
-            thisparam = self.params[self.pnames.index(param)]
+            thisparam = self.lookupParam(param)
             if thisparam.query is None:
                 self.log("'{:s}' is a write-only parameter!".format(param))
         except ValueError:
@@ -164,56 +287,202 @@ class Instrument(metaclass=abc.ABCMeta):
             self.log(self.pnames)
             return None
 
+        self.retryStats['reads'] += 1
+        if self.isDegraded():
+            self.retryStats['skipped'] += 1
+            return self.blankReply(thisparam)
+        probing = self.degradedUntil is not None  # first read after the cooldown
+
         if thisparam.qmacro is None:
-            attempts = 0
-            limit = 10
-            while attempts < limit:
+            policy = self.retryPolicy
+            limit = 1 if probing else policy.attempts
+            for attempt in range(limit):
                 try:
-                    if attempts > 0:
+                    if attempt > 0:
+                        self.retryStats['retries'] += 1
+                        time.sleep(policy.wait(attempt))
                         self.visa.clear()
-#                    self.log(thisparam.query, end='  --  ')
                     out = self.visa.query(thisparam.query).strip()
-                    if thisparam.type == 'disc':
-                        out = '{:s},{:s}'.format(out, thisparam.labels[thisparam.vals.index(str(int(out)))])  # forces '00' to match '0'
-#                        self.log(out)
-                        return [out]
-                    else:
-#                        self.log(out)
-                        out = out.split(',')
-                        for ii,val in enumerate(out):
-                            try:
-                                val = str(float(val))  # this strips leading zeros from float strings
-                                out[ii] = val
-                            except ValueError:
-                                pass
-                        return out
+                    reply = self.parseReply(thisparam, out)
+                    self.markHealthy()
+                    return reply
 
                 except KeyError:
                     self.log("The {:s} at address {:s} doesn't have a parameter named '{:s}'".format(self.model, self.address,
                                                                                                   param))
                     return None
                 except ValueError:
-                    if attempts < limit:
-                        self.log("Received unexpected value for discrete parameter, retrying:")
-                        out = (out, 'Unknown')
-#                        self.log(out)
-                        attempts += 1
-                    else:
-                        return "Received strange data too many times!:" + out
+                    self.log("Received unexpected value for discrete parameter, retrying:")
                 except pyvisa.errors.VisaIOError:
-                    if attempts < limit:
-                        self.log('Command timout, retrying...')
-                        attempts += 1
-                    else:
-                        return 'Command timed out too many times:' + thisparam.query
+                    self.log('Command timout, retrying...')
+            self.markFailed()
+            return self.blankReply(thisparam)
 
         else:  # MACRO COMMANDS
-            thisparam = self.params[self.pnames.index(param)]
-            return thisparam.qmacro()
+            try:
+                reply = thisparam.qmacro()
+            except pyvisa.errors.VisaIOError:
+                self.log('Command timeout in {:s}'.format(thisparam.name))
+                self.markFailed()
+                return self.blankReply(thisparam)
+            self.markHealthy()
+            return reply
 
-    def writeParam(self, param, val=None):
+    def blankReply(self, thisparam):
+        """
+        What ``readParam`` returns when there's no answer: a dash for the\
+        value, or for each component.
+        """
+        return ['-'] * (len(thisparam.comps) if thisparam.comps is not None else 1)
+
+    def isDegraded(self):
+        """
+        Whether reads are currently being skipped because this instrument\
+        keeps failing.
+        """
+        return self.degradedUntil is not None and time.monotonic() < self.degradedUntil
+
+    def markHealthy(self):
+        """
+        Note a successful read.
+        """
+        if self.degradedUntil is not None:
+            self.log('{:s} is responding again'.format(str(self)))
+        self.failures = 0
+        self.degradedUntil = None
+
+    def markFailed(self):
+        """
+        Note a read which got no answer, and mark the instrument degraded\
+        once that has happened too many times in a row.
+        """
+        self.failures += 1
+        self.retryStats['failures'] += 1
+        if self.degradedUntil is not None or self.failures >= self.retryPolicy.failLimit:
+            self.degradedUntil = time.monotonic() + self.retryPolicy.cooldown
+            self.log('{:s} failed {:d} reads in a row, skipping it for {:.0f} s'.format(
+                str(self), self.failures, self.retryPolicy.cooldown))
+
+    def parseReply(self, thisparam, out):
+        """
+        Turn an instrument's reply to a query into the list of strings\
+        which ``readParam`` returns.
+
+        Parameters
+        ----------
+        thisparam : Param
+            the parameter which was queried
+        out : str
+            the reply
+
+        Returns
+        -------
+        list of str
+            the value, or the values of each component.  Discrete values\
+            come back as ``'value,label'``.
+
+        Raises
+        ------
+        ValueError
+            if a discrete parameter came back with an unknown value
+        """
+        out = out.strip()
+        if thisparam.type == 'disc':
+            return ['{:s},{:s}'.format(out, thisparam.labels[thisparam.vals.index(str(int(out)))])]  # forces '00' to match '0'
+        out = out.split(',')
+        for ii,val in enumerate(out):
+            try:
+                val = str(float(val))  # this strips leading zeros from float strings
+                out[ii] = val
+            except ValueError:
+                pass
+        return out
+
+    def readParams(self, params):
+        """
+        Read several parameters.  If the instrument accepts several commands\
+        in one message (``cmdSeparator`` is set), all of the plain queries\
+        are sent together and the reply is split on ``replySeparator``, so\
+        the whole lot costs a single bus round trip.  Macro parameters, and\
+        anything the combined reply didn't cover, are read one at a time\
+        with ``readParam``.
+
+        Parameters
+        ----------
+        params : list of str
+            names of the parameters to read
+
+        Returns
+        -------
+        list
+            the output of ``readParam`` for each parameter, in order
+        """
+        thisparams = []
+        for param in params:
+            try:
+                thisparams.append(self.lookupParam(param))
+            except ValueError:
+                thisparams.append(None)
+        batch = [ii for ii, pm in enumerate(thisparams)
+                 if pm is not None and pm.query is not None and pm.qmacro is None]
+
+        results = [None] * len(params)
+        if self.isDegraded():
+            self.retryStats['reads'] += len(params)
+            self.retryStats['skipped'] += len(params)
+            return [None if pm is None else self.blankReply(pm) for pm in thisparams]
+        if self.cmdSeparator is not None and len(batch) > 1 and self.degradedUntil is None:
+            try:
+                replies = self.visa.query(self.cmdSeparator.join([thisparams[ii].query for ii in batch]))
+                replies = replies.strip().split(self.replySeparator)
+                if len(replies) == len(batch):
+                    self.markHealthy()
+                    for ii, reply in zip(batch, replies):
+                        try:
+                            results[ii] = self.parseReply(thisparams[ii], reply)
+                            self.retryStats['reads'] += 1
+                        except ValueError:
+                            pass  # try that one again by itself
+                else:
+                    self.log('Combined query came back with {:d} of {:d} replies, reading one at a time'.format(len(replies), len(batch)))
+                    self.visa.clear()  # don't leave stray replies in the output buffer
+            except pyvisa.errors.VisaIOError:
+                self.log('Combined query timed out, reading one at a time')
+                self.visa.clear()
+
+        for ii, param in enumerate(params):
+            if results[ii] is None:
+                results[ii] = self.readParam(param)
+        return results
+
+    def encodeWrite(self, param, val=None):
+        """
+        Work out ahead of time the command ``writeParam`` would send, so it\
+        can be sent later with ``sendBatch([cmd])``.
+
+        Returns
+        -------
+        str or None
+            None if the parameter is written by a macro, or if the write\
+            isn't valid (``writeParam`` explains why when it's tried)
+        """
+        try:
+            thisparam = self.lookupParam(param)
+        except ValueError:
+            return None
+        if thisparam.write is None or thisparam.wmacro is not None:
+            return None
+        try:
+            return thisparam.encoder()(val)
+        except (ValueError, TypeError):
+            return None
+
+    def writableParam(self, param):
+        """
+        Look up a parameter for writing, logging why not if it can't be.
+        """
         try:
-            thisparam = self.params[self.pnames.index(param)]
+            thisparam = self.lookupParam(param)
             if thisparam.write is None:
                 self.log("'{:s}' is a read-only parameter!".format(param))
                 return None
@@ -221,72 +490,172 @@ class Instrument(metaclass=abc.ABCMeta):
             self.log("No parameter with that name exists!  Options are:")
             self.log(self.pnames)
             return None
+        return thisparam
 
-        if thisparam.wmacro is None:
-            try:
-                if not isinstance(val, list):
-                    val = [val]
+    def logAcceptable(self, thisparam, param, val):
+        """
+        Explain which values a parameter would have accepted.
+        """
+        self.log("The parameter '{:s}' can't accept value '{:s}'.  Acceptable values are:".format(param, str(val)))
+        try:
+            for ii, val in enumerate(thisparam.vals):
+                if thisparam.labels is not None:
+                    self.log('{:s}\t{:s}'.format(val, thisparam.labels[ii]))
+                else:
+                    self.log(val)
+        except TypeError:
+            if thisparam.pmax is not None:
+                if thisparam.pmin is not None:
+                    self.log('{:f} < val < {:f}'.format(thisparam.pmin, thisparam.pmax))
+                else:
+                    self.log('val < {:f}'.format(thisparam.pmax))
+            else:
+                if thisparam.pmin is not None:
+                    self.log('{:f} < val'.format(thisparam.pmin))
+                else:
+                    self.log('Literally anything. Sorry, Mario, but your error is in another castle.')
 
-                if thisparam.type == 'cont':
-                    fmtstring = ['{:f}' for x in range(len(val))]
-                    for ii in range(len(val)):
-                        try:
-                            val[ii] = float(val[ii])
-                            if thisparam.prec is not None:
-                                val[ii] = round(val[ii], thisparam.prec)
-                                fmtstring[ii] = '{{:.{:d}f}}'.format(thisparam.prec)
-                            if thisparam.pmax is not None:  # Truncate the parameter to the closest limit if out of range
-                                val[ii] = min(val[ii], thisparam.pmax)
-                            if thisparam.pmin is not None:
-                                val[ii] = max(val[ii], thisparam.pmin)
-                        except TypeError:
-                            self.log('Invalid Parameter!')
-                elif thisparam.type == 'disc':
-                    fmtstring = ['{:d}' for x in range(len(val))]
-                    for ii in range(len(val)):
-                        val[ii] = str(val[ii])
-                        if val[ii] not in thisparam.vals:
-                            if val[ii] not in thisparam.labels:
-                                raise ValueError
-                            else:  # the user input the label instead of the value...alright fiiiiine
-                                val[ii] = thisparam.vals[thisparam.labels.index(val[ii])]
-                cmd = '{:s}'.format(thisparam.write)
-                if thisparam.type != 'act':
-                    for ii in range(len(val)):  # for multiple inputs, use syntax 'command a,b,c'
-                        delim = ' ' if ii == 0 else ','
-                        if thisparam.type == 'cont':
-                            cmd = ('{:s}{:s}' + fmtstring[ii]).format(cmd, delim, float(val[ii]))
-                        elif thisparam.type == 'disc':
-                            cmd = ('{:s}{:s}' + fmtstring[ii]).format(cmd, delim, int(val[ii]))
-                self.log(cmd)
-                self.visa.write(cmd)
-                time.sleep(self.writeDelay)
+    def writeParam(self, param, val=None):
+        thisparam = self.writableParam(param)
+        if thisparam is None:
+            return None
 
+        if thisparam.wmacro is None:
+            try:
+                cmd = thisparam.encoder()(val)
             except ValueError:
-                self.log("The parameter '{:s}' can't accept value '{:s}'.  Acceptable values are:".format(param, str(val)))
-                try:
-                    for ii, val in enumerate(thisparam.vals):
-                        if thisparam.labels is not None:
-                            self.log('{:s}\t{:s}'.format(val, thisparam.labels[ii]))
-                        else:
-                            self.log(val)
-                except TypeError:
-                    if thisparam.pmax is not None:
-                        if thisparam.pmin is not None:
-                            self.log('{:f} < val < {:f}'.format(thisparam.pmin, thisparam.pmax))
-                        else:
-                            self.log('val < {:f}'.format(thisparam.pmax))
-                    else:
-                        if thisparam.pmin is not None:
-                            self.log('{:f} < val'.format(thisparam.pin))
-                        else:
-                            self.log('Literally anything. Sorry, Mario, but your error is in another castle.')
+                self.logAcceptable(thisparam, param, val)
+                return None
+            self.log(cmd)
+            self.visa.write(cmd)
+            time.sleep(self.writeDelay)
 
         else:  # MACRO COMMANDS
-            thisparam = self.params[self.pnames.index(param)]
             thisparam.wmacro(val)
             time.sleep(self.writeDelay)
 
+    def writeParams(self, writes):
+        """
+        Write several parameters.  If the instrument accepts several commands\
+        in one message (``cmdSeparator`` is set), consecutive writes are\
+        joined and sent as one, which saves a bus round trip and a\
+        ``writeDelay`` per parameter.  Macro parameters are still run one at\
+        a time, in order.
+
+        Parameters
+        ----------
+        writes : list of tuple
+            ``(param, val)`` pairs, in the order they should be written
+        """
+        batch = []
+        for param, val in writes:
+            thisparam = self.writableParam(param)
+            if thisparam is None:
+                continue
+            if thisparam.wmacro is not None or self.cmdSeparator is None:
+                self.sendBatch(batch)
+                batch = []
+                self.writeParam(param, val)
+                continue
+            try:
+                batch.append(thisparam.encoder()(val))
+            except ValueError:
+                self.logAcceptable(thisparam, param, val)
+        self.sendBatch(batch)
+
+    def sendBatch(self, cmds):
+        """
+        Send commands which have already been encoded: as one message if the\
+        instrument accepts that (``cmdSeparator`` is set), otherwise one\
+        at a time.
+
+        Parameters
+        ----------
+        cmds : list of str
+        """
+        if len(cmds) == 0:
+            return
+        if self.cmdSeparator is None:
+            messages = cmds
+        else:
+            messages = [self.cmdSeparator.join(cmds)]
+        for cmd in messages:
+            self.log(cmd)
+            self.visa.write(cmd)
+            time.sleep(self.writeDelay)
+
+    def sweepable(self, param, count):
+        """
+        Whether the instrument can run a sweep of ``count`` values of\
+        ``param`` on its own.
+        """
+        return str(param) in self.sweepParams and 0 < count <= self.sweepLength
+
+    def sweepReadback(self, param):
+        """
+        What ``fetchSweep`` gives for each point of a sweep of ``param``.
+
+        Returns
+        -------
+        list of tuple
+            ``(name, unit)`` of each value
+        """
+        return []
+
+    def loadSweep(self, param, values, dwell):
+        """
+        Send the instrument a whole sweep, ready for ``startSweep``.\
+        Drivers which list ``sweepParams`` override this, along with\
+        ``startSweep`` and ``sweepDone``; here the request is refused.
+
+        Parameters
+        ----------
+        param : str
+            one of ``sweepParams``
+        values : list of float
+            every point of the sweep, in order
+        dwell : float
+            seconds to stay at each point
+
+        Returns
+        -------
+        bool or None
+            False if the sweep was refused
+        """
+        self.log("{:s} can't run a sweep of {:s} by itself".format(self.model, str(param)))
+        return False
+
+    def startSweep(self):
+        """
+        Start the sweep sent by ``loadSweep``.
+        """
+        self.log("{:s} can't run sweeps by itself".format(self.model))
+
+    def sweepDone(self):
+        """
+        Check (without waiting) whether the sweep has finished.  With no\
+        sweep running there's nothing to wait for, so here it always has.
+        """
+        return True
+
+    def fetchSweep(self):
+        """
+        Collect the readings taken during the sweep, all at once.
+
+        Returns
+        -------
+        list of tuple
+            ``(seconds since the start, values)`` for each point, where\
+            ``values`` are described by ``sweepReadback``
+        """
+        return []
+
+    def stopSweep(self):
+        """
+        Abandon a sweep part way through.
+        """
+        pass
+
     def clearGPIB(self):
         self.visa.write('*CLS')
         self.log('*CLS')
@@ -4,6 +4,9 @@ from . import InstClass
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class Keithley2400(InstClass.Instrument):
     idnString = 'KEITHLEY INSTRUMENTS INC.,MODEL 2400'
+    cmdSeparator = ';:'
+    sweepParams = ('Source Voltage',)
+    sweepLength = 100  # points in the source memory list
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -12,6 +15,7 @@ class Keithley2400(InstClass.Instrument):
         #self.params.append(pm.Param('Enabled Functions', q='SENS:FUNC:ON?', t='cont', units=''))
         #self.params.append(pm.Param('Get Data', q='SENS:DATA:LAT?', t='cont', units=''))
 #        self.params.append(pm.Param('Resistance', q='measres', t='cont', units='', qmacro=self.getResistance))
+        self.params.append(pm.Param('Source Voltage', q='SOUR:VOLT?', w='SOUR:VOLT', t='cont', pmin=-210, pmax=210, units='V'))
         self.params.append(pm.Param('VIR', q='iv', t='cont', qmacro=self.getVIR, comps=['Voltage', 'Current', 'Resistance'],
                                     units=['V','A','Ohms']))
         #self.params.append(pm.Param('Latest Data', q='SENS:DATA:LAT?', t='cont', units=''))
@@ -30,4 +34,28 @@ class Keithley2400(InstClass.Instrument):
         response = self.visa.query('MEAS?')
         v,i = response.split(',')[:2]
         r = str(float(v)/float(i))
-        return [v, i, r]
\ No newline at end of file
+        return [v, i, r]
+
+    def sweepReadback(self, param):
+        return [('Source Voltage', 'V'), ('Current', 'A')]
+
+    def loadSweep(self, param, values, dwell):
+        source = self.getParam('Source Voltage')
+        points = ','.join(['{:g}'.format(min(max(v, source.pmin), source.pmax)) for v in values])
+        self.sendBatch(['*CLS', 'SOUR:FUNC VOLT', 'SOUR:VOLT:MODE LIST', 'SOUR:LIST:VOLT ' + points,
+                        'TRIG:COUN {:d}'.format(len(values)), 'SOUR:DEL {:.3f}'.format(dwell),
+                        'FORM:ELEM VOLT,CURR,TIME', 'OUTP ON'])
+
+    def startSweep(self):
+        self.visa.write('SYST:TIME:RES;:INIT;*OPC')  # the operation complete bit is set once every point is done
+
+    def sweepDone(self):
+        return int(self.visa.query('*ESR?')) & 1 == 1
+
+    def fetchSweep(self):
+        vals = [float(x) for x in self.visa.query('FETC?').split(',')]
+        self.sendBatch(['SOUR:VOLT:MODE FIXED', 'FORM:ELEM VOLT,CURR,RES,TIME,STAT'])
+        return [(vals[ii+2], vals[ii:ii+2]) for ii in range(0, len(vals) - 2, 3)]
+
+    def stopSweep(self):
+        self.sendBatch(['ABOR', 'SOUR:VOLT:MODE FIXED', 'FORM:ELEM VOLT,CURR,RES,TIME,STAT'])
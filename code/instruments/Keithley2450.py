@@ -3,6 +3,9 @@ from . import InstClass
 
 class Keithley2450(InstClass.Instrument):
     idnString = 'KEITHLEY INSTRUMENTS INC.,MODEL 2450'
+    cmdSeparator = ';:'
+    sweepParams = ('OutputVoltage',)
+    sweepLength = 2500  # points in a source list, sent 100 at a time
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -10,4 +13,31 @@ class Keithley2450(InstClass.Instrument):
         self.params.append(pm.Param('OutputState', q='OUTP:STAT?', w='OUTP:STAT', t='disc', vals=[0,1], labels=['Off', 'On']))
         self.params.append(pm.Param('OutputVoltage', q='SOUR:VOLT?', w='SOUR:VOLT ', t='cont', pmin=-210, pmax=210, units='V'))
 
-        self.pnames = [p.name for p in self.params]        
\ No newline at end of file
+        self.pnames = [p.name for p in self.params]
+
+    def sweepReadback(self, param):
+        return [('OutputVoltage', 'V'), ('Current', 'A')]
+
+    def loadSweep(self, param, values, dwell):
+        source = self.getParam('OutputVoltage')
+        points = ['{:g}'.format(min(max(v, source.pmin), source.pmax)) for v in values]
+        cmds = ['*CLS', 'SOUR:FUNC VOLT', 'TRAC:CLE "defbuffer1"']
+        for ii in range(0, len(points), 100):
+            cmds.append(('SOUR:LIST:VOLT ' if ii == 0 else 'SOUR:LIST:VOLT:APP ') + ','.join(points[ii:ii+100]))
+        cmds.append('SOUR:SWE:VOLT:LIST 1, {:.3f}'.format(dwell))
+        self.sweepPoints = len(points)
+        self.sendBatch(cmds)
+
+    def startSweep(self):
+        self.visa.write('INIT;*OPC')  # the operation complete bit is set once every point is done
+
+    def sweepDone(self):
+        return int(self.visa.query('*ESR?')) & 1 == 1
+
+    def fetchSweep(self):
+        vals = self.visa.query('TRAC:DATA? 1, {:d}, "defbuffer1", REL, SOUR, READ'.format(self.sweepPoints))
+        vals = [float(x) for x in vals.split(',')]
+        return [(vals[ii], vals[ii+1:ii+3]) for ii in range(0, len(vals) - 2, 3)]
+
+    def stopSweep(self):
+        self.visa.write('ABOR')
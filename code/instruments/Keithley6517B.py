@@ -4,6 +4,7 @@ from . import InstClass
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class Keithley6517B(InstClass.Instrument):
     idnString = 'KEITHLEY INSTRUMENTS INC.,MODEL 6517B'
+    cmdSeparator = ';:'
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
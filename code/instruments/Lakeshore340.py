@@ -5,6 +5,7 @@ from . import Parameter as pm
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class Lakeshore340(InstClass.Instrument):
     idnString = 'LSCI,MODEL340'
+    cmdSeparator = ';'
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -1,11 +1,15 @@
 from . import InstClass
 from . import Parameter as pm
 import pyvisa
+import re
+import time
 
 
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class OxfordITC503(InstClass.Instrument):
     idnString = 'X'
+    sweepParams = ('Setpoint',)
+    sweepLength = 16  # steps in the sweep table
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -83,4 +87,37 @@ class OxfordITC503(InstClass.Instrument):
                 self.visa.write('y{:d}'.format(jj))
                 self.visa.read()
                 self.visa.write('s0')
-                self.visa.read()
\ No newline at end of file
+                self.visa.read()
+
+    def setSweepCell(self, step, column, val):
+        """
+        Fill in one cell of the sweep table: ``column`` 1 is the setpoint,\
+        2 the time to sweep to it and 3 the time to hold it, in minutes.
+        """
+        for cmd in ('x{:d}'.format(step), 'y{:d}'.format(column), 's{:s}'.format(val)):
+            self.visa.write(cmd)
+            self.visa.read()
+
+    def loadSweep(self, param, values, dwell):
+        hold = '{:.1f}'.format(max(0.1, dwell / 60))  # the table counts in minutes
+        for step in range(1, self.sweepLength + 1):
+            if step <= len(values):
+                cells = ('{:.3f}'.format(values[step-1]), '0', hold)  # jump to each setpoint and hold it
+            else:
+                cells = ('0', '0', '0')  # clear the rest of the table
+            for column, val in enumerate(cells, 1):
+                self.setSweepCell(step, column, val)
+
+    def startSweep(self):
+        self.writeAck('S', 1)
+        self.sweepStart = time.monotonic()
+        self.sweepSeen = False
+
+    def sweepDone(self):
+        status = re.search('S([0-9]+)', self.visa.query('X'))  # sweep status: zero when not sweeping
+        running = status is not None and int(status.group(1)) != 0
+        self.sweepSeen = self.sweepSeen or running
+        return not running and (self.sweepSeen or time.monotonic() - self.sweepStart > 10)
+
+    def stopSweep(self):
+        self.writeAck('S', 0)
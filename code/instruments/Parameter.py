@@ -1,6 +1,7 @@
 class Param:
     def __init__(self, name, w=None, q=None, t=None, pmin=None, pmax=None, prec=None,
-                 vals=None, labels=None, units=None, wmacro=None, qmacro=None, comps=None):
+                 vals=None, labels=None, units=None, wmacro=None, qmacro=None, comps=None,
+                 dtype=None, length=None):
         self.name = name
         self.write = w
         self.query = q
@@ -29,6 +30,8 @@ class Param:
         self.units = units  # string, or list of strings if comps is not None
         self.wmacro = wmacro  # Function to run when it's too complicated to write one line at a time
         self.qmacro = qmacro  # Function to run when it's too complicated to read one line at a time
+        self.dtype = dtype  # for array outputs (e.g. buffers): numpy dtype of each element
+        self.length = length  # and the number of elements, or None if it varies
 
         if self.type == "cont":
             if self.comps is not None:
@@ -37,7 +40,82 @@ class Param:
                 elif len(self.comps) != len(self.units):
                     raise ValueError("Error in parameter {:s}: component and unit list\
                                      have different lengths!".format(self.name))
-    
+        self._encoder = None
+
+    def isArray(self):
+        """
+        Whether each reading of this parameter (or of each of its\
+        components) is a whole array, rather than a single value.
+        """
+        return self.dtype is not None
+
+    def encoder(self):
+        """
+        Get a function which turns a value into the command string that\
+        writes it.  Checking, rounding, clamping and formatting are all\
+        worked out once, so repeated writes of this parameter (e.g. every\
+        point of a sweep) only pay for the value itself.
+
+        Returns
+        -------
+        function
+            ``encode(val)`` returns the command string for ``val`` (a value,\
+            or a list of values for multiple inputs), and raises\
+            ``ValueError`` if the value isn't acceptable
+        """
+        if self._encoder is None:
+            self._encoder = self.buildEncoder()
+        return self._encoder
+
+    def buildEncoder(self):
+        head = '{:s}'.format(self.write)
+        if self.type == 'cont':
+            fmt = '{:f}' if self.prec is None else '{{:.{:d}f}}'.format(self.prec)
+            prec, pmin, pmax = self.prec, self.pmin, self.pmax
+
+            def encode(val):
+                if not isinstance(val, list):
+                    val = [val]
+                out = []
+                for v in val:
+                    try:
+                        v = float(v)
+                    except TypeError:
+                        raise ValueError('Invalid Parameter!')
+                    if prec is not None:
+                        v = round(v, prec)
+                    if pmax is not None:  # Truncate the parameter to the closest limit if out of range
+                        v = min(v, pmax)
+                    if pmin is not None:
+                        v = max(v, pmin)
+                    out.append(fmt.format(v))
+                return head + ' ' + ','.join(out)  # for multiple inputs, use syntax 'command a,b,c'
+
+        elif self.type == 'disc':
+            codes = {}
+            for ii, v in enumerate(self.vals or []):
+                try:
+                    code = '{:d}'.format(int(v))
+                except ValueError:
+                    continue
+                codes[v] = code
+                if self.labels is not None:  # the user may input the label instead of the value
+                    codes.setdefault(str(self.labels[ii]), code)
+
+            def encode(val):
+                if not isinstance(val, list):
+                    val = [val]
+                try:
+                    return head + ' ' + ','.join([codes[str(v)] for v in val])
+                except KeyError:
+                    raise ValueError('Unacceptable value')
+
+        else:
+            def encode(val=None):
+                return head
+
+        return encode
+
     def __str__(self):
         return self.name
     def __repr__(self):
@@ -1,4 +1,5 @@
 import re
+import time
 import pyvisa
 
 from instruments import InstClass
@@ -9,6 +10,8 @@ from instruments import Parameter as pm
 # I'M DOING EVERYTHING IN TESLA-- MAKE SURE THE TESLA COMMAND HAS BEEN ACTIVATED!
 class SLACMagnet(InstClass.Instrument):
     idnString = '-------> Commands:'
+    sweepParams = ('Field Midpoint',)
+    sweepLength = 2  # the supply holds a midpoint and a maximum to ramp between
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -125,4 +128,49 @@ class SLACMagnet(InstClass.Instrument):
         rate_Ts = float(rate)
         rate_As = rate_Ts/self.teslaPerAmp
         self.visa.write('SET RAMP {:.4f}'.format(rate_As))
-        print(self.visa.read())
\ No newline at end of file
+        print(self.visa.read())
+
+    def sweepReadback(self, param):
+        return [('Field', 'T')]
+
+    def loadSweep(self, param, values, dwell):
+        self.sweepTargets = ['MID', 'MAX'][:len(values)]
+        for target, val in zip(self.sweepTargets, values):
+            self.writeAck('SET ' + target, '{:.4f}'.format(min(max(val, 0), self.maxField)))
+        self.sweepDwell = dwell
+
+    def startSweep(self):
+        self.sweepRows = []
+        self.sweepStep = 0
+        self.holdSince = None
+        self.sweepStart = time.monotonic()
+        self.writeAck('RAMP ' + self.sweepTargets[0], None)
+
+    def sweepDone(self):
+        """
+        The supply only knows how to ramp to one target, so this also moves\
+        the sweep on to the next target once the last one has been held\
+        for the dwell time, and takes the field reading for that point.
+        """
+        if self.sweepStep >= len(self.sweepTargets):
+            return True
+        if self.getRampStatus()[0] != 'HOLDING':
+            return False
+        now = time.monotonic()
+        if self.holdSince is None:
+            self.holdSince = now
+        if now - self.holdSince < self.sweepDwell:
+            return False
+        self.sweepRows.append((now - self.sweepStart, [float(self.getField()[0])]))
+        self.sweepStep += 1
+        self.holdSince = None
+        if self.sweepStep < len(self.sweepTargets):
+            self.writeAck('RAMP ' + self.sweepTargets[self.sweepStep], None)
+            return False
+        return True
+
+    def fetchSweep(self):
+        return self.sweepRows
+
+    def stopSweep(self):
+        self.writeAck('PAUSE', 1)
@@ -1,11 +1,13 @@
 from instruments import InstClass
 from instruments import Parameter as pm
+import numpy as np
 import re
 import time
 
 
 class SRS830(InstClass.Instrument):
     idnString = 'Stanford_Research_Systems,SR830'
+    cmdSeparator = ';'
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -75,9 +77,9 @@ class SRS830(InstClass.Instrument):
         self.params.append(pm.Param('ResetSampleBuffer', w='REST', t='act'))
         self.params.append(pm.Param('SampledPoints', q='SPTS?', t='cont', units='points', prec=0))
         self.params.append(pm.Param('SampleForNSeconds', w='sample', t='cont', pmin=0.1, units='s', wmacro=self.readForTime))
-        self.params.append(pm.Param('Buffer3s', q='buffer', t='cont', comps=['Buffer X', 'Buffer Y'], units=['V','V'], qmacro=self.readBuffer))
+        self.params.append(pm.Param('Buffer3s', q='buffer', t='cont', comps=['Buffer X', 'Buffer Y'], units=['V','V'], dtype='<f8', qmacro=self.readBuffer))
         self.params.append(pm.Param('Buffer3s_(Bytes)', q='buffer', t='cont', comps=['Buffer X', 'Buffer Y'], units=['V','V'], qmacro=self.readBuffer3B))
-        self.params.append(pm.Param('Buffer1s', q='buffer', t='cont', comps=['Buffer X', 'Buffer Y'], units=['V','V'], qmacro=self.readBuffer1))
+        self.params.append(pm.Param('Buffer1s', q='buffer', t='cont', comps=['Buffer X', 'Buffer Y'], units=['V','V'], dtype='<f8', qmacro=self.readBuffer1))
         
 
         self.pnames = [p.name for p in self.params]
@@ -87,114 +89,64 @@ class SRS830(InstClass.Instrument):
         time.sleep(float(seconds))
         self.visa.write('PAUS')
 
-    def readBuffer(self, *args):
-        self.writeParam('Pause Sampling')
-        total = int(float(self.readParam('Sampled Points')[0]))
+    def bufferWindow(self, npoints):
+        """
+        Stop sampling, and work out which stretch of the buffer to transfer:\
+        the most recent ``npoints`` points, or everything if there are fewer.
+
+        Returns
+        -------
+        start, N : int
+            the arguments for ``TRCL?``
+        """
+        self.writeParam('PauseSampling')
+        total = int(float(self.readParam('SampledPoints')[0]))
         print('{:d} points in buffer'.format(total))
-        N = 3*512 - 1
+        N = npoints
         if total-N > 0:
             start = total-N
         else:
             start = 0
             N = total-1
+        return start, N
+
+    def readTrace(self, channel, start, N):
+        """
+        Transfer part of one of the data buffers in the fast binary format.
+
+        Returns
+        -------
+        bytes
+            4 bytes per point, as sent by the instrument
+        """
         self.visa.timeout = 10000
-        self.visa.write('TRCL? 1,{:d},{:d}'.format(start, N))
-        bufx = self.visa.read_raw()
-        numx = []
-        for bi in range(int(len(bufx)/4)):
-            m = bufx[4*bi + 0] + 256*bufx[4*bi + 1]
-            if m>0x7FFF:
-                m -= 0x1000  # handle signed mantissa
-            e = bufx[4*bi + 2] + 256*bufx[4*bi + 3]
-            numx.append('{:.8g}'.format(m*2**(e-124)))
-        bufx = '_'.join(numx)
-        
-        self.visa.write('TRCL? 2,{:d},{:d}'.format(start, N))
-        bufy = self.visa.read_raw()
-        numy = []
-        for bi in range(int(len(bufy)/4)):
-            if m>0x7FFF:
-                m -= 0x1000  # handle signed mantissa
-            m = bufy[4*bi + 0] + 256*bufy[4*bi + 1]
-            e = bufy[4*bi + 2] + 256*bufy[4*bi + 3]
-            numy.append('{:.8g}'.format(m*2**(e-124)))
-        bufy = '_'.join(numy)
-        
-        self.writeParam('Reset Sample Buffer')
+        self.visa.write('TRCL? {:d},{:d},{:d}'.format(channel, start, N))
+        raw = self.visa.read_raw()
+        return raw[:4*(len(raw)//4)]
+
+    def readBuffer(self, *args):
+        start, N = self.bufferWindow(3*512 - 1)
+        bufx = decodeTRCL(self.readTrace(1, start, N))
+        bufy = decodeTRCL(self.readTrace(2, start, N))
+        self.writeParam('ResetSampleBuffer')
         return [bufx, bufy]
-        
-        
+
     def readBuffer3B(self, *args):
-        self.writeParam('Pause Sampling')
-        total = int(float(self.readParam('Sampled Points')[0]))
-        print('{:d} points in buffer'.format(total))
-        if total==0:
+        start, N = self.bufferWindow(3*512 - 1)
+        if N < 0:
             return ['-', '-']  # something screwed up.
-        N = 3*512 - 1
-        if total-N > 0:
-            start = total-N
-        else:
-            start = 0
-            N = total-1
-        self.visa.timeout = 10000
-        self.visa.write('TRCL? 1,{:d},{:d}'.format(start, N))
-        bufx = self.visa.read_raw()
-        numx = []
-        for bi in range(int(len(bufx)/4)):
-            m = bufx[4*bi + 0] + 256*bufx[4*bi + 1]
-            e = bufx[4*bi + 2] + 256*bufx[4*bi + 3]
-            numx.append('{:04x}{:04x}'.format(e, m))
-        bufx = ''.join(numx)
-        
-        self.visa.write('TRCL? 2,{:d},{:d}'.format(start, N))
-        bufy = self.visa.read_raw()
-        numy = []
-        for bi in range(int(len(bufy)/4)):
-            m = bufy[4*bi + 0] + 256*bufy[4*bi + 1]
-            e = bufy[4*bi + 2] + 256*bufy[4*bi + 3]
-            numy.append('{:04x}{:04x}'.format(e,m))
-        bufy = ''.join(numy)
-        
-        self.writeParam('Reset Sample Buffer')
+        bufx = hexTRCL(self.readTrace(1, start, N))
+        bufy = hexTRCL(self.readTrace(2, start, N))
+        self.writeParam('ResetSampleBuffer')
         return [bufx, bufy]
-        
-        
+
     def readBuffer1(self, *args):
-        self.writeParam('Pause Sampling')
-        total = int(float(self.readParam('Sampled Points')[0]))
-        print('{:d} points in buffer'.format(total))
-        N = 512 - 1
-        if total-N > 0:
-            start = total-N
-        else:
-            start = 0
-            N = total-1
-        self.visa.timeout = 10000
-        self.visa.write('TRCL? 1,{:d},{:d}'.format(start, N))
-        bufx = self.visa.read_raw()
-        numx = []
-        for bi in range(int(len(bufx)/4)):
-            m = bufx[4*bi + 0] + 256*bufx[4*bi + 1]
-            if m>0x7FFF:
-                m -= 0x1000  # handle signed mantissa
-            e = bufx[4*bi + 2] + 256*bufx[4*bi + 3]
-            numx.append('{:.8g}'.format(m*2**(e-124)))
-        bufx = '_'.join(numx)
-        
-        self.visa.write('TRCL? 2,{:d},{:d}'.format(start, N))
-        bufy = self.visa.read_raw()
-        numy = []
-        for bi in range(int(len(bufy)/4)):
-            if m>0x7FFF:
-                m -= 0x1000  # handle signed mantissa
-            m = bufy[4*bi + 0] + 256*bufy[4*bi + 1]
-            e = bufy[4*bi + 2] + 256*bufy[4*bi + 3]
-            numy.append('{:.8g}'.format(m*2**(e-124)))
-        bufy = '_'.join(numy)
-        
-        self.writeParam('Reset Sample Buffer')
+        start, N = self.bufferWindow(512 - 1)
+        bufx = decodeTRCL(self.readTrace(1, start, N))
+        bufy = decodeTRCL(self.readTrace(2, start, N))
+        self.writeParam('ResetSampleBuffer')
         return [bufx, bufy]
-        
+
     def offsetExpand(self,channel,expand, *args):
         channelLUT = {1:'X', 2:'Y', 3:'R'}
         result = self.readParam('OffsetExpand'+channelLUT[channel])
@@ -214,4 +166,46 @@ class SRS830(InstClass.Instrument):
 
         cmd = 'AOFF {:d}'.format(channel)
         self.visa.write(cmd)
-        print(cmd)
\ No newline at end of file
+        print(cmd)
+
+
+TRCL = np.dtype([('mantissa', '<i2'), ('exponent', '<i2')])  # one point of a TRCL? transfer
+
+
+def decodeTRCL(raw):
+    """
+    Convert a binary ``TRCL?`` transfer into numbers, all at once.  Each\
+    point is a signed 16-bit mantissa and a 16-bit exponent, and is worth\
+    ``mantissa * 2**(exponent - 124)``.
+
+    Parameters
+    ----------
+    raw : bytes
+        the transfer, 4 bytes per point
+
+    Returns
+    -------
+    numpy.ndarray of float64
+        the buffer values
+    """
+    points = np.frombuffer(raw, dtype=TRCL)
+    return np.ldexp(points['mantissa'].astype(np.float64), points['exponent'].astype(np.int32) - 124)
+
+
+def hexTRCL(raw):
+    """
+    Encode a binary ``TRCL?`` transfer as hex, four digits of exponent then\
+    four digits of mantissa per point, without decoding it.
+
+    Parameters
+    ----------
+    raw : bytes
+        the transfer, 4 bytes per point
+
+    Returns
+    -------
+    str
+        the hex string
+    """
+    words = np.frombuffer(raw, dtype='<u2').reshape(-1, 2)[:, ::-1]  # exponent first
+    return words.astype('>u2').tobytes().hex()
@@ -7,6 +7,7 @@ import time
 # If you copy this file to make a new instrument, add it to lib/__init__.py!
 class SRS865(InstClass.Instrument):
     idnString = 'Stanford_Research_Systems,SR865'
+    cmdSeparator = ';'
 
     def __init__(self, apparatus, address, name=None):
         super().__init__(apparatus, address, name)
@@ -0,0 +1,75 @@
+import logging
+import logging.handlers
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code'))
+
+
+class FakeVisa:
+    """
+    Stands in for a pyvisa resource: records what is written, and answers\
+    every query with ``reply``.
+    """
+    def __init__(self):
+        self.writes = []
+        self.reply = '1.0'
+        self.timeout = 1000
+
+    def write(self, cmd):
+        self.writes.append(cmd)
+
+    def query(self, cmd):
+        self.writes.append(cmd)
+        return self.reply
+
+    def read(self):
+        return ''
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeRM:
+    def open_resource(self, address):
+        return FakeVisa()
+
+
+class FakeExp:
+    aborted = False
+
+    def isAborted(self):
+        return self.aborted
+
+    def setStatus(self, status):
+        pass
+
+    def setStatusLoop(self, status):
+        pass
+
+
+class FakeQueue(list):
+    def put(self, item):
+        self.append(item)
+
+
+@pytest.fixture
+def app():
+    """
+    Just enough of an ``Apparatus`` for instruments and sequence commands.
+    """
+    app = types.SimpleNamespace(rm=FakeRM(), logger=logging.getLogger('tests'), sequence=[],
+                                instList=[], exp=FakeExp())
+    app.get_activeInsts = lambda: [inst for inst in app.instList if inst.name is not None]
+    return app
+
+
+@pytest.fixture
+def queue():
+    return FakeQueue()
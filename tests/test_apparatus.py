@@ -0,0 +1,92 @@
+import logging
+
+import Apparatus as ap
+from conftest import FakeExp, FakeVisa
+
+
+class SwitchboardRM:
+    """
+    A resource manager whose instruments can be swapped around: ``idns``\
+    maps each address to what it answers, and ``asked`` counts the\
+    identification queries.
+    """
+    def __init__(self, idns):
+        self.idns = dict(idns)
+        self.asked = []
+
+    def list_resources(self):
+        return tuple(self.idns)
+
+    def open_resource(self, address, timeout=None):
+        visa = FakeVisa()
+        visa.reply = self.idns[address]
+        if timeout is not None:
+            self.asked.append(address)
+        return visa
+
+
+def apparatus(rm):
+    app = ap.Apparatus.__new__(ap.Apparatus)
+    app.addrsList = []
+    app.instList = []
+    app.rm = rm
+    app.drivers = {}
+    app.idnCache = {}
+    app.discoveryTimeout = 500
+    app.sequence = []
+    app.exp = FakeExp()
+    app.logger = logging.getLogger('tests')
+    return app
+
+
+SMU = 'KEITHLEY INSTRUMENTS INC.,MODEL 2400,1,1'
+ELEC = 'KEITHLEY INSTRUMENTS INC.,MODEL 6517B,1,1'
+
+
+def test_serial_ports_are_listed_but_not_probed():
+    rm = SwitchboardRM({'GPIB0::5::INSTR': SMU, 'ASRL1::INSTR': ''})
+    app = apparatus(rm)
+    app.findInstruments()
+    assert 'ASRL1::INSTR' in app.addrsList
+    assert rm.asked == ['GPIB0::5::INSTR']
+    assert [inst.model for inst in app.instList] == ['Keithley2400']
+
+
+def test_cached_answers_are_reused_until_rechecked():
+    rm = SwitchboardRM({'GPIB0::5::INSTR': SMU})
+    app = apparatus(rm)
+    app.findInstruments()
+    app.instList[0].name = 'smu'
+    rm.idns['GPIB0::5::INSTR'] = ELEC  # swapped at the same address
+
+    app.findInstruments()
+    assert rm.asked == ['GPIB0::5::INSTR']
+    assert [inst.model for inst in app.instList] == ['Keithley2400']
+
+    app.findInstruments(recheck=True)
+    assert rm.asked == ['GPIB0::5::INSTR'] * 2
+    assert [inst.model for inst in app.instList] == ['Keithley6517B']
+    assert app.instList[0].name is None  # a different instrument isn't the one the user named
+
+
+class ClosingVisa(FakeVisa):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_release_closes_and_forgets_drivers():
+    import InstHandlers as ih
+    rm = SwitchboardRM({'GPIB0::5::INSTR': SMU})
+    app = apparatus(rm)
+    app.findInstruments()
+    old = app.instList[0]
+    old.visa = ClosingVisa()
+
+    assert ih.instRequest('Release Instruments').execute(app, None, app.logger) is False
+    assert old.visa.closed
+    assert app.drivers == {} and app.instList == []
+
+    app.findInstruments()
+    assert app.instList[0] is not old
@@ -0,0 +1,45 @@
+import threading
+
+import BusExecutor as bx
+
+
+class FakeInst:
+    def __init__(self, address):
+        self.address = address
+        self.threads = []
+
+    def readParam(self, param):
+        self.threads.append(threading.current_thread().name)
+        return [param]
+
+    def readParams(self, params):
+        self.threads.append(threading.current_thread().name)
+        return [[param] for param in params]
+
+
+def test_busKey():
+    assert bx.busKey('GPIB0::12::INSTR') == 'GPIB0'
+    assert bx.busKey('gpib1::3::INSTR') == 'GPIB1'
+    assert bx.busKey('TCPIP0::10.0.0.2::INSTR') == 'TCPIP0::10.0.0.2::INSTR'
+
+
+def test_readAll_keeps_order_and_uses_bus_threads():
+    a = FakeInst('GPIB0::1::INSTR')
+    b = FakeInst('GPIB0::2::INSTR')
+    c = FakeInst('TCPIP0::10.0.0.2::INSTR')
+    try:
+        results = bx.readAll([(a, 'x'), (c, 'y'), (a, 'z'), (b, 'w')])
+        assert results == [['x'], ['y'], ['z'], ['w']]
+        assert a.threads == ['bus-GPIB0_0'] and b.threads == ['bus-GPIB0_0']
+        assert c.threads[0].startswith('bus-TCPIP0')
+    finally:
+        bx.shutdownBuses()
+
+
+def test_shutdownBuses_stops_the_threads():
+    bx.readAll([(FakeInst('GPIB3::1::INSTR'), 'x')])
+    assert any(t.name.startswith('bus-GPIB3') for t in threading.enumerate())
+    bx.shutdownBuses()
+    assert not any(t.name.startswith('bus-GPIB3') for t in threading.enumerate())
+    assert bx.readAll([(FakeInst('GPIB3::1::INSTR'), 'x')]) == [['x']]  # buses come back when needed
+    bx.shutdownBuses()
@@ -0,0 +1,89 @@
+import pytest
+
+import Apparatus as ap
+import commands as sc
+from conftest import FakeExp
+from instruments import AgE3640A, Keithley6517B, LR700
+
+
+def build(app, cls, **settings):
+    cmd = cls(app.exp, app, len(app.sequence), dup=True)
+    cmd.__dict__.update(settings)
+    cmd.updateInstList()
+    app.sequence.append(cmd)
+    return cmd
+
+
+def test_meas_types_come_from_the_parameters(app):
+    elec = Keithley6517B(app, 'GPIB0::27::INSTR', 'elec')
+    bridge = LR700(app, 'GPIB0::9::INSTR', 'bridge')
+    app.instList = [elec, bridge]
+    build(app, sc.SMeasCmd, rows=3, selInsts=[str(elec), str(bridge), str(bridge)],
+          selParams=['Voltage', 'Excitation', 'Resistance'])
+    dtypes = ap.Apparatus.getVarTypes(app)
+    assert dtypes == {'Timestamp': '<i8',
+                      sc.formatHeader(elec, 'Voltage'): '<f8',  # continuous, though it has no units
+                      sc.formatHeader(bridge, 'Excitation'): '<i8',
+                      sc.formatHeader(bridge, 'Resistance', 'Ohms'): '<f8'}
+    assert list(dtypes) == ap.Apparatus.getVarsList(app)
+
+
+class RunExp(FakeExp):
+    instAns = None
+
+    def abort(self):
+        self.aborted = True
+
+    def finish(self):
+        pass
+
+
+@pytest.fixture
+def psuLoop(app):
+    """
+    Sweep the current of a power supply, measuring it at each step, with a\
+    disabled step after the loop.
+    """
+    psu = AgE3640A(app, 'GPIB0::5::INSTR', 'psu')
+    psu.writeDelay = 0
+    app.instList = [psu]
+    app.exp = RunExp()
+    app.compileSequence = lambda: ap.Apparatus.compileSequence(app)
+    loop = build(app, sc.LoopCmd, sweepInst=str(psu), sweepParam='Current', allValues=[0.1, 0.2, 0.3],
+                 npoints=3, wait='Time', timeout=0)
+    meas = build(app, sc.SMeasCmd, rows=2, selInsts=[str(psu)] * 2, selParams=['Voltage', 'Current'])
+    end = sc.LoopEnd(app.exp, app, len(app.sequence), dup=True, loop=loop)
+    app.sequence.append(end)
+    build(app, sc.SetCmd, rows=1, selInsts=[str(psu)], selParams=['Voltage'], selVals=['2.5'], enabled=False)
+    return app, psu, loop, meas, end
+
+
+def test_program_jumps(psuLoop):
+    app, psu, loop, meas, end = psuLoop
+    assert ap.Apparatus.compileSequence(app) == [(0, loop, 3), (1, meas, None), (2, end, 0)]
+    loop.enabled = False  # takes its end with it
+    assert ap.Apparatus.compileSequence(app) == [(1, meas, None)]
+
+
+def test_plans_resolve_everything_once(psuLoop):
+    app, psu, loop, meas, end = psuLoop
+    ap.Apparatus.compileSequence(app)
+    assert meas.plan['reads'] == [(psu, psu.getParam('Voltage')), (psu, psu.getParam('Current'))]
+    assert meas.plan['headers'] == [sc.measHeaders(psu, psu.getParam(name)) for name in ('Voltage', 'Current')]
+    assert loop.plan['cmds'] == [psu.encodeWrite('Current', val) for val in loop.allValues]
+    assert None not in loop.plan['cmds']
+    assert not loop.plan['offload']
+    assert end.loopPos == 0
+    assert meas.copy().plan is None  # a copy may be edited, so it compiles on its own
+
+
+def test_run_compiled_sequence(psuLoop, queue):
+    app, psu, loop, meas, end = psuLoop
+    psu.visa.writes = []
+    ap.Apparatus.runSequence(app, queue)
+    assert app.exp.aborted
+    assert [req.type for req in queue] == ['Write Line'] * 3
+    headers = meas.getMeasHeaders()
+    assert all(set(req.args) == {'Timestamp'} | set(headers) for req in queue)
+    assert [cmd for cmd in psu.visa.writes if cmd in loop.plan['cmds']] == loop.plan['cmds']
+    assert loop.iteration == 0  # reset by the loop end for the next run
@@ -0,0 +1,80 @@
+import DataRing as dr
+
+HEADERS = ['Timestamp', 'smu--Voltage (V)', 'elec--Voltage', 'lockin--Harmonic', 'lockin--Sensitivity']
+DTYPES = {'Timestamp': '<i8', 'smu--Voltage (V)': '<f8', 'elec--Voltage': '<f8',
+          'lockin--Harmonic': '<f8', 'lockin--Sensitivity': '<i8'}
+T0 = 1700000000000000000
+
+
+def records():
+    return [[T0 + ii * 1000, 0.5 * ii, 1.25 + ii, 2.5, '{:d},{:d} mV'.format(ii, ii)] for ii in range(5)]
+
+
+def test_ring_round_trip_with_unitless_float_column():
+    ring = dr.DataRing(HEADERS, capacity=8, dtypes=DTYPES)
+    try:
+        assert ring.discrete == ['lockin--Sensitivity']
+        for row in records():
+            ring.write(dict(zip(HEADERS, row)))
+        other = dr.DataRing.attach(ring.spec())
+        rows = other.cursor().slots(HEADERS)
+        assert [row[2] for row in rows] == [1.25, 2.25, 3.25, 4.25, 5.25]
+        assert rows[3][4] == '3,3 mV'
+        other.close()
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_ring_cursor_counts_lost_records():
+    ring = dr.DataRing(HEADERS, capacity=4, dtypes=DTYPES)
+    try:
+        cursor = ring.cursor()
+        for row in records() + records():
+            ring.write(dict(zip(HEADERS, row)))
+        rows = cursor.slots(HEADERS)
+        assert len(rows) == 3  # the oldest slot may be the one being refilled
+        assert cursor.lost == 7
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+class Meddler:
+    """
+    Passes everything through to a ring, except that the writer gets to\
+    run while a cursor is copying the values out.
+    """
+    def __init__(self, ring, meddle):
+        self.ring = ring
+        self.meddle = meddle
+
+    def __getattr__(self, name):
+        return getattr(self.ring, name)
+
+    @property
+    def values(self):
+        self.meddle(self.ring)
+        return self.ring.values
+
+
+def test_records_overwritten_during_the_copy_are_dropped():
+    ring = dr.DataRing(HEADERS, capacity=4, dtypes=DTYPES)
+    try:
+        rows = [dict(zip(HEADERS, row)) for row in records()]
+        for row in rows[:4]:
+            ring.write(row)
+
+        def meddle(ring):
+            ring.write(rows[4])  # lands on top of record 0
+            ring.values[1, :] = -1.0  # and record 5 is half written over record 1
+
+        cursor = ring.cursor()
+        cursor.ring = Meddler(ring, meddle)
+        stamps, values, valid, labels = cursor.read()
+        assert list(stamps - T0) == [2000, 3000]
+        assert list(values[:, 0]) == [1.0, 1.5]
+        assert cursor.lost == 2 and cursor.position == 4
+    finally:
+        ring.close()
+        ring.unlink()
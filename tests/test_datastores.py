@@ -0,0 +1,89 @@
+import numpy as np
+
+import DataStores as ds
+
+HEADERS = ['Timestamp', 'smu--Voltage (V)', 'elec--Voltage', 'lockin--Harmonic', 'lockin--Sensitivity']
+DTYPES = {'Timestamp': '<i8', 'smu--Voltage (V)': '<f8', 'elec--Voltage': '<f8',
+          'lockin--Harmonic': '<f8', 'lockin--Sensitivity': '<i8'}
+T0 = 1700000000000000000
+
+
+def records():
+    return [[T0 + ii * 1000, 0.5 * ii, 1.25 + ii, 2.5, '{:d},{:d} mV'.format(ii, ii)] for ii in range(5)]
+
+
+def test_columnTypes_prefers_given_types():
+    assert ds.columnTypes(HEADERS, DTYPES) == [DTYPES[head] for head in HEADERS]
+
+
+def test_columnType_guess_keeps_unitless_floats():
+    assert ds.columnType('elec--Voltage') == '<f8'
+    assert ds.columnType('Timestamp') == '<i8'
+    assert ds.columnType('lockin--Buffer' + ds.ARRAYTAG) == '<i8'
+
+
+def test_parseCell():
+    assert ds.parseCell('1.25', '<f8') == 1.25
+    assert ds.parseCell('3,high', '<f8') == 3.0
+    assert ds.parseCell('3,high', '<i8') == 3
+    assert ds.parseCell(1.5, '<i8') is None
+    assert ds.parseCell('-', '<f8') is None
+
+
+def test_columnStore_keeps_unitless_float_column(tmp_path):
+    path = str(tmp_path / 'run.pxcb')
+    store = ds.ColumnStore(path, chunkRows=2)
+    store.create(HEADERS, DTYPES)
+    for row in records():
+        store.append(row)
+    store.close()
+
+    store = ds.ColumnStore(path)
+    assert store.open(readonly=True) == HEADERS
+    assert store.dtypes == [DTYPES[head] for head in HEADERS]
+    columns = store.readColumns(HEADERS)
+    vals, valid = columns['elec--Voltage']
+    assert valid.all()
+    np.testing.assert_allclose(vals, [1.25, 2.25, 3.25, 4.25, 5.25])
+    np.testing.assert_allclose(columns['lockin--Harmonic'][0], 2.5)
+    np.testing.assert_array_equal(columns['lockin--Sensitivity'][0], np.arange(5))
+    np.testing.assert_array_equal(columns['Timestamp'][0], T0 + 1000 * np.arange(5))
+    store.close()
+
+
+def test_textStore_reads_back_unitless_float_column(tmp_path):
+    path = str(tmp_path / 'run.dat')
+    store = ds.TextStore(path)
+    store.create(HEADERS, DTYPES)
+    for row in records():
+        store.append(row)
+    store.close()
+
+    store = ds.TextStore(path)
+    store.open(readonly=True)
+    columns = store.readColumns(['elec--Voltage', 'lockin--Sensitivity'])
+    np.testing.assert_allclose(columns['elec--Voltage'][0], [1.25, 2.25, 3.25, 4.25, 5.25])
+    np.testing.assert_array_equal(columns['lockin--Sensitivity'][0], np.arange(5))
+    store.close()
+
+
+def test_columnCache_keeps_unitless_float_column():
+    cache = ds.ColumnCache(HEADERS, capacity=2, dtypes=DTYPES)
+    for row in records():
+        cache.append(row)
+    columns = cache.columns(['elec--Voltage', 'lockin--Harmonic'])
+    assert columns['elec--Voltage'][1].all()
+    np.testing.assert_allclose(columns['elec--Voltage'][0], [1.25, 2.25, 3.25, 4.25, 5.25])
+    np.testing.assert_allclose(columns['lockin--Harmonic'][0], 2.5)
+
+
+def test_columnCache_takes_types_from_store(tmp_path):
+    path = str(tmp_path / 'run.pxcb')
+    store = ds.ColumnStore(path)
+    store.create(HEADERS, DTYPES)
+    store.close()
+    store = ds.ColumnStore(path)
+    store.open()
+    cache = ds.ColumnCache(store.headers, store=store)
+    assert cache.dtypes == store.dtypes
+    store.close()
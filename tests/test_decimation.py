@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import Decimation as dc
+
+
+def noisyCurve(N=100000):
+    x = np.arange(N, dtype=float)
+    y = np.sin(x / 5000) + np.random.default_rng(0).normal(0, 0.1, N)
+    y[N // 8] = 10.0
+    return x, y
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_keeps_ends_and_spike(method):
+    x, y = noisyCurve()
+    xd, yd = dc.decimate(x, y, 500, method)
+    assert len(yd) <= 500 + 2  # minmax keeps both extremes of 250 buckets, plus the ends
+    assert xd[0] == x[0] and xd[-1] == x[-1]
+    assert 10.0 in yd
+    assert np.all(np.diff(xd) > 0)
+
+
+@pytest.mark.parametrize('N', [3, 4, 7, 10, 101, 2003])
+def test_lttb_short_curves(N):
+    x = np.arange(N, dtype=float)
+    y = np.random.default_rng(N).normal(size=N)
+    indices = dc.lttbIndices(x, y, 5)
+    assert indices[0] == 0 and indices[-1] == N - 1
+    assert len(indices) <= max(N if N <= 5 else 5, 3)
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_ignores_nan():
+    x, y = noisyCurve(10000)
+    y[::7] = np.nan
+    xd, yd = dc.decimate(x, y, 200, 'lttb')
+    assert not np.isnan(yd[1:-1]).any()
+
+
+def test_lttb_on_timestamps():
+    x, y = noisyCurve(10000)
+    stamps = np.datetime64('2024-01-01T00:00:00', 'ns') + (x * 1e9).astype('timedelta64[ns]')
+    xd, yd = dc.decimate(stamps, y, 200, 'lttb')
+    assert xd.dtype.kind == 'M'
+    assert xd[0] == stamps[0] and xd[-1] == stamps[-1]
+    assert len(yd) <= 200 and 10.0 in yd
+
+
+def test_short_curves_untouched():
+    x, y = noisyCurve(100)
+    xd, yd = dc.decimate(x, y, 200, 'lttb')
+    assert np.array_equal(xd, x) and np.array_equal(yd, y)
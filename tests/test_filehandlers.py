@@ -0,0 +1,150 @@
+import logging
+import queue
+
+import numpy as np
+import pytest
+
+import DataRing as dr
+import DataStores as ds
+import FileHandlers as fh
+from conftest import FakeQueue
+
+BUFFER = 'lockin--Buffer' + ds.ARRAYTAG
+HEADERS = ['Timestamp', 'lockin--X (V)', BUFFER]
+DTYPES = {'Timestamp': '<i8', 'lockin--X (V)': '<f8', BUFFER: '<i8'}
+T0 = 1700000000000000000
+
+
+@pytest.fixture
+def dbase(tmp_path):
+    dbase = fh.DataBase(queue.Queue())
+    dbase.startfile(str(tmp_path / 'run.pxcb'), HEADERS, DTYPES)
+    ring = dr.DataRing(HEADERS, capacity=4, dtypes=DTYPES)
+    dbase.attachRing(ring.spec())
+    yield dbase, ring
+    dbase.closefile()
+    ring.close()
+    ring.unlink()
+
+
+def measure(ringQ, ii):
+    ringQ.put(fh.fileRequest('Write Line', {'Timestamp': T0 + ii, 'lockin--X (V)': float(ii),
+                                            BUFFER: np.full(3, float(ii))}))
+
+
+def deliver(dbase, fileQ):
+    for req in fileQ:
+        req.execute(dbase)
+    fileQ.clear()
+
+
+def check(dbase, expected):
+    stamps, arrays = dbase.readArrays([BUFFER])[BUFFER]
+    assert [int(s.astype('int64')) - T0 for s in stamps] == expected
+    assert [a[0] for a in arrays] == expected
+
+
+def test_arrays_before_and_after_their_records(dbase):
+    dbase, ring = dbase
+    fileQ = FakeQueue()
+    ringQ = dr.RingQueue(fileQ, ring)
+    measure(ringQ, 0)
+    deliver(dbase, fileQ)  # arrays first
+    dbase.pullRing()
+    measure(ringQ, 1)
+    dbase.pullRing()  # record first
+    deliver(dbase, fileQ)
+    check(dbase, [0, 1])
+
+
+def test_arrays_stay_with_their_records_after_losses(dbase):
+    dbase, ring = dbase
+    fileQ = FakeQueue()
+    ringQ = dr.RingQueue(fileQ, ring)
+    measure(ringQ, 0)
+    dbase.pullRing()
+    deliver(dbase, fileQ)
+    for ii in range(1, 10):  # more than the ring holds: 1 to 6 are lost
+        measure(ringQ, ii)
+    deliver(dbase, fileQ)
+    dbase.pullRing()
+    for ii in range(10, 12):
+        measure(ringQ, ii)
+    dbase.pullRing()
+    deliver(dbase, fileQ)
+    assert dbase.ringArrays == {} and dbase.ringRows == {}
+    stamps, valid = dbase.readColumns(['Timestamp'])['Timestamp']
+    assert list(stamps - T0) == [0, 7, 8, 9, 10, 11]
+    check(dbase, [0, 7, 8, 9, 10, 11])
+
+
+def test_write_arrays_leaves_the_answer_alone():
+    class Exp:
+        answer = 'waiting to be read'
+
+        def set_fileAns(self, ans):
+            self.answer = ans
+
+    class DB:
+        arrays = None
+        readonly = False
+
+    exp = Exp()
+    fh.handleRequest(fh.fileRequest('Write Arrays', (0, {})), exp, DB(), logging.getLogger('tests'))
+    assert exp.answer == 'waiting to be read'
+
+
+
+def test_export_text(tmp_path):
+    dbase = fh.DataBase(queue.Queue())
+    headers = ['Timestamp', 'ps--Output', 'ps--Voltage (V)']
+    dbase.startfile(str(tmp_path / 'run.pxcb'), headers,
+                    {'Timestamp': '<i8', 'ps--Output': '<i8', 'ps--Voltage (V)': '<f8'})
+    dbase.writeline({'Timestamp': T0, 'ps--Output': 1, 'ps--Voltage (V)': 2.5})
+    dbase.writeline({'Timestamp': T0 + 10**9, 'ps--Voltage (V)': 3.0})
+    text = str(tmp_path / 'out.dat')
+    assert fh.fileRequest('Export Text', text).execute(dbase) == text
+    dbase.closefile()
+    with open(text) as f:
+        lines = [line.rstrip('\n').split('\t') for line in f]
+    assert lines[0] == headers
+    assert [row[1:] for row in lines[1:]] == [['1', '2.5'], ['-', '3.0']]
+    assert fh.fileRequest('Export Text', text).execute(dbase) is None  # no file open
+
+
+def test_commit_policy(tmp_path):
+    dbase = fh.DataBase(queue.Queue())
+    dbase.startfile(str(tmp_path / 'run.pxcb'), HEADERS[:2], DTYPES)
+    fh.fileRequest('Commit Policy', (3, 60.0, 'commit')).execute(dbase)
+    syncs = []
+    dbase.store.sync = lambda: syncs.append(dbase.rows)
+    for ii in range(4):
+        dbase.writeline({'Timestamp': T0 + ii, 'lockin--X (V)': float(ii)})
+    assert syncs == [3]  # one group of three, synced as it was written
+    assert len(dbase.store.pending) == 1
+    dbase.poll()
+    assert len(dbase.store.pending) == 1  # not old enough yet
+    fh.fileRequest('Commit Policy', (None, 0.0, None)).execute(dbase)
+    dbase.poll()
+    assert len(dbase.store.pending) == 0 and syncs == [3, 4]
+    assert (dbase.commitRows, dbase.fsync) == (3, 'commit')
+    with pytest.raises(ValueError):
+        dbase.setCommitPolicy(fsync='sometimes')
+    dbase.closefile()
+
+
+def test_records_as_dicts_or_slots(tmp_path):
+    dbase = fh.DataBase(queue.Queue())
+    headers = ['Timestamp', 'a--X (V)', 'b--Y (V)']
+    dbase.startfile(str(tmp_path / 'run.pxcb'), headers)
+    assert dbase.index == {'Timestamp': 0, 'a--X (V)': 1, 'b--Y (V)': 2}
+    assert dbase.toSlots({'b--Y (V)': 2.0, 'Timestamp': T0, 'other--Z': 5.0}) == [T0, None, 2.0]
+    dbase.writeline({'b--Y (V)': 2.0, 'Timestamp': T0})
+    dbase.writeline([T0 + 1, 1.0, None])
+    with pytest.raises(ValueError):
+        dbase.writeline([T0 + 2, 1.0])
+    columns = dbase.readColumns(headers)
+    assert list(columns['Timestamp'][0] - T0) == [0, 1]
+    assert list(columns['a--X (V)'][1]) == [False, True]
+    assert list(columns['b--Y (V)'][1]) == [True, False]
+    dbase.closefile()
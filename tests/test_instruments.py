@@ -0,0 +1,81 @@
+import commands as sc
+from instruments import AgE3640A, LR700, Keithley2400
+
+
+def test_sendBatch_without_separator_writes_each_command(app):
+    inst = LR700(app, 'GPIB0::9::INSTR', 'bridge')
+    inst.writeDelay = 0
+    assert inst.cmdSeparator is None
+    inst.sendBatch(['AUTORANGE 1', 'FILTER 2'])
+    assert inst.visa.writes == ['AUTORANGE 1', 'FILTER 2']
+
+
+def test_sendBatch_with_separator_joins_commands(app):
+    inst = Keithley2400(app, 'GPIB0::24::INSTR', 'smu')
+    inst.writeDelay = 0
+    inst.visa.writes = []
+    inst.sendBatch(['SOUR:VOLT 1', 'OUTP 1'])
+    assert inst.visa.writes == ['SOUR:VOLT 1;:OUTP 1']
+
+
+def test_set_step_on_driver_without_separator(app, queue):
+    inst = LR700(app, 'GPIB0::9::INSTR', 'bridge')
+    inst.writeDelay = 0
+    app.instList = [inst]
+    param = inst.getParam('Autorange')
+    cmd = sc.SetCmd(app.exp, app, 0, dup=True)
+    cmd.updateInstList()
+    cmd.selInsts = [str(inst)]
+    cmd.selParams = ['Autorange']
+    cmd.selVals = ['{:s} ({:s})'.format(param.labels[1], str(param.vals[1]))]
+    cmd.rows = 1
+    cmd.status = ['', '', '']
+    cmd.execute(queue)
+    assert len(inst.visa.writes) == 1
+    assert inst.visa.writes[0].startswith('AUTORANGE')
+
+
+def setStep(app, rows):
+    cmd = sc.SetCmd(app.exp, app, 0, dup=True)
+    cmd.updateInstList()
+    cmd.selInsts = [str(inst) for inst, name, val in rows]
+    cmd.selParams = [name for inst, name, val in rows]
+    cmd.selVals = [val for inst, name, val in rows]
+    cmd.rows = len(rows)
+    cmd.status = ['', '', '']
+    return cmd
+
+
+def test_set_step_sends_one_message_per_instrument(app, queue):
+    psu = AgE3640A(app, 'GPIB0::5::INSTR', 'psu')
+    smu = Keithley2400(app, 'GPIB0::24::INSTR', 'smu')
+    app.instList = [psu, smu]
+    for inst in app.instList:
+        inst.writeDelay = 0
+        inst.visa.writes = []
+    cmd = setStep(app, [(psu, 'Voltage', '2.5'), (psu, 'Current', '0.1'), (smu, 'Source Voltage', '1.0')])
+    cmd.execute(queue)
+    assert psu.visa.writes == [psu.cmdSeparator.join([psu.encodeWrite('Voltage', '2.5'),
+                                                      psu.encodeWrite('Current', '0.1')])]
+    assert len(smu.visa.writes) == 1
+    assert [len(group) for group in cmd.plan['groups']] == [2, 1]
+
+
+def test_drivers_without_sweeps_refuse_them(app, queue):
+    inst = LR700(app, 'GPIB0::9::INSTR', 'bridge')
+    inst.writeDelay = 0
+    inst.visa.writes = []
+    app.instList = [inst]
+    assert not inst.sweepable('Excitation', 3)
+    assert inst.loadSweep('Excitation', [1.0, 2.0, 3.0], 0.5) is False
+    inst.startSweep()
+    assert inst.sweepDone()
+    assert inst.fetchSweep() == []
+    assert inst.visa.writes == []
+
+    loop = sc.LoopCmd(app.exp, app, 0, dup=True)  # as if the plan had been made for an instrument which could
+    loop.updateInstList()
+    loop.plan = {'inst': inst, 'param': inst.getParam('Excitation'), 'sweepHeaders': []}
+    loop.allValues = [1.0, 2.0, 3.0]
+    loop.offload(queue)
+    assert list(queue) == [] and inst.visa.writes == []
@@ -0,0 +1,59 @@
+import types
+
+import pytest
+
+import Scheduler as sch
+
+
+class FakeClock:
+    """
+    Stands in for the ``time`` module: sleeping just moves the clock on,\
+    and so does each reading, a little, so that spinning ends.
+    """
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        self.now += 0.001
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sch, 'time', types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+def test_work_does_not_add_to_the_period(clock):
+    schedule = sch.Scheduler(1.0)
+    for ii in range(5):
+        clock.now += 0.3  # reading the instruments
+        assert schedule.wait()
+    assert clock.now == pytest.approx(schedule.t0 + 5.0, abs=0.01)
+    assert (schedule.ticks, schedule.missed) == (5, 0)
+
+
+def test_overruns_skip_to_the_same_grid(clock):
+    schedule = sch.Scheduler(1.0)
+    clock.now += 2.5
+    assert schedule.wait()
+    assert clock.now == pytest.approx(schedule.t0 + 3.0, abs=0.01)
+    assert (schedule.ticks, schedule.missed) == (3, 2)
+    assert '3 ticks' in schedule.report() and '2 missed' in schedule.report()
+
+
+def test_abort_stops_the_wait(clock):
+    schedule = sch.Scheduler(10.0, nap=0.25)
+    calls = []
+
+    def abort():
+        calls.append(clock.now)
+        return len(calls) > 3
+
+    assert not schedule.wait(abort)
+    assert schedule.ticks == 0
+    assert clock.now - schedule.t0 == pytest.approx(0.75, abs=0.01)  # noticed within a nap
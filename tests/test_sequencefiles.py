@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+import Apparatus as ap
+import commands as sc
+import SequenceFiles as sf
+from instruments import AgE3640A
+
+# as saved before sequences were JSON, by numpy 2 (so with np.float64 reprs)
+LEGACY = '''Sequence file generated by version 1.0
+INSTRUMENTS:
+GPIB0::5::INSTR\tAgE3640A\tpsu
+COMMANDS:
+Sequence Command 0:
+\ttype = LoopCommand
+\tenabled = True
+\tallValues = [np.float64(0.1), np.float64(0.2), np.float64(0.3)]
+\tmode = Ramp
+\tspacing = Linear
+\tstart = 0.0
+\tstop = 1.0
+\tnpoints = 3
+\twait = Time
+\ttimeout = 0.5
+\tsweepInst = psu:5:AgE3640A
+\tsweepParam = Current
+
+Sequence Command 1:
+\ttype = SingleMeasurementCommand
+\tenabled = True
+\trows = 2
+\tselParams = ['Voltage', 'Current']
+\tselInsts = ['psu:5:AgE3640A', 'psu:5:AgE3640A']
+
+Sequence Command 2:
+\ttype = LoopEndCommand
+\tenabled = True
+\tloopPos = 0
+
+Sequence Command 3:
+\ttype = SetCommand
+\tenabled = False
+\trows = 1
+\tselInsts = ['psu:5:AgE3640A']
+\tselParams = ['Voltage']
+\tselVals = ['2.5']
+'''
+
+
+@pytest.fixture
+def psuApp(app):
+    psu = AgE3640A(app, 'GPIB0::5::INSTR', 'psu')
+    app.instList = [psu]
+    app.deserialize = lambda *args, **kwargs: ap.Apparatus.deserialize(app, *args, **kwargs)
+    app.driver = lambda modelType, addr, name=None: psu
+    return app
+
+
+def build(app):
+    psu = app.instList[0]
+
+    def add(cls, **settings):
+        cmd = cls(app.exp, app, len(app.sequence), dup=True)
+        cmd.__dict__.update(settings)
+        cmd.updateInstList()
+        app.sequence.append(cmd)
+        return cmd
+
+    loop = add(sc.LoopCmd, sweepInst=str(psu), sweepParam='Current', allValues=[0.1, 0.2, 0.3],
+               npoints=3, wait='Time', timeout=0.5)
+    add(sc.SMeasCmd, rows=2, selInsts=[str(psu)] * 2, selParams=['Voltage', 'Current'])
+    end = sc.LoopEnd(app.exp, app, len(app.sequence), dup=True, loop=loop)
+    end.loopPos = 0
+    app.sequence.append(end)
+    add(sc.SetCmd, rows=1, selInsts=[str(psu)], selParams=['Voltage'], selVals=['2.5'], enabled=False)
+
+
+def test_json_round_trip(psuApp):
+    build(psuApp)
+    text = sf.dumps(sf.document(psuApp, '1.0'))
+    doc = json.loads(text)
+    assert doc['format'] == sf.FORMAT and doc['version'] == sf.VERSION and doc['pxc'] == '1.0'
+
+    psuApp.deserialize(text)
+    assert [type(cmd).__name__ for cmd in psuApp.sequence] == ['LoopCmd', 'SMeasCmd', 'LoopEnd', 'SetCmd']
+    assert psuApp.sequence[2].loop is psuApp.sequence[0]
+    assert psuApp.sequence[3].enabled is False
+    assert sf.loads(sf.dumps(sf.document(psuApp, '1.0'), indent=1)) == sf.loads(text)
+
+
+def test_deserialize_replaces_unless_appending(psuApp):
+    build(psuApp)
+    doc = sf.document(psuApp)
+    psuApp.deserialize(doc)
+    assert len(psuApp.sequence) == 4
+    psuApp.deserialize(doc, append=True)
+    assert len(psuApp.sequence) == 8
+    assert psuApp.sequence[6].loop is psuApp.sequence[4]
+
+
+def test_legacy_text_is_migrated(psuApp):
+    doc = sf.loads(LEGACY)
+    assert doc['version'] == sf.VERSION
+    assert doc['instruments'] == [{'address': 'GPIB0::5::INSTR', 'model': 'AgE3640A', 'name': 'psu'}]
+    loop, smeas, end, setcmd = doc['commands']
+    assert loop['allValues'] == [0.1, 0.2, 0.3]
+    assert loop['npoints'] == 3 and isinstance(loop['npoints'], int)
+    assert end['loopPos'] == 0 and isinstance(end['loopPos'], int)
+    assert smeas['selParams'] == ['Voltage', 'Current']
+    assert setcmd['enabled'] is False
+
+    build(psuApp)
+    saved = sf.document(psuApp)
+    for old, new in zip(doc['commands'], saved['commands']):
+        assert {key: new[key] for key in old} == old
+
+    psuApp.deserialize(LEGACY)
+    assert psuApp.sequence[2].loop is psuApp.sequence[0]
+
+
+def test_remap_moves_the_sequence_to_other_instruments(psuApp):
+    build(psuApp)
+    doc = sf.document(psuApp)
+    sf.remap(doc, {'GPIB0::5::INSTR': ('GPIB0::7::INSTR', 'AgE3640A', 'supply')})
+    assert doc['instruments'] == [{'address': 'GPIB0::7::INSTR', 'model': 'AgE3640A', 'name': 'supply'}]
+    assert doc['commands'][0]['sweepInst'] == 'supply:7:AgE3640A'
+    assert doc['commands'][1]['selInsts'] == ['supply:7:AgE3640A'] * 2
+    assert doc['commands'][1]['selParams'] == ['Voltage', 'Current']
+
+
+def test_newer_versions_are_rejected():
+    text = json.dumps({'format': sf.FORMAT, 'version': sf.VERSION + 1, 'instruments': [], 'commands': []})
+    with pytest.raises(ValueError, match='newer version'):
+        sf.loads(text)
+
+
+def test_other_files_are_rejected():
+    with pytest.raises(ValueError):
+        sf.loads(json.dumps({'format': 'something else'}))
+    with pytest.raises(ValueError):
+        sf.loads('just some text\n')
@@ -0,0 +1,72 @@
+import math
+import random
+
+import pytest
+
+import Stability as st
+
+
+def test_stable_after_window_within_tolerance():
+    detector = st.StabilityDetector(10.0, 0.5, 2.0)
+    results = [detector.add(t, 10.1) for t in (0.0, 1.0, 2.0)]
+    assert results == [False, False, True]
+
+
+def test_excursion_resets_until_it_leaves_the_window():
+    detector = st.StabilityDetector(10.0, 0.5, 2.0)
+    assert not detector.add(0.0, 10.0)
+    assert not detector.add(1.0, 11.0)
+    assert not detector.add(2.0, 10.0)
+    assert not detector.add(3.0, 10.0)
+    assert detector.add(3.5, 10.0)  # the excursion at 1 s has fallen out of the window
+
+
+@pytest.mark.parametrize('blank', ['-', None, 'nan', float('nan'), 'OVERFLOW'])
+def test_blank_readings_are_skipped(blank):
+    detector = st.StabilityDetector(10.0, 0.5, 2.0, minSamples=2)
+    assert not detector.add(0.0, 10.0)
+    assert not detector.add(1.0, blank)
+    assert detector.count() == 1
+    assert detector.add(2.0, 10.0)
+    assert detector.count() == 2
+    assert not math.isnan(detector.mean())
+
+
+def test_blank_first_reading():
+    detector = st.StabilityDetector(10.0, 0.5, 1.0)
+    assert not detector.add(0.0, '-')
+    assert detector.count() == 0
+    assert not detector.isStable()
+    assert not detector.add(1.0, 10.0)
+    assert detector.add(2.0, 10.0)
+
+
+def test_slope_and_noise_limits():
+    drift = st.StabilityDetector(10.0, 1.0, 4.0, maxSlope=0.1)
+    for t in range(6):
+        stable = drift.add(t, 9.5 + 0.2 * t)
+    assert drift.slope() == pytest.approx(0.2)
+    assert not stable
+
+    noisy = st.StabilityDetector(10.0, 1.0, 4.0, maxNoise=0.1)
+    for t in range(6):
+        stable = noisy.add(t, 10.0 + (0.5 if t % 2 else -0.5))
+    assert noisy.noise() > 0.4
+    assert not stable
+
+
+def test_running_statistics_match_brute_force():
+    rng = random.Random(1)
+    detector = st.StabilityDetector(0.0, 1.0, 5.0)
+    samples = []
+    t = 0.0
+    for ii in range(300):
+        t += rng.uniform(0.1, 1.0)
+        value = rng.gauss(0.0, 1.0)
+        samples.append((t, value))
+        detector.add(t, value)
+        window = [v for s, v in samples if s >= t - 5.0]
+        assert detector.count() == len(window)
+        assert detector.minimum() == min(window)
+        assert detector.maximum() == max(window)
+        assert detector.mean() == pytest.approx(sum(window) / len(window))